@@ -0,0 +1,5 @@
+from ballast.aio.service import AsyncService
+
+__all__ = [
+    'AsyncService'
+]
@@ -0,0 +1,135 @@
+import asyncio
+import socket
+from ballast.exception import BallastException, BallastConfigurationException
+from ballast.discovery.ns import DnsRecordList
+from dns import exception, flags, message, name, query, rcode, rdataclass, resolver
+
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, response):
+        self.response = response
+
+    def datagram_received(self, data, addr):
+        if not self.response.done():
+            self.response.set_result(data)
+
+    def error_received(self, exc):
+        if not self.response.done():
+            self.response.set_exception(exc)
+
+
+async def resolve(server_list):
+    """
+    Resolve the servers of a :class:`~ballast.discovery.ns.DnsRecordList`
+    without blocking the event loop.
+
+    The query is sent over UDP (falling back to TCP, in the loop's
+    executor, for truncated responses) to each of the list's nameservers
+    in turn, and the answer goes into the cache shared by every DNS
+    server list, so it's also what their blocking `get_servers` returns
+    until its TTL expires.
+    """
+    assert isinstance(server_list, DnsRecordList)
+
+    try:
+        answer = await _query(server_list)
+        if answer is None:
+            return []
+
+        return list(server_list.servers_from_answer(answer))
+
+    except BallastConfigurationException as e:
+        server_list._logger.error("%s", e)
+        return []
+    except (exception.DNSException, BallastException):
+        return []
+
+
+async def resolve_all(server_lists):
+    """
+    Resolve many DNS server lists at once, returns
+    a list of their servers (in the same order).
+    """
+    return await asyncio.gather(*[resolve(s) for s in server_lists])
+
+
+async def _query(server_list):
+
+    loop = asyncio.get_event_loop()
+    dns_resolver = server_list._resolver
+
+    if not server_list.nameserver_resolved:
+        try:
+            infos = await loop.getaddrinfo(server_list.dns_host, None, family=socket.AF_INET)
+            server_list.set_nameserver(infos[0][4][0])
+        except OSError as e:
+            raise BallastConfigurationException(
+                'Name resolution failed for DNS host: %s' % server_list.dns_host,
+                e
+            )
+
+    qname = name.from_text(server_list._dns_qname)
+    rdtype = server_list.RDTYPE
+    key = (qname, rdtype, rdataclass.IN)
+
+    answer = dns_resolver.cache.get(key) if dns_resolver.cache is not None else None
+    if answer is not None:
+        return answer
+
+    request = message.make_query(qname, rdtype)
+
+    for nameserver in dns_resolver.nameservers:
+        try:
+            response = await _udp_query(loop, request, nameserver, dns_resolver.port, dns_resolver.timeout)
+
+            if response.flags & flags.TC:
+                response = await loop.run_in_executor(
+                    None,
+                    lambda: query.tcp(request, nameserver, dns_resolver.timeout, dns_resolver.port)
+                )
+        except (OSError, asyncio.TimeoutError, exception.DNSException) as e:
+            server_list._logger.debug("DNS query to %s failed: %s", nameserver, e)
+            continue
+
+        if response.rcode() == rcode.NXDOMAIN:
+            return None
+
+        if response.rcode() != rcode.NOERROR:
+            continue
+
+        try:
+            answer = resolver.Answer(qname, rdtype, rdataclass.IN, response)
+        except resolver.NoAnswer:
+            return None
+
+        if answer.rrset is None:
+            return None
+
+        if dns_resolver.cache is not None:
+            dns_resolver.cache.put(key, answer)
+
+        return answer
+
+    return None
+
+
+async def _udp_query(loop, request, nameserver, port, timeout):
+
+    response = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _DnsProtocol(response),
+        remote_addr=(nameserver, port)
+    )
+
+    try:
+        transport.sendto(request.to_wire())
+        wire = await asyncio.wait_for(response, timeout)
+    finally:
+        transport.close()
+
+    reply = message.from_wire(wire)
+    if not request.is_response(reply):
+        raise query.BadResponse()
+
+    return reply
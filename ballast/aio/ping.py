@@ -0,0 +1,198 @@
+import abc
+import asyncio
+import threading
+from timeit import default_timer as timer
+from ballast.ping import Ping, PingStrategy
+from ballast.discovery import ServerList
+from ballast.exception import BallastException
+
+try:
+    import aiohttp
+except ImportError:
+    raise BallastException(
+        "Please install optional asyncio dependencies "
+        "in order to use this feature: \n\n"
+        "$ pip install ballast[aio] or \n"
+        "$ pip install ballast[all]"
+    )
+
+
+class AsyncPing(Ping):
+    """
+    A :class:`~ballast.ping.Ping` that can be awaited. Calling the
+    blocking `is_alive` runs the coroutine on a short-lived event loop.
+    """
+
+    @abc.abstractmethod
+    async def is_alive_async(self, server):
+        return False
+
+    def is_alive(self, server):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.is_alive_async(server))
+        finally:
+            loop.close()
+
+
+class AsyncSocketPing(AsyncPing):
+
+    async def is_alive_async(self, server):
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(server.address, server.port),
+                self.max_ping_time
+            )
+            writer.close()
+
+            self._logger.debug("Ping succeeded for server: %s", server)
+
+            return True
+        except (OSError, asyncio.TimeoutError):
+            self._logger.warning("Ping failed for server: %s", server)
+            return False
+
+
+class AsyncUrlPing(AsyncPing):
+
+    _HTTP = 'http'
+    _HTTPS = 'https'
+    _URL_FORMAT = '{}://{}:{}'
+
+    def __init__(self, is_secure=False):
+        super(AsyncUrlPing, self).__init__()
+        self.is_secure = is_secure
+
+    async def is_alive_async(self, server):
+        try:
+            scheme = self._HTTPS \
+                if self.is_secure \
+                else self._HTTP
+
+            url = self._URL_FORMAT.format(
+                scheme,
+                server.address,
+                server.port
+            )
+
+            timeout = aiohttp.ClientTimeout(total=self.max_ping_time)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.get(url) as response:
+                    result = response.status < 400
+
+            self._logger.debug("Ping succeeded for server: %s", server)
+
+            return result
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self._logger.warning("Ping failed for server: %s", server)
+            return False
+
+
+class AsyncioPingStrategy(PingStrategy):
+    """
+    Pings servers concurrently as coroutines, at most `max_concurrency`
+    at a time. An :class:`AsyncPing` is awaited directly, any other
+    :class:`~ballast.ping.Ping` runs in the loop's default executor.
+
+    The pings run on `loop` if given (e.g. an application's existing
+    event loop, running in another thread), otherwise on a dedicated
+    event loop in a background thread. From within a coroutine, await
+    `ping_async` instead.
+    """
+
+    DEFAULT_MAX_CONCURRENCY = 256
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, loop=None):
+        super(AsyncioPingStrategy, self).__init__()
+
+        assert isinstance(max_concurrency, int) and max_concurrency > 0
+
+        self.max_concurrency = max_concurrency
+        self._loop = loop
+        self._owns_loop = loop is None
+        self._loop_thread = None
+        self._lock = threading.Lock()
+
+    def ping(self, ping, servers):
+
+        assert isinstance(ping, Ping)
+        assert isinstance(servers, ServerList)
+
+        loop = self._get_loop()
+        if self._is_loop_thread(loop):
+            raise BallastException(
+                "AsyncioPingStrategy.ping() would block its own event loop, "
+                "await AsyncioPingStrategy.ping_async() instead"
+            )
+
+        # resolve the servers (which may block)
+        # before handing them over to the loop
+        server_list = list(servers.get_servers())
+
+        future = asyncio.run_coroutine_threadsafe(self._ping_all(ping, server_list), loop)
+        return future.result()
+
+    async def ping_async(self, ping, servers):
+
+        assert isinstance(ping, Ping)
+        assert isinstance(servers, ServerList)
+
+        return await self._ping_all(ping, list(servers.get_servers()))
+
+    def close(self):
+        with self._lock:
+            loop = self._loop if self._owns_loop else None
+            thread = self._loop_thread
+            self._loop_thread = None
+            if self._owns_loop:
+                self._loop = None
+
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def _ping_all(self, ping, servers):
+
+        start_time = timer()
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def ping_server(server):
+            async with semaphore:
+                ping_start_time = timer()
+
+                if isinstance(ping, AsyncPing):
+                    is_alive = await ping.is_alive_async(server)
+                else:
+                    loop = asyncio.get_event_loop()
+                    is_alive = await loop.run_in_executor(None, ping.is_alive, server)
+
+                server._is_alive = is_alive
+                server._ping_time = timer() - ping_start_time if is_alive else None
+
+                return server
+
+        results = await asyncio.gather(*[ping_server(s) for s in servers])
+
+        end_time = timer() - start_time
+
+        self._logger.debug("Pinged %s servers in %s seconds", len(results), end_time)
+
+        return list(results)
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(name='ballast-ping-loop', target=self._loop.run_forever)
+                self._loop_thread.daemon = True
+                self._loop_thread.start()
+
+            return self._loop
+
+    def _is_loop_thread(self, loop):
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
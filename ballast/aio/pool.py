@@ -0,0 +1,47 @@
+from timeit import default_timer as timer
+from ballast.pool import SessionPool
+from ballast.exception import BallastException
+
+try:
+    import aiohttp
+except ImportError:
+    raise BallastException(
+        "Please install optional asyncio dependencies "
+        "in order to use this feature: \n\n"
+        "$ pip install ballast[aio] or \n"
+        "$ pip install ballast[all]"
+    )
+
+
+class AsyncSessionPool(SessionPool):
+    """
+    Keeps one :class:`aiohttp.ClientSession` (and therefore one
+    non-blocking connection pool) per :class:`~ballast.discovery.Server`.
+
+    Sessions are bound to the event loop they were first used on.
+    """
+
+    DEFAULT_POOL_SIZE = 100
+
+    async def evict(self, servers):
+        for server, session in self._remove_expired(servers):
+            self._logger.debug("Closing connection pool for server: %s", server)
+            await session.close()
+
+    async def evict_if_due(self, load_balancer):
+        if timer() >= self._next_eviction:
+            await self.evict(load_balancer.servers)
+
+    async def close(self):
+        for server, session in self._remove_all():
+            await session.close()
+
+    def _create_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            keepalive_timeout=self.idle_timeout
+        )
+
+        # the session is shared by every caller, so it
+        # mustn't hand one caller's cookies to the next
+        return aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
@@ -0,0 +1,209 @@
+import asyncio
+from timeit import default_timer as timer
+from ballast.service import Service
+from ballast.events import Event
+from ballast.aio.pool import AsyncSessionPool
+import aiohttp
+
+
+class AsyncService(Service):
+    """
+    A :class:`~ballast.Service` for use with :mod:`asyncio`.
+
+    Shares the :class:`~ballast.LoadBalancer` and :class:`~ballast.rule.Rule`
+    machinery of :class:`~ballast.Service`, but every request method is a
+    coroutine backed by a non-blocking connection pool per server::
+
+        my_service = AsyncService(['127.0.0.1', '127.0.0.2'])
+        response = await my_service.get('/v1/path/to/resource')
+
+    Responses are :class:`aiohttp.ClientResponse` objects whose body
+    has already been read, so the connection is back in the pool by
+    the time the response is returned.
+    """
+
+    async def request(self, method, url, hash_key=None, **kwargs):
+
+        method = method.upper()
+        state = self._retry.begin(hash_key)
+        is_hedged = self._hedge is not None and self._hedge.is_hedged(method)
+
+        while True:
+
+            # choose a server from the pool,
+            # will throw if there are none left
+            if is_hedged:
+                server, response, error = await self._send_hedged(state, method, url, kwargs)
+            else:
+                server = state.choose_server(self._load_balancer)
+                server, response, error = await self._send(server, method, url, kwargs)
+
+            # 5xx errors (which mark the server down, or count
+            # against it) are retried on another server,
+            # everything else is good to go
+            if self._is_success(response, error):
+                return response
+
+            if not state.can_retry():
+                self._logger.debug("Giving up on request after %s attempt(s): %s %s", state.attempts, method, url)
+                if error is not None:
+                    raise error
+                return response
+
+            backoff_time = state.backoff_time()
+            if backoff_time > 0:
+                await asyncio.sleep(backoff_time)
+
+    async def options(self, url, **kwargs):
+        return await self.request('OPTIONS', url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return await self.request('HEAD', url, **kwargs)
+
+    async def get(self, url, params=None, **kwargs):
+        return await self.request('GET', url, params=params, **kwargs)
+
+    async def post(self, url, data=None, json=None, **kwargs):
+        return await self.request('POST', url, data=data, json=json, **kwargs)
+
+    async def put(self, url, data=None, **kwargs):
+        return await self.request('PUT', url, data=data, **kwargs)
+
+    async def patch(self, url, data=None, **kwargs):
+        return await self.request('PATCH', url, data=data, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    async def close(self):
+        self._load_balancer.remove_membership_listener(self._on_servers_changed)
+        self._load_balancer.events.unsubscribe(Event.SERVER_UP, self._on_server_up)
+        await self._pool.close()
+
+    def _on_servers_changed(self, added, removed, changed):
+
+        # aiohttp sessions have to be closed on their own event loop,
+        # not the pinging thread, so removed servers' pools are left
+        # to the periodic eviction in _session
+        pass
+
+    def _warm_up(self, server):
+
+        # aiohttp has no way of opening connections ahead
+        # of a request, warm up only applies to Service
+        pass
+
+    async def _send(self, server, method, url, kwargs):
+
+        absolute_url = self._get_absolute_url(server, url, self._use_https)
+        stats = self._load_balancer.stats.get_server_stats(server)
+
+        self._logger.debug("Request: %s %s", method, absolute_url)
+
+        stats.increment_active_requests()
+        start_time = timer()
+
+        try:
+            session = await self._async_session(server)
+            response = await session.request(
+                method,
+                absolute_url,
+                timeout=aiohttp.ClientTimeout(total=self._request_timeout),
+                **kwargs
+            )
+
+            # read the body so the connection is
+            # released back to the pool right away
+            await response.read()
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+            stats.increment_failures()
+            self._load_balancer.record_result(server, False, timer() - start_time)
+            return server, None, e
+        finally:
+            stats.decrement_active_requests()
+
+        response_time = timer() - start_time
+        stats.add_response_time(response_time)
+        self._load_balancer.record_response_time(server, response_time)
+
+        is_success = self._is_success(response, None)
+        if is_success:
+            stats.record_success()
+        else:
+            stats.increment_failures()
+
+        self._load_balancer.record_result(server, is_success, response_time)
+
+        if self._hedge is not None and self._hedge.is_hedged(method):
+            self._hedge.add_response_time(response_time)
+
+        return server, response, None
+
+    async def _send_hedged(self, state, method, url, kwargs):
+
+        delay = self._hedge.delay_time()
+        primary = state.choose_server(self._load_balancer)
+
+        # not enough data to hedge on yet
+        if delay is None:
+            return await self._send(primary, method, url, kwargs)
+
+        pending = {asyncio.ensure_future(self._send(primary, method, url, kwargs))}
+        secondary = None
+
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+
+            # the primary is taking too long, send
+            # a duplicate request to another server
+            if not done:
+                secondary = self._choose_hedge_server(state, primary)
+                if secondary is not None:
+                    self._logger.debug("Hedging request to server: %s", secondary)
+                    self._hedge.increment_hedges_sent()
+                    pending.add(asyncio.ensure_future(self._send(secondary, method, url, kwargs)))
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            # prefer a success if more than one came in at once
+            results = [task.result() for task in done]
+            result = next((r for r in results if self._is_success(r[1], r[2])), results[0])
+
+            # the first to respond failed, but
+            # the other one may still come through
+            if not self._is_success(result[1], result[2]) and pending:
+                other = await pending.pop()
+                if self._is_success(other[1], other[2]):
+                    result = other
+
+            if secondary is not None and result[0] is secondary and self._is_success(result[1], result[2]):
+                self._hedge.increment_hedges_won()
+
+            return result
+
+        finally:
+            # cancel the loser
+            for task in pending:
+                task.cancel()
+
+    async def _async_session(self, server):
+
+        # close any pools for servers that have
+        # left the load balancer or gone idle
+        await self._pool.evict_if_due(self._load_balancer)
+
+        return self._pool.session(server)
+
+    @staticmethod
+    def _is_success(response, error):
+        return error is None and response.status < 500
+
+    @staticmethod
+    def _create_pool(pool_size, idle_timeout):
+        return AsyncSessionPool(
+            pool_size if pool_size is not None else AsyncSessionPool.DEFAULT_POOL_SIZE,
+            idle_timeout if idle_timeout is not None else AsyncSessionPool.DEFAULT_IDLE_TIMEOUT
+        )
@@ -0,0 +1,36 @@
+class CircuitBreaker(object):
+    """
+    Per-server circuit breaker policy.
+
+    A server's circuit opens (taking it out of the load-balancing pool)
+    after `failure_threshold` consecutive failed requests. After
+    `cool_down` seconds it's half-open: up to `half_open_requests` probe
+    requests are let through, the first one to succeed closes the circuit
+    again and a failure re-opens it for another cool-down.
+
+    The state itself is kept by each server's
+    :class:`~ballast.discovery.ServerStats`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    DEFAULT_FAILURE_THRESHOLD = 5
+    DEFAULT_COOL_DOWN = 30
+    DEFAULT_HALF_OPEN_REQUESTS = 1
+
+    def __init__(
+            self,
+            failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+            cool_down=DEFAULT_COOL_DOWN,
+            half_open_requests=DEFAULT_HALF_OPEN_REQUESTS
+    ):
+
+        assert isinstance(failure_threshold, int) and failure_threshold > 0
+        assert cool_down > 0
+        assert isinstance(half_open_requests, int) and half_open_requests > 0
+
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self.half_open_requests = half_open_requests
@@ -1,7 +1,15 @@
 import logging
+import random
 import threading
-import time
-from ballast.discovery import ServerList
+from timeit import default_timer as timer
+from ballast.discovery import ServerList, ServerStats
+from ballast.discovery.static import StaticServerList
+from ballast.schedule import PingSchedule
+from ballast.outlier import OutlierDetector
+from ballast.breaker import CircuitBreaker
+from ballast.slowstart import SlowStart
+from ballast.snapshot import SnapshotFile
+from ballast.events import Event, EventBus
 from ballast.rule import Rule, RoundRobinRule
 from ballast.ping import (
     Ping,
@@ -16,16 +24,38 @@ class LoadBalancer(object):
     DEFAULT_PING_INTERVAL = 30
     MAX_PING_TIME = 3
 
-    def __init__(self, server_list, rule=None, ping_strategy=None, ping=None, ping_on_start=True):
+    # how many times a server that's slow-starting
+    # can be passed over in favour of another
+    MAX_SLOW_START_ATTEMPTS = 3
+
+    def __init__(
+            self,
+            server_list,
+            rule=None,
+            ping_strategy=None,
+            ping=None,
+            ping_on_start=True,
+            ping_schedule=None,
+            outlier_detector=None,
+            circuit_breaker=None,
+            slow_start=None,
+            snapshot_file=None
+    ):
 
         assert isinstance(server_list, ServerList)
         assert rule is None or isinstance(rule, Rule)
         assert ping_strategy is None or isinstance(ping_strategy, PingStrategy)
         assert ping is None or isinstance(ping, Ping)
+        assert ping_schedule is None or isinstance(ping_schedule, PingSchedule)
+        assert outlier_detector is None or isinstance(outlier_detector, OutlierDetector)
+        assert circuit_breaker is None or isinstance(circuit_breaker, CircuitBreaker)
+        assert slow_start is None or isinstance(slow_start, SlowStart)
+        assert snapshot_file is None or isinstance(snapshot_file, SnapshotFile)
 
         # some locks for thread-safety
         self._lock = threading.Lock()
         self._server_lock = threading.Lock()
+        self._ping_lock = threading.Lock()
 
         self._rule = rule \
             if rule is not None \
@@ -42,11 +72,31 @@ class LoadBalancer(object):
         self.max_ping_time = self.MAX_PING_TIME
         self._ping_interval = self.DEFAULT_PING_INTERVAL
         self._server_list = server_list
+        self._server_list.on_change = self._on_server_list_change
+        self._ping_schedule = ping_schedule
+        self._next_resolve_time = 0
+        self._ping_wakeup = threading.Event()
+        self._membership_listeners = []
         self._servers = set()
-        self._stats = LoadBalancerStats()
+        self._alive_servers = set()
+        self._slow_starting = set()
+        self._reachable_servers = tuple()
+        self._events = EventBus()
+        self._stats = LoadBalancerStats(circuit_breaker=circuit_breaker, slow_start=slow_start)
+        self._stats.on_circuit_change = self._on_circuit_change
         self._rule.load_balancer = self
+        self._outlier_detector = outlier_detector
+        if outlier_detector is not None:
+            outlier_detector.load_balancer = self
         self._logger = logging.getLogger(self.__module__)
 
+        # start with the servers that were reachable last time,
+        # until the first ping round has had a chance to run
+        self._snapshot_file = snapshot_file
+        self._is_discovered = False
+        if snapshot_file is not None:
+            self._load_snapshot_file()
+
         # start our background worker
         # to periodically ping our servers
         self._ping_timer_running = False
@@ -81,6 +131,18 @@ class LoadBalancer(object):
     def stats(self):
         return self._stats
 
+    @property
+    def outlier_detector(self):
+        return self._outlier_detector
+
+    @property
+    def events(self):
+        """
+        The :class:`~ballast.events.EventBus` servers being added,
+        removed, going down or coming back up are published on.
+        """
+        return self._events
+
     @property
     def servers(self):
         with self._server_lock:
@@ -88,25 +150,101 @@ class LoadBalancer(object):
 
     @property
     def reachable_servers(self):
-        with self._server_lock:
-            servers = set()
-            for s in self._servers:
-                if s.is_alive:
-                    servers.add(s)
+        return set(self._reachable_servers)
+
+    @property
+    def reachable_snapshot(self):
+        """
+        Immutable tuple of the reachable servers, sorted by priority.
+
+        A new tuple is published whenever server health changes, so
+        reading it never takes a lock or waits on a ping round.
+        """
+        return self._reachable_servers
+
+    def add_membership_listener(self, listener):
+        """
+        Call `listener(added, removed, changed)` with the servers that
+        were added to, removed from or changed (weight or priority) in
+        the server list whenever it's re-resolved.
+        """
+        self._membership_listeners.append(listener)
 
-        return servers
+    def remove_membership_listener(self, listener):
+        if listener in self._membership_listeners:
+            self._membership_listeners.remove(listener)
 
-    def choose_server(self):
+    def choose_server(self, hash_key=None):
 
         # choose a server, will
         # throw if there are none
-        server = self._rule.choose()
+        if hash_key is None:
+            server = self._rule.choose()
+
+            # servers ramping up after coming up are only
+            # admitted in proportion to their current weight
+            if self._slow_starting:
+                server = self._admit(server)
+        else:
+            server = self._rule.choose_for_key(hash_key)
 
         return server
 
+    def effective_weight(self, server):
+        """
+        The weight of `server`, scaled down while it's slow-starting.
+        """
+        return server.weight * self._stats.get_server_stats(server).slow_start_factor
+
+    def close(self):
+        """
+        Stop pinging servers in the background and release
+        the resources held by the ping strategy.
+        """
+        self._stop_ping_timer()
+        self._ping_wakeup.set()
+        self._ping_strategy.close()
+        self._server_list.close()
+        self._events.close()
+
+    def record_response_time(self, server, response_time):
+        self._rule.record_response_time(server, response_time)
+
+    def record_result(self, server, is_success, response_time=None):
+        """
+        Record the outcome of a request. Without an outlier detector
+        or a circuit breaker, a failed request marks the server down.
+        """
+        if self._outlier_detector is not None:
+            self._outlier_detector.record(server, is_success, response_time)
+        elif self._stats.circuit_breaker is not None:
+            # the breaker decides, from the server's stats
+            return
+        elif not is_success:
+            self.mark_server_down(server)
+
+    def eject_server(self, server, ejection_time, reason=None):
+        """
+        Take a server out of the load-balancing pool for `ejection_time`
+        seconds, without marking it down (it's still pinged as usual).
+        """
+        self._logger.warning("Ejecting server for %ss: %s (%s)", ejection_time, server, reason)
+        self._publish_snapshot()
+
+        # back into the pool once the ejection expires
+        t = threading.Timer(ejection_time, self._publish_snapshot)
+        t.daemon = True
+        t.start()
+
     def mark_server_down(self, server):
         self._logger.debug("Marking server down: %s", server)
         server._is_alive = False
+        self._publish_snapshot()
+
+        # have the background pinger check on it soon
+        if self._ping_schedule is not None:
+            self._ping_schedule.mark_down(server)
+            self._ping_wakeup.set()
 
     def ping(self, server=None):
         if server is None:
@@ -114,6 +252,7 @@ class LoadBalancer(object):
         else:
             is_alive = self._ping.is_alive(server)
             server._is_alive = is_alive
+            self._publish_snapshot()
 
     def ping_async(self, server=None):
         if server is None:
@@ -124,14 +263,278 @@ class LoadBalancer(object):
         else:
             is_alive = self._ping.is_alive(server)
             server._is_alive = is_alive
+            self._publish_snapshot()
 
     def _ping_all_servers(self):
-        with self._server_lock:
+
+        # one ping round at a time, but pinging happens
+        # outside of the server lock so choosing a
+        # server never waits on a slow ping round
+        with self._ping_lock:
+            self._discover_servers()
+
+            servers = self.servers
             results = self._ping_strategy.ping(
                 self._ping,
-                self._server_list
+                StaticServerList(servers)
             )
-            self._servers = set(results)
+            self._copy_ping_results(servers, results)
+
+            self._publish_snapshot()
+            self._save_snapshot_file()
+
+            if self._ping_schedule is not None:
+                for server in servers:
+                    self._ping_schedule.record(server, server.is_alive)
+
+    def _ping_scheduled_servers(self):
+        """
+        Resolve the server list if its TTL has expired and ping the
+        servers that are due, returns the seconds until more work is due.
+        """
+        schedule = self._ping_schedule
+
+        with self._ping_lock:
+            if timer() >= self._next_resolve_time:
+                self._resolve_servers()
+
+            due = schedule.pop_due()
+            if due:
+                try:
+                    results = self._ping_strategy.ping(self._ping, StaticServerList(due))
+                    self._copy_ping_results(due, results)
+                finally:
+                    # a ping that raised counts as failed
+                    for server in due:
+                        schedule.record(server, server.is_alive)
+
+                self._publish_snapshot()
+                self._save_snapshot_file()
+
+        next_time = self._next_resolve_time
+        next_ping_time = schedule.next_ping_time()
+        if next_ping_time is not None:
+            next_time = min(next_time, next_ping_time)
+
+        return next_time - timer()
+
+    def _resolve_servers(self):
+
+        self._discover_servers()
+
+        self._next_resolve_time = timer() + self._ping_schedule.resolve_interval(self.servers)
+
+    def _discover_servers(self):
+        """
+        Update the servers from the server list, returns the servers
+        that were added. Until the server list has returned any servers,
+        an empty result is ignored: discovery may just be down, and the
+        servers loaded from the snapshot file are all we have.
+        """
+        servers = list(self._server_list.get_servers())
+
+        if not servers and not self._is_discovered:
+            return []
+
+        self._is_discovered = True
+
+        return self._update_servers(servers)
+
+    def _update_servers(self, servers):
+        """
+        Merge freshly discovered servers into the current membership,
+        returns the servers that were added.
+
+        Servers we already know keep their `Server` object (and with it
+        their health and any other state), only picking up changes to
+        their weight, priority and ttl. New servers are down until they
+        have been pinged. Only the delta is passed on to the rule and
+        the membership listeners.
+        """
+        added = []
+        changed = []
+
+        with self._server_lock:
+            current = dict((s, s) for s in self._servers)
+            updated = set()
+
+            for server in servers:
+                if server in updated:
+                    continue
+
+                existing = current.get(server)
+                if existing is None:
+                    added.append(server)
+                    updated.add(server)
+                    continue
+
+                if existing.weight != server.weight or existing.priority != server.priority:
+                    existing.weight = server.weight
+                    existing.priority = server.priority
+                    changed.append(existing)
+
+                existing.ttl = server.ttl
+                updated.add(existing)
+
+            removed = [s for s in self._servers if s not in updated]
+            self._servers = updated
+
+        if not (added or removed or changed):
+            return added
+
+        self._logger.debug(
+            "Server list changed, added: %s, removed: %s, changed: %s",
+            len(added), len(removed), len(changed)
+        )
+
+        self._stats.retain(updated)
+        if self._ping_schedule is not None:
+            self._ping_schedule.update(updated)
+
+        self._publish_snapshot(force=bool(changed))
+
+        self._rule.servers_changed(added, removed, changed)
+        for listener in list(self._membership_listeners):
+            try:
+                listener(added, removed, changed)
+            except Exception as e:
+                self._logger.error("Membership listener failed: %s", e)
+
+        for server in added:
+            self._events.publish(Event(Event.SERVER_ADDED, server))
+        for server in removed:
+            self._events.publish(Event(Event.SERVER_REMOVED, server))
+
+        return added
+
+    def _load_snapshot_file(self):
+
+        servers = self._snapshot_file.load()
+        if not servers:
+            return
+
+        for server in servers:
+            server._is_alive = True
+
+        self._update_servers(servers)
+        self._publish_snapshot()
+
+    def _save_snapshot_file(self):
+        if self._snapshot_file is not None:
+            self._snapshot_file.save(self._reachable_servers)
+
+    def _on_server_list_change(self):
+        t = threading.Thread(name='ballast-worker', target=self._refresh_servers)
+        t.daemon = True
+        t.start()
+
+    def _refresh_servers(self):
+
+        # the server list told us it changed, apply the change
+        # right away, only pinging the servers that were added
+        try:
+            with self._ping_lock:
+                added = self._discover_servers()
+                if not added:
+                    return
+
+                results = self._ping_strategy.ping(self._ping, StaticServerList(added))
+                self._copy_ping_results(added, results)
+                self._publish_snapshot()
+
+                if self._ping_schedule is not None:
+                    for server in added:
+                        self._ping_schedule.record(server, server.is_alive)
+        except BaseException as e:
+            self._logger.error("There was an error refreshing servers: %s", e)
+
+    def _copy_ping_results(self, servers, results):
+
+        # strategies that ping in another process
+        # hand back copies of the servers they pinged
+        current = dict((s, s) for s in servers)
+        for result in results:
+            server = current.get(result)
+            if server is not None and server is not result:
+                server._is_alive = result._is_alive
+                server._ping_time = getattr(result, '_ping_time', None)
+
+    def _publish_snapshot(self, force=False):
+        events = []
+
+        with self._server_lock:
+            alive = set(s for s in self._servers if s.is_alive)
+
+            # health changes of servers that are still listed,
+            # removed servers get a removed event instead
+            up = alive - self._alive_servers
+            for server in up:
+                events.append(Event(Event.SERVER_UP, server))
+            for server in self._alive_servers - alive:
+                if server in self._servers:
+                    events.append(Event(Event.SERVER_DOWN, server))
+
+            # servers that come up while others are already serving
+            # are slow-started (when all of them come up together,
+            # e.g. on start up, there's nobody to take up the slack)
+            if self._stats.slow_start is not None and self._alive_servers:
+                now = timer()
+                for server in up:
+                    self._stats.get_server_stats(server).start_slow_start(now)
+                self._slow_starting = (self._slow_starting & alive) | up
+
+            self._alive_servers = alive
+
+            reachable = [s for s in alive if not self._is_ejected(s)]
+
+            # tripped servers are left out of the snapshot, so
+            # rules never have to check for them when choosing
+            if self._stats.circuit_breaker is not None:
+                now = timer()
+                reachable = [s for s in reachable if not self._stats.get_server_stats(s).is_tripped(now)]
+
+            reachable.sort(key=lambda s: (s.priority, s.address, s.port))
+
+            # keep the same snapshot when nothing changed, so
+            # rules can keep the tables they built for it
+            previous = self._reachable_servers
+            if force or len(previous) != len(reachable) or any(a is not b for a, b in zip(previous, reachable)):
+                self._reachable_servers = tuple(reachable)
+                events.append(Event(Event.SNAPSHOT_PUBLISHED, snapshot=self._reachable_servers))
+
+        # delivered on the event bus' own thread
+        for event in events:
+            self._events.publish(event)
+
+    def _admit(self, server):
+
+        for _ in range(self.MAX_SLOW_START_ATTEMPTS):
+            if server not in self._slow_starting:
+                return server
+
+            factor = self._stats.get_server_stats(server).slow_start_factor
+            if factor >= 1.0:
+                self._slow_starting.discard(server)
+                return server
+
+            if random.random() < factor:
+                return server
+
+            server = self._rule.choose()
+
+        return server
+
+    def _on_circuit_change(self, server_stats):
+        self._publish_snapshot()
+
+        # check again once the cool-down is over
+        if server_stats.circuit_state != CircuitBreaker.CLOSED:
+            t = threading.Timer(server_stats.circuit_breaker.cool_down, self._publish_snapshot)
+            t.daemon = True
+            t.start()
+
+    def _is_ejected(self, server):
+        return self._outlier_detector is not None and self._outlier_detector.is_ejected(server)
 
     def _start_ping_timer(self):
 
@@ -152,15 +555,75 @@ class LoadBalancer(object):
 
     def _ping_loop(self):
         while self._ping_timer_running:
+            wait_time = self._ping_interval
             try:
-                self._ping_all_servers()
+                if self._ping_schedule is None:
+                    self._ping_all_servers()
+                else:
+                    wait_time = self._ping_scheduled_servers()
             except BaseException as e:
                 self._logger.error("There was an error pinging servers: %s", e)
 
-            time.sleep(self._ping_interval)
+            # woken early when a server is marked down
+            self._ping_wakeup.wait(max(wait_time, 0))
+            self._ping_wakeup.clear()
 
 
 class LoadBalancerStats(object):
 
+    def __init__(
+            self,
+            ewma_alpha=ServerStats.DEFAULT_EWMA_ALPHA,
+            window_size=ServerStats.DEFAULT_WINDOW_SIZE,
+            circuit_breaker=None,
+            slow_start=None
+    ):
+        self.ewma_alpha = ewma_alpha
+        self.window_size = window_size
+        self.circuit_breaker = circuit_breaker
+        self.slow_start = slow_start
+        self.on_circuit_change = None
+        self._lock = threading.Lock()
+        self._server_stats = dict()
+
+    @property
+    def active_requests(self):
+        return sum(s.active_requests for s in list(self._server_stats.values()))
+
+    @property
+    def total_requests(self):
+        return sum(s.total_requests for s in list(self._server_stats.values()))
+
     def get_server_stats(self, server):
-        pass
+
+        # fast path, the lock is only needed
+        # the first time we see a server
+        stats = self._server_stats.get(server)
+
+        if stats is None:
+            with self._lock:
+                stats = self._server_stats.get(server)
+                if stats is None:
+                    stats = ServerStats(
+                        self.ewma_alpha,
+                        self.window_size,
+                        self,
+                        self.circuit_breaker,
+                        self.slow_start
+                    )
+                    self._server_stats[server] = stats
+
+        return stats
+
+    def circuit_changed(self, server_stats):
+        if self.on_circuit_change is not None:
+            self.on_circuit_change(server_stats)
+
+    def retain(self, servers):
+        """
+        Drop the stats of any server not contained in `servers`.
+        """
+        with self._lock:
+            for server in list(self._server_stats):
+                if server not in servers:
+                    del self._server_stats[server]
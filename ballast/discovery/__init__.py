@@ -1,5 +1,10 @@
 import abc
+import threading
+from timeit import default_timer as timer
 from past.builtins import cmp
+from ballast.util import SlidingWindow
+from ballast.breaker import CircuitBreaker
+from ballast.slowstart import SlowStart
 
 
 class Server(object):
@@ -11,6 +16,7 @@ class Server(object):
         self.priority = priority
         self.ttl = ttl
         self._is_alive = False
+        self._ping_time = None
 
     def __str__(self):
         return "%s(%s:%s, ttl:%s, weight:%s, priority:%s, alive:%s)" % (
@@ -42,54 +48,283 @@ class Server(object):
     def is_alive(self):
         return self._is_alive
 
+    @property
+    def ping_time(self):
+        """
+        The time (in seconds) the last ping took, if
+        measured by the ping strategy, otherwise None.
+        """
+        return self._ping_time
+
 
 class ServerList(object):
 
     __metaclass__ = abc.ABCMeta
 
+    # set by the load balancer, server lists that know
+    # when their servers change call it (via _changed)
+    # so changes don't have to wait for the next ping
+    on_change = None
+
     @abc.abstractmethod
     def get_servers(self):
         return []
 
+    def close(self):
+        """
+        Release any resources (e.g. background threads) held
+        by the server list. Does nothing by default.
+        """
+        pass
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
 
 class ServerStats(object):
+    """
+    Request statistics for a single server.
+
+    Each server has its own (uncontended, in the common case) lock, so
+    updating the stats of one server never blocks requests to another.
+
+    Given a :class:`~ballast.breaker.CircuitBreaker` policy, the stats
+    also keep the state of the server's circuit, and given a
+    :class:`~ballast.slowstart.SlowStart` policy, the progress of
+    the server's slow start.
+    """
+
+    DEFAULT_EWMA_ALPHA = 0.2
+    DEFAULT_WINDOW_SIZE = 100
+
+    def __init__(
+            self,
+            ewma_alpha=DEFAULT_EWMA_ALPHA,
+            window_size=DEFAULT_WINDOW_SIZE,
+            load_balancer_stats=None,
+            circuit_breaker=None,
+            slow_start=None
+    ):
+
+        assert 0 < ewma_alpha <= 1
+        assert circuit_breaker is None or isinstance(circuit_breaker, CircuitBreaker)
+        assert slow_start is None or isinstance(slow_start, SlowStart)
+
+        self.ewma_alpha = ewma_alpha
+        self.circuit_breaker = circuit_breaker
+        self.slow_start = slow_start
+        self._load_balancer_stats = load_balancer_stats
+        self._lock = threading.Lock()
+        self._active_requests = 0
+        self._total_requests = 0
+        self._failure_count = 0
+        self._average_response_time = None
+        self._response_times = SlidingWindow(window_size)
+        self._circuit_state = CircuitBreaker.CLOSED
+        self._consecutive_failures = 0
+        self._open_until = 0
+        self._probes = 0
+        self._up_since = None
 
     @property
     def active_requests(self):
         """
         The current number of active requests
         """
-        return 0
+        return self._active_requests
+
+    @property
+    def total_requests(self):
+        return self._total_requests
 
     @property
     def utilization(self):
         """
         The current utilization as a percentage between 0 and 100.
         """
-        return 0
+        if self._load_balancer_stats is None:
+            return 100 if self._active_requests > 0 else 0
+
+        total = self._load_balancer_stats.active_requests
+        if total == 0:
+            return 0
+
+        return 100.0 * self._active_requests / total
 
     @property
     def failure_count(self):
-        return 0
+        return self._failure_count
 
     @property
     def average_response_time(self):
-        return 0
+        """
+        Exponentially weighted moving average of the response time.
+        """
+        if self._average_response_time is None:
+            return 0
+        return self._average_response_time
+
+    def response_time_percentile(self, percentile):
+        """
+        Percentile of the most recent response times, None if there are none yet.
+        """
+        return self._response_times.percentile(percentile)
+
+    def response_time_histogram(self, bounds):
+        return self._response_times.histogram(bounds)
 
     def add_response_time(self, time):
-        pass
+
+        # appending to the window is thread-safe on its own
+        self._response_times.add(time)
+
+        with self._lock:
+            if self._average_response_time is None:
+                self._average_response_time = time
+            else:
+                self._average_response_time += self.ewma_alpha * (time - self._average_response_time)
+
+    @property
+    def circuit_state(self):
+        """
+        The state of the server's circuit: closed, open or half-open.
+        """
+        with self._lock:
+            return self._current_circuit_state(timer())
 
     def increment_failures(self):
-        pass
+        changed = False
+
+        with self._lock:
+            self._failure_count += 1
+            self._consecutive_failures += 1
+
+            if self.circuit_breaker is not None:
+                now = timer()
+                state = self._current_circuit_state(now)
+
+                # a failed probe re-opens the circuit straight away
+                if state == CircuitBreaker.HALF_OPEN or (
+                    state == CircuitBreaker.CLOSED and
+                    self._consecutive_failures >= self.circuit_breaker.failure_threshold
+                ):
+                    self._circuit_state = CircuitBreaker.OPEN
+                    self._open_until = now + self.circuit_breaker.cool_down
+                    changed = True
+
+        if changed:
+            self._circuit_changed()
+
+    def record_success(self):
+        changed = False
+
+        with self._lock:
+            self._consecutive_failures = 0
+
+            if self.circuit_breaker is not None:
+                if self._current_circuit_state(timer()) == CircuitBreaker.HALF_OPEN:
+                    self._circuit_state = CircuitBreaker.CLOSED
+                    changed = True
+
+        if changed:
+            self._circuit_changed()
 
     def increment_active_requests(self):
-        pass
+        changed = False
+
+        with self._lock:
+            self._active_requests += 1
+            self._total_requests += 1
+
+            # count the probes let through while half-open, once
+            # they've all been sent the server is tripped until
+            # one of them comes back (or another cool-down passes)
+            if self.circuit_breaker is not None:
+                now = timer()
+                if self._current_circuit_state(now) == CircuitBreaker.HALF_OPEN:
+                    self._probes += 1
+                    if self._probes == self.circuit_breaker.half_open_requests:
+                        self._open_until = now + self.circuit_breaker.cool_down
+                        changed = True
+
+        if changed:
+            self._circuit_changed()
 
     def decrement_active_requests(self):
-        pass
+        with self._lock:
+            self._active_requests -= 1
 
     def is_tripped(self, current_time):
         """
         Whether or not the circuit breaker tripped due to too many failures.
         """
-        return False
+        if self.circuit_breaker is None:
+            return False
+
+        with self._lock:
+            state = self._current_circuit_state(current_time)
+
+            if state == CircuitBreaker.OPEN:
+                return True
+
+            if state == CircuitBreaker.HALF_OPEN:
+                return self._probes >= self.circuit_breaker.half_open_requests
+
+            return False
+
+    @property
+    def slow_start_factor(self):
+        """
+        The fraction of its full weight the server currently gets,
+        1.0 unless it's ramping up after coming up.
+        """
+        return self.get_slow_start_factor(timer())
+
+    def get_slow_start_factor(self, current_time):
+
+        up_since = self._up_since
+        if self.slow_start is None or up_since is None:
+            return 1.0
+
+        factor = self.slow_start.factor(current_time - up_since)
+
+        # done ramping, skip the maths from now on
+        if factor >= 1.0:
+            self._up_since = None
+
+        return factor
+
+    def start_slow_start(self, current_time):
+        """
+        Start ramping the server up, because it has just come up.
+        """
+        if self.slow_start is not None:
+            self._up_since = current_time
+
+    def _current_circuit_state(self, current_time):
+
+        # an open circuit is half-open once the cool-down
+        # has passed, as are probes that never came back
+        if current_time >= self._open_until:
+            if self._circuit_state == CircuitBreaker.OPEN:
+                self._circuit_state = CircuitBreaker.HALF_OPEN
+                self._probes = 0
+            elif (
+                self._circuit_state == CircuitBreaker.HALF_OPEN and
+                self._probes >= self.circuit_breaker.half_open_requests
+            ):
+                self._probes = 0
+
+        return self._circuit_state
+
+    def _circuit_changed(self):
+        if self._load_balancer_stats is not None:
+            self._load_balancer_stats.circuit_changed(self)
+
+
+def _fingerprint(servers):
+    """
+    What server lists compare to tell whether their servers changed.
+    """
+    return set((s.address, s.port, s.weight, s.priority) for s in servers)
@@ -0,0 +1,119 @@
+import logging
+import threading
+from timeit import default_timer as timer
+from ballast.discovery import ServerList, _fingerprint
+
+
+class CachingServerList(ServerList):
+    """
+    Caches the servers of another :class:`~ballast.discovery.ServerList`
+    for as long as their TTLs allow, so resolving them doesn't wait on a
+    DNS or Consul round-trip.
+
+    Once `refresh_ratio` of the shortest TTL has passed, the servers are
+    refreshed in the background while the cached ones keep being served.
+    If the source fails (raises, or comes back empty), the last servers
+    are served for up to `max_stale` seconds past their expiry.
+    """
+
+    DEFAULT_TTL = 30
+    DEFAULT_REFRESH_RATIO = 0.8
+    DEFAULT_MAX_STALE = 300
+    RETRY_INTERVAL = 1
+
+    def __init__(
+            self,
+            server_list,
+            refresh_ratio=DEFAULT_REFRESH_RATIO,
+            max_stale=DEFAULT_MAX_STALE,
+            default_ttl=DEFAULT_TTL
+    ):
+        super(CachingServerList, self).__init__()
+
+        assert isinstance(server_list, ServerList)
+        assert 0 < refresh_ratio <= 1
+        assert max_stale >= 0
+        assert default_ttl > 0
+
+        self.refresh_ratio = refresh_ratio
+        self.max_stale = max_stale
+        self.default_ttl = default_ttl
+        self._server_list = server_list
+        self._lock = threading.Lock()
+        self._servers = None
+        self._refresh_time = 0
+        self._expire_time = 0
+        self._refreshing = None
+        self._logger = logging.getLogger(self.__module__)
+
+        # pass changes the source knows about straight on
+        self._server_list.on_change = self._source_changed
+
+    def get_servers(self):
+
+        # nothing to serve yet, wait for the source
+        if self._servers is None:
+            self._refresh()
+
+        now = timer()
+        servers = self._servers
+        expire_time = self._expire_time
+
+        if now >= self._refresh_time:
+            self._refresh_async()
+
+        if now >= expire_time + self.max_stale:
+            self._logger.error("Cached servers expired more than %ss ago, not serving them", self.max_stale)
+            return []
+
+        return list(servers)
+
+    def close(self):
+        self._server_list.close()
+
+    def _refresh_async(self):
+
+        # one refresh at a time
+        with self._lock:
+            if self._refreshing is not None:
+                return
+
+            self._refreshing = threading.Thread(name='ballast-worker', target=self._source_changed)
+            self._refreshing.daemon = True
+            self._refreshing.start()
+
+    def _refresh(self):
+        """
+        Fetch the servers from the source, returns whether they changed.
+        """
+        try:
+            servers = list(self._server_list.get_servers())
+        except Exception as e:
+            self._logger.warning("Could not refresh servers: %s", e)
+            servers = []
+
+        now = timer()
+        changed = False
+
+        if servers:
+            ttls = [s.ttl for s in servers if s.ttl is not None]
+            ttl = min(ttls) if ttls else self.default_ttl
+
+            changed = self._servers is not None and _fingerprint(servers) != _fingerprint(self._servers)
+            self._servers = servers
+            self._refresh_time = now + ttl * self.refresh_ratio
+            self._expire_time = now + ttl
+        else:
+            # keep serving what we have, but try again soon
+            self._logger.warning("No servers from %s, serving cached servers", self._server_list)
+            self._refresh_time = now + self.RETRY_INTERVAL
+            if self._servers is None:
+                self._servers = []
+
+        self._refreshing = None
+
+        return changed
+
+    def _source_changed(self):
+        if self._refresh():
+            self._changed()
@@ -1,52 +1,260 @@
 import logging
+import threading
 import requests
 from past.builtins import unicode
 from ballast.util import UrlBuilder
-from ballast.discovery import Server, ServerList
+from ballast.discovery import Server, ServerList, _fingerprint
 
 
 class ConsulRestRecordList(ServerList):
+    """
+    Servers registered for `service` in Consul's catalog.
+
+    By default, the catalog is queried every time the servers are
+    resolved. With `watch` enabled, a background thread keeps a
+    blocking query (long-poll) open on a persistent connection instead,
+    waiting up to `wait` seconds for the catalog to change. The servers
+    are returned from memory, and the load balancer is told about any
+    change as soon as Consul reports it.
+    """
 
     _SERVICE_URL = '/v1/catalog/service/'
+    _INDEX_HEADER = 'X-Consul-Index'
+
+    DEFAULT_WAIT = 300
+    INITIAL_TIMEOUT = 10
+    MAX_RETRY_INTERVAL = 30
 
-    def __init__(self, base_url, service, dc=None, near=None, tag=None):
+    def __init__(self, base_url, service, dc=None, near=None, tag=None, watch=False, wait=DEFAULT_WAIT):
         super(ConsulRestRecordList, self).__init__()
+
+        assert wait > 0
+
         self.base_url = base_url
         self.service = service
         self.dc = dc
         self.near = near
         self.tag = tag
+        self.watch = watch
+        self.wait = wait
         self._logger = logging.getLogger(self.__module__)
 
-    def get_servers(self):
+        self._servers = []
+        self._index = 0
+        self._loaded = threading.Event()
+        self._waited = False
+        self._stopped = threading.Event()
+        self._session = None
+        self._watcher = None
 
-        try:
-            url = UrlBuilder.from_url(self.base_url)
-            url.path(self._SERVICE_URL)
-            url.append_path(self.service)
+        if watch:
+            self._session = requests.Session()
+            self._watcher = threading.Thread(name='ballast-consul-watch', target=self._watch)
+            self._watcher.daemon = True
+            self._watcher.start()
 
-            if self.dc is not None:
-                url.add_query_param('dc', self.dc)
+    def get_servers(self):
 
-            if self.near is not None:
-                url.add_query_param('near', self.near)
+        if self.watch:
+            # only the first call waits for the initial catalog, if
+            # consul is unreachable later calls don't stall a ping round
+            if not self._waited:
+                self._waited = True
+                self._loaded.wait(self.INITIAL_TIMEOUT)
+            return list(self._servers)
 
-            if self.tag is not None:
-                url.add_query_param('tag', self.tag)
+        return self._query_servers()
 
-            response = requests.get(unicode(url))
-            json = response.json()
+    def close(self):
+        self._stopped.set()
+        if self._session is not None:
+            self._session.close()
 
-            for entry in json:
-                s = Server(
-                    entry['Address'],
-                    entry['ServicePort'],
-                    ttl=10
-                )
+    def _query_servers(self):
 
-                self._logger.debug("Created server from Consul REST API record: %s", s)
+        try:
+            response = requests.get(unicode(self._service_url()))
+            json = response.json()
 
+            for s in self._parse(json):
                 yield s
 
         except:
             return
+
+    def _watch(self):
+
+        retry_interval = 1
+
+        while not self._stopped.is_set():
+            try:
+                changed = self._poll()
+                retry_interval = 1
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+
+                self._logger.warning("Consul blocking query failed, retrying in %ss: %s", retry_interval, e)
+                self._stopped.wait(retry_interval)
+                retry_interval = min(retry_interval * 2, self.MAX_RETRY_INTERVAL)
+                continue
+
+            if changed:
+                self._changed()
+
+    def _poll(self):
+        """
+        Block until the catalog changes (or the wait is over),
+        returns whether or not the servers have changed.
+        """
+        url = self._service_url()
+        url.add_query_param('index', self._index)
+        url.add_query_param('wait', '%ss' % self.wait)
+
+        # consul adds up to wait / 16 of jitter to the wait
+        response = self._session.get(unicode(url), timeout=self.wait + self.wait / 16.0 + 5)
+        response.raise_for_status()
+
+        index = int(response.headers.get(self._INDEX_HEADER, 0))
+        if index == self._index and self._loaded.is_set():
+            return False
+
+        servers = list(self._parse(response.json()))
+
+        # the index can go backwards (e.g. when consul
+        # restores from a snapshot), start over if it does
+        self._index = index if index >= self._index else 0
+
+        changed = _fingerprint(self._servers) != _fingerprint(servers) or not self._loaded.is_set()
+        self._servers = servers
+        self._loaded.set()
+
+        return changed
+
+    def _service_url(self):
+
+        url = UrlBuilder.from_url(self.base_url)
+        url.path(self._SERVICE_URL)
+        url.append_path(self.service)
+
+        if self.dc is not None:
+            url.add_query_param('dc', self.dc)
+
+        if self.near is not None:
+            url.add_query_param('near', self.near)
+
+        if self.tag is not None:
+            url.add_query_param('tag', self.tag)
+
+        return url
+
+    def _parse(self, json):
+
+        for entry in json:
+            s = Server(
+                entry['Address'],
+                entry['ServicePort'],
+                ttl=10
+            )
+
+            self._logger.debug("Created server from Consul REST API record: %s", s)
+
+            yield s
+
+
+class ConsulHealthRecordList(ConsulRestRecordList):
+    """
+    Servers registered for `service` in Consul, as reported by its health
+    endpoint. Unless `passing` is disabled, only instances whose health
+    checks are all passing are returned, so the load balancer never has
+    to ping its way past instances Consul already knows to be down.
+
+    Each server's weight is taken from the service's weights (its
+    `Warning` weight while a check is warning), its priority from the
+    `tag_priorities` of its tags (the best one wins). A `weight` or
+    `priority` entry in the service's (or else the node's) metadata
+    overrides both.
+    """
+
+    _SERVICE_URL = '/v1/health/service/'
+
+    WEIGHT_KEY = 'weight'
+    PRIORITY_KEY = 'priority'
+
+    def __init__(self, base_url, service, dc=None, near=None, tag=None, watch=False,
+                 wait=ConsulRestRecordList.DEFAULT_WAIT, passing=True, tag_priorities=None):
+
+        self.passing = passing
+        self.tag_priorities = tag_priorities or dict()
+
+        super(ConsulHealthRecordList, self).__init__(base_url, service, dc, near, tag, watch, wait)
+
+    def _service_url(self):
+
+        url = super(ConsulHealthRecordList, self)._service_url()
+
+        if self.passing:
+            url.add_query_param('passing', 'true')
+
+        return url
+
+    def _parse(self, json):
+
+        for entry in json:
+            node = entry.get('Node') or dict()
+            service = entry.get('Service') or dict()
+            checks = entry.get('Checks') or []
+
+            s = Server(
+                service.get('Address') or node.get('Address'),
+                service['Port'],
+                weight=self._weight(node, service, checks),
+                priority=self._priority(node, service),
+                ttl=10
+            )
+
+            self._logger.debug("Created server from Consul health record: %s", s)
+
+            yield s
+
+    def _weight(self, node, service, checks):
+
+        weight = self._meta_int(node, service, self.WEIGHT_KEY)
+        if weight is not None:
+            return weight
+
+        weights = service.get('Weights') or dict()
+        if any(c.get('Status') == 'warning' for c in checks):
+            return weights.get('Warning', 1)
+
+        return weights.get('Passing', 1)
+
+    def _priority(self, node, service):
+
+        priority = self._meta_int(node, service, self.PRIORITY_KEY)
+        if priority is not None:
+            return priority
+
+        priorities = [self.tag_priorities[t] for t in service.get('Tags') or [] if t in self.tag_priorities]
+
+        return min(priorities) if priorities else 1
+
+    def _meta_int(self, node, service, key):
+
+        value = _meta(node, service, key)
+        if value is None:
+            return None
+
+        # one bad instance mustn't fail the whole service
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            self._logger.warning("Ignoring invalid %s in Consul metadata of %s: %r", key, service.get('ID'), value)
+            return None
+
+
+def _meta(node, service, key):
+    for meta in (service.get('Meta'), node.get('Meta')):
+        if meta and meta.get(key):
+            return meta[key]
+    return None
@@ -27,33 +27,72 @@ class DnsRecordList(ServerList):
     def __init__(self, dns_qname, dns_host=None, dns_port=None):
 
         self._dns_qname = dns_qname
+        self._dns_host = dns_host
         self._logger = logging.getLogger(self.__module__)
 
         # create a DNS resolver that caches results
-        self._dns_resolver = resolver.Resolver()
-        self._dns_resolver.cache = DnsRecordList._RESOLVER_CACHE
+        self._resolver = resolver.Resolver()
+        self._resolver.cache = DnsRecordList._RESOLVER_CACHE
 
         if dns_port is not None:
-            self._dns_resolver.port = dns_port
+            self._resolver.port = dns_port
 
-        if dns_host is not None:
+        # the DNS host is looked up on first use, so
+        # creating a server list never waits on DNS
+        self._nameserver_resolved = dns_host is None
+
+    @property
+    def _dns_resolver(self):
+
+        if not self._nameserver_resolved:
             try:
-                self._dns_resolver.nameservers = [
-                    socket.gethostbyname(dns_host)
-                ]
+                self.set_nameserver(socket.gethostbyname(self._dns_host))
             except Exception as e:
                 raise BallastConfigurationException(
-                    'Name resolution failed for DNS host: %s' % dns_host,
+                    'Name resolution failed for DNS host: %s' % self._dns_host,
                     e
                 )
 
-    @abc.abstractmethod
+        return self._resolver
+
+    @property
+    def dns_host(self):
+        return self._dns_host
+
+    @property
+    def nameserver_resolved(self):
+        return self._nameserver_resolved
+
+    def set_nameserver(self, address):
+        """
+        Use the DNS host at `address` (an IP address).
+        """
+        self._resolver.nameservers = [address]
+        self._nameserver_resolved = True
+
     def get_servers(self):
+
+        try:
+            answer = self._dns_resolver.query(self._dns_qname, self.RDTYPE)
+
+            for s in self.servers_from_answer(answer):
+                yield s
+
+        except BallastConfigurationException as e:
+            self._logger.error("%s", e)
+            return
+        except (exception.DNSException, BallastException):
+            return
+
+    @abc.abstractmethod
+    def servers_from_answer(self, answer):
         pass
 
 
 class DnsARecordList(DnsRecordList):
 
+    RDTYPE = rdatatype.A
+
     def __init__(self, dns_qname, dns_host=None, dns_port=None, server_port=80):
         super(DnsARecordList, self).__init__(
             dns_qname,
@@ -62,31 +101,26 @@ class DnsARecordList(DnsRecordList):
         )
         self.server_port = server_port
 
-    def get_servers(self):
+    def servers_from_answer(self, answer):
 
-        try:
-            # query SRV records for our service name
-            answer = self._dns_resolver.query(self._dns_qname, rdatatype.A)
-
-            # iterate the results, generate server objects
-            for i, srv in enumerate(answer):
-                ttl = answer.response.answer[0].ttl
-                s = Server(
-                    srv.address,
-                    self.server_port,
-                    ttl=ttl
-                )
+        # iterate the results, generate server objects
+        for i, srv in enumerate(answer):
+            ttl = answer.response.answer[0].ttl
+            s = Server(
+                srv.address,
+                self.server_port,
+                ttl=ttl
+            )
 
-                self._logger.debug("Created server from DNS A record: %s", s)
+            self._logger.debug("Created server from DNS A record: %s", s)
 
-                yield s
-
-        except (exception.DNSException, BallastException):
-            return
+            yield s
 
 
 class DnsServiceRecordList(DnsRecordList):
 
+    RDTYPE = rdatatype.SRV
+
     def __init__(self, dns_qname, dns_host=None, dns_port=None):
         super(DnsServiceRecordList, self).__init__(
             dns_qname,
@@ -94,34 +128,27 @@ class DnsServiceRecordList(DnsRecordList):
             dns_port
         )
 
-    def get_servers(self):
-
-        try:
-            # query SRV records for our service name
-            answer = self._dns_resolver.query(self._dns_qname, rdatatype.SRV)
-
-            # iterate the results, generate server objects
-            for i, srv in enumerate(answer):
-                rdata = answer.response.additional[0].items[i]
-                if isinstance(rdata, A):
-                    address = rdata.address
-                elif isinstance(rdata, CNAME):
-                    address = unicode(rdata.target).rstrip('.')
-                else:
-                    raise BallastException('Unexpected DNS record: %s' % rdata)
-
-                ttl = answer.response.additional[0].ttl
-                s = Server(
-                    address,
-                    srv.port,
-                    srv.weight,
-                    srv.priority,
-                    ttl
-                )
-
-                self._logger.debug("Created server from DNS SRV record: %s", s)
-
-                yield s
-
-        except (exception.DNSException, BallastException):
-            return
+    def servers_from_answer(self, answer):
+
+        # iterate the results, generate server objects
+        for i, srv in enumerate(answer):
+            rdata = answer.response.additional[0].items[i]
+            if isinstance(rdata, A):
+                address = rdata.address
+            elif isinstance(rdata, CNAME):
+                address = unicode(rdata.target).rstrip('.')
+            else:
+                raise BallastException('Unexpected DNS record: %s' % rdata)
+
+            ttl = answer.response.additional[0].ttl
+            s = Server(
+                address,
+                srv.port,
+                srv.weight,
+                srv.priority,
+                ttl
+            )
+
+            self._logger.debug("Created server from DNS SRV record: %s", s)
+
+            yield s
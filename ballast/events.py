@@ -0,0 +1,112 @@
+import logging
+import threading
+from queue import Queue
+
+
+class Event(object):
+    """
+    A change to a :class:`~ballast.LoadBalancer`'s servers. `server` is
+    set for server events, `snapshot` (the new reachable servers) for
+    snapshot events.
+    """
+
+    SERVER_ADDED = 'server-added'
+    SERVER_REMOVED = 'server-removed'
+    SERVER_DOWN = 'server-down'
+    SERVER_UP = 'server-up'
+    SNAPSHOT_PUBLISHED = 'snapshot-published'
+
+    def __init__(self, type, server=None, snapshot=None):
+        self.type = type
+        self.server = server
+        self.snapshot = snapshot
+
+    def __repr__(self):
+        return 'Event(%s, %s)' % (self.type, self.server)
+
+
+class EventBus(object):
+    """
+    Delivers events to their subscribers on a background thread, so
+    whatever published an event (e.g. a failed request marking its
+    server down) never waits on, or is broken by, a subscriber.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = dict()
+        self._queue = Queue()
+        self._thread = None
+        self._logger = logging.getLogger(self.__module__)
+
+    def subscribe(self, event_type, callback):
+        """
+        Call `callback(event)` for every event of `event_type`,
+        or every event at all if `event_type` is None.
+        """
+        with self._lock:
+            # copy on write, publishing never takes the lock
+            subscribers = dict(self._subscribers)
+            subscribers[event_type] = subscribers.get(event_type, ()) + (callback,)
+            self._subscribers = subscribers
+
+    def unsubscribe(self, event_type, callback):
+        with self._lock:
+            subscribers = dict(self._subscribers)
+            callbacks = tuple(c for c in subscribers.get(event_type, ()) if c != callback)
+            if callbacks:
+                subscribers[event_type] = callbacks
+            else:
+                subscribers.pop(event_type, None)
+            self._subscribers = subscribers
+
+    def publish(self, event):
+
+        subscribers = self._subscribers
+        callbacks = subscribers.get(event.type, ()) + subscribers.get(None, ())
+
+        # nothing to do if nobody's listening
+        if not callbacks:
+            return
+
+        self._start()
+        self._queue.put((event, callbacks))
+
+    def flush(self):
+        """
+        Wait for every event published so far to be delivered.
+        """
+        self._queue.join()
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread = None
+
+    def _start(self):
+
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(name='ballast-events', target=self._dispatch)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+
+                event, callbacks = item
+                for callback in callbacks:
+                    try:
+                        callback(event)
+                    except Exception as e:
+                        self._logger.error("Event subscriber failed on %s: %s", event, e)
+            finally:
+                self._queue.task_done()
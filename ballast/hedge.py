@@ -0,0 +1,101 @@
+import threading
+from timeit import default_timer as timer
+from ballast.util import SlidingWindow
+
+
+class Hedge(object):
+    """
+    Opt-in hedging policy for idempotent requests.
+
+    If the first server hasn't responded within the hedge delay, a
+    duplicate request is sent to a second server and whichever responds
+    first wins. The delay is either a fixed number of seconds (`delay`)
+    or a `percentile` of the response times recently observed by the
+    service, bounded by `min_delay` and `max_delay`.
+    """
+
+    DEFAULT_METHODS = ('GET', 'HEAD')
+    DEFAULT_MIN_SAMPLES = 20
+
+    # how often (in seconds) the percentile
+    # based delay is re-calculated
+    _DELAY_REFRESH_INTERVAL = 1
+
+    def __init__(
+            self,
+            delay=None,
+            percentile=None,
+            min_delay=0,
+            max_delay=None,
+            methods=DEFAULT_METHODS,
+            min_samples=DEFAULT_MIN_SAMPLES,
+            window_size=SlidingWindow.DEFAULT_SIZE
+    ):
+
+        assert (delay is None) != (percentile is None), 'Specify either a fixed delay or a percentile'
+        assert delay is None or delay >= 0
+        assert percentile is None or 0 < percentile <= 100
+        assert max_delay is None or max_delay >= min_delay
+
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.methods = frozenset(m.upper() for m in methods)
+        self.min_samples = min_samples
+        self._response_times = SlidingWindow(window_size)
+        self._lock = threading.Lock()
+        self._hedges_sent = 0
+        self._hedges_won = 0
+        self._percentile_delay = None
+        self._next_refresh = 0
+
+    @property
+    def hedges_sent(self):
+        return self._hedges_sent
+
+    @property
+    def hedges_won(self):
+        return self._hedges_won
+
+    def is_hedged(self, method):
+        return method.upper() in self.methods
+
+    def delay_time(self):
+        """
+        The number of seconds to wait before sending a hedged
+        request, or None if a request shouldn't be hedged (i.e.
+        there aren't enough samples to derive a percentile yet).
+        """
+        if self.delay is not None:
+            return self.delay
+
+        now = timer()
+        if now >= self._next_refresh:
+            self._next_refresh = now + self._DELAY_REFRESH_INTERVAL
+            self._percentile_delay = self._calculate_percentile_delay()
+
+        return self._percentile_delay
+
+    def add_response_time(self, response_time):
+        self._response_times.add(response_time)
+
+    def increment_hedges_sent(self):
+        with self._lock:
+            self._hedges_sent += 1
+
+    def increment_hedges_won(self):
+        with self._lock:
+            self._hedges_won += 1
+
+    def _calculate_percentile_delay(self):
+
+        if len(self._response_times) < self.min_samples:
+            return self.max_delay
+
+        delay = max(self.min_delay, self._response_times.percentile(self.percentile))
+
+        if self.max_delay is not None:
+            delay = min(delay, self.max_delay)
+
+        return delay
@@ -0,0 +1,241 @@
+import math
+import threading
+from timeit import default_timer as timer
+
+
+class OutlierDetector(object):
+    """
+    Passive health checking: ejects servers from the load-balancing pool
+    based on the outcome of real requests, rather than waiting for a ping.
+
+    A server is ejected after `consecutive_failures` failed requests in a
+    row, or when, over the last `interval` seconds, its success rate (or
+    average response time) is more than `stdev_factor` standard deviations
+    worse than that of its peers. Statistical detection only kicks in when
+    at least `min_servers` servers have made `min_requests` requests (with
+    fewer than 5 servers, a single outlier can't stand out by 1.9 standard
+    deviations).
+
+    Ejected servers return to the pool after `base_ejection_time` seconds,
+    doubled for each time the server has been ejected recently (up to
+    `max_ejection_time`). No more than `max_ejection_percent` of the
+    servers are ever ejected at once.
+    """
+
+    DEFAULT_CONSECUTIVE_FAILURES = 5
+    DEFAULT_INTERVAL = 10
+    DEFAULT_BASE_EJECTION_TIME = 30
+    DEFAULT_MAX_EJECTION_TIME = 300
+    DEFAULT_MAX_EJECTION_PERCENT = 50
+    DEFAULT_STDEV_FACTOR = 1.9
+    DEFAULT_MIN_SERVERS = 5
+    DEFAULT_MIN_REQUESTS = 20
+
+    def __init__(
+            self,
+            consecutive_failures=DEFAULT_CONSECUTIVE_FAILURES,
+            interval=DEFAULT_INTERVAL,
+            base_ejection_time=DEFAULT_BASE_EJECTION_TIME,
+            max_ejection_time=DEFAULT_MAX_EJECTION_TIME,
+            max_ejection_percent=DEFAULT_MAX_EJECTION_PERCENT,
+            stdev_factor=DEFAULT_STDEV_FACTOR,
+            min_servers=DEFAULT_MIN_SERVERS,
+            min_requests=DEFAULT_MIN_REQUESTS,
+            detect_latency=True
+    ):
+
+        assert consecutive_failures is None or consecutive_failures > 0
+        assert interval > 0
+        assert 0 < base_ejection_time <= max_ejection_time
+        assert 0 <= max_ejection_percent <= 100
+        assert stdev_factor > 0
+
+        self.consecutive_failures = consecutive_failures
+        self.interval = interval
+        self.base_ejection_time = base_ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.max_ejection_percent = max_ejection_percent
+        self.stdev_factor = stdev_factor
+        self.min_servers = min_servers
+        self.min_requests = min_requests
+        self.detect_latency = detect_latency
+
+        self._load_balancer = None
+        self._lock = threading.Lock()
+        self._states = dict()
+        self._next_evaluation = timer() + interval
+
+    @property
+    def load_balancer(self):
+        return self._load_balancer
+
+    @load_balancer.setter
+    def load_balancer(self, value):
+        self._load_balancer = value
+
+    @property
+    def ejected_servers(self):
+        now = timer()
+        return set(s for s, state in list(self._states.items()) if state.ejected_until > now)
+
+    def is_ejected(self, server):
+        state = self._states.get(server)
+        return state is not None and state.ejected_until > timer()
+
+    def ejection_count(self, server):
+        """
+        The number of times `server` has been ejected recently.
+        """
+        state = self._states.get(server)
+        return state.ejections if state is not None else 0
+
+    def record(self, server, is_success, response_time=None):
+        """
+        Record the outcome of a request made to `server`.
+        """
+        state = self._get_state(server)
+
+        with state.lock:
+            state.requests += 1
+            if response_time is not None:
+                state.response_time += response_time
+
+            if is_success:
+                state.consecutive_failures = 0
+            else:
+                state.failures += 1
+                state.consecutive_failures += 1
+
+            consecutive_failures = state.consecutive_failures
+
+        if self.consecutive_failures is not None and consecutive_failures >= self.consecutive_failures:
+            self._eject(server, state, "%s consecutive failures" % consecutive_failures)
+
+        if timer() >= self._next_evaluation:
+            self._evaluate()
+
+    def _get_state(self, server):
+
+        # fast path, the lock is only needed
+        # the first time we see a server
+        state = self._states.get(server)
+
+        if state is None:
+            with self._lock:
+                state = self._states.get(server)
+                if state is None:
+                    state = _OutlierState()
+                    self._retain()
+                    self._states[server] = state
+
+        return state
+
+    def _retain(self):
+
+        # forget servers that have been
+        # removed from the load balancer
+        if self._load_balancer is None:
+            return
+
+        servers = self._load_balancer.servers
+        for server in list(self._states):
+            if server not in servers:
+                del self._states[server]
+
+    def _evaluate(self):
+
+        with self._lock:
+            now = timer()
+            if now < self._next_evaluation:
+                return
+            self._next_evaluation = now + self.interval
+
+            # take (and reset) the counts of the last interval
+            samples = []
+            for server, state in list(self._states.items()):
+                with state.lock:
+                    requests, failures, response_time = state.reset_interval()
+
+                if state.ejected_until > now:
+                    continue
+
+                # a server that behaved for a whole interval
+                # is forgiven one of its previous ejections
+                if requests > 0 and failures == 0 and state.ejections > 0:
+                    state.ejections -= 1
+
+                if requests >= self.min_requests:
+                    samples.append((server, state, requests, failures, response_time))
+
+        if len(samples) < max(self.min_servers, 2):
+            return
+
+        success_rates = [float(requests - failures) / requests for _, _, requests, failures, _ in samples]
+        threshold = self._lower_bound(success_rates)
+        for (server, state, _, _, _), success_rate in zip(samples, success_rates):
+            if success_rate < threshold:
+                self._eject(server, state, "success rate %.2f is an outlier" % success_rate)
+
+        if self.detect_latency:
+            latencies = [response_time / requests for _, _, requests, _, response_time in samples]
+            threshold = self._upper_bound(latencies)
+            for (server, state, _, _, _), latency in zip(samples, latencies):
+                if latency > threshold:
+                    self._eject(server, state, "response time %.3fs is an outlier" % latency)
+
+    def _lower_bound(self, values):
+        mean, stdev = _mean_stdev(values)
+        return mean - self.stdev_factor * stdev
+
+    def _upper_bound(self, values):
+        mean, stdev = _mean_stdev(values)
+        return mean + self.stdev_factor * stdev
+
+    def _eject(self, server, state, reason):
+
+        with self._lock:
+            now = timer()
+            if state.ejected_until > now:
+                return
+
+            # never eject more than the max percentage of servers
+            server_count = len(self._load_balancer.servers) if self._load_balancer is not None else 0
+            ejected_count = sum(1 for s in self._states.values() if s.ejected_until > now)
+            if (ejected_count + 1) * 100 > self.max_ejection_percent * server_count:
+                return
+
+            state.ejections += 1
+            state.consecutive_failures = 0
+            ejection_time = min(
+                self.base_ejection_time * (2 ** (state.ejections - 1)),
+                self.max_ejection_time
+            )
+            state.ejected_until = now + ejection_time
+
+        if self._load_balancer is not None:
+            self._load_balancer.eject_server(server, ejection_time, reason)
+
+
+class _OutlierState(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.response_time = 0.0
+        self.ejections = 0
+        self.ejected_until = 0
+
+    def reset_interval(self):
+        counts = (self.requests, self.failures, self.response_time)
+        self.requests = 0
+        self.failures = 0
+        self.response_time = 0.0
+        return counts
+
+
+def _mean_stdev(values):
+    mean = sum(values) / float(len(values))
+    variance = sum((v - mean) ** 2 for v in values) / float(len(values))
+    return mean, math.sqrt(variance)
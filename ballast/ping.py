@@ -1,13 +1,20 @@
 import abc
+import errno
 import logging
 import threading
 import socket
 import requests
+from collections import deque
 from timeit import default_timer as timer
 from multiprocessing.pool import ThreadPool, Pool
 from ballast.discovery import Server, ServerList
 from ballast.exception import BallastException
 
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
 
 # current thread name (so we know who 'main' is)
 _MAIN_THREAD_NAME = threading.currentThread().name
@@ -136,6 +143,12 @@ class PingStrategy(object):
     def ping(self, ping, servers):
         return []
 
+    def close(self):
+        """
+        Release any resources (e.g. workers) held by the strategy.
+        """
+        pass
+
 
 class SerialPingStrategy(PingStrategy):
 
@@ -161,13 +174,35 @@ class SerialPingStrategy(PingStrategy):
 
 
 class AsyncPoolPingStrategy(PingStrategy):
+    """
+    Pings servers in parallel on a long-lived pool of a worker per
+    server, up to `max_workers`. The pool is created on the first ping
+    round and re-used by every round after it until the strategy is
+    closed, or until there are more servers to ping.
+    """
+
+    DEFAULT_MAX_WORKERS = 64
 
-    def __init__(self, pool_type):
+    def __init__(self, pool_type, max_workers=None):
         super(AsyncPoolPingStrategy, self).__init__()
+
+        assert max_workers is None or (isinstance(max_workers, int) and max_workers > 0)
+
         self._pool_type = pool_type
+        self._pool = None
+        self._pool_size = 0
+        self._lock = threading.Lock()
+        self.max_workers = max_workers \
+            if max_workers is not None \
+            else self.DEFAULT_MAX_WORKERS
 
     def __getstate__(self):
         s = super(AsyncPoolPingStrategy, self).__getstate__()
+
+        # neither can be pickled
+        del s['_pool']
+        del s['_lock']
+
         return s
 
     def __setstate__(self, state):
@@ -187,37 +222,223 @@ class AsyncPoolPingStrategy(PingStrategy):
             self._logger.debug("Ping failed - no servers to ping!")
             return results
 
-        pool = self._pool_type(processes=len(server_list))
+        pool = self._get_pool(min(self.max_workers, len(server_list)))
 
-        # create our threads in the thread pool
+        # queue a ping for each server, at most
+        # max_workers of them run at the same time
         for s in server_list:
             future = pool.apply_async(_ping_in_background, (ping, s))
             futures.append(future)
 
-        # now, join the threads and grab the results
+        # now, wait for the pings and grab the results
         for f in futures:
             server = f.get()
             results.append(server)
 
-        pool.close()
-
         end_time = timer() - start_time
 
         self._logger.debug("Pinged %s servers in %s seconds", len(results), end_time)
 
         return results
 
+    def close(self):
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def _get_pool(self, size):
+
+        # sized for the servers, and only
+        # replaced once there are more of them
+        with self._lock:
+            old_pool = None
+            if self._pool is not None and self._pool_size < size:
+                old_pool = self._pool
+                self._pool = None
+
+            if self._pool is None:
+                self._pool = self._pool_type(processes=size)
+                self._pool_size = size
+
+            pool = self._pool
+
+        if old_pool is not None:
+            old_pool.close()
+            old_pool.join()
+
+        return pool
+
 
 class ThreadPoolPingStrategy(AsyncPoolPingStrategy):
 
-    def __init__(self):
-        super(ThreadPoolPingStrategy, self).__init__(ThreadPool)
+    def __init__(self, max_workers=None):
+        super(ThreadPoolPingStrategy, self).__init__(ThreadPool, max_workers)
 
 
 class MultiprocessingPoolPingStrategy(AsyncPoolPingStrategy):
 
-    def __init__(self):
-        super(MultiprocessingPoolPingStrategy, self).__init__(Pool)
+    # processes are much heavier than threads
+    DEFAULT_MAX_WORKERS = 16
+
+    def __init__(self, max_workers=None):
+        super(MultiprocessingPoolPingStrategy, self).__init__(Pool, max_workers)
+
+
+class SelectorPingStrategy(PingStrategy):
+    """
+    Pings every server from a single thread, by starting a non-blocking
+    TCP connect to each of them at once and waiting for the connects to
+    complete (or time out) with a selector. A ping round takes about as
+    long as the slowest connect, and the connect time of each server is
+    recorded as its `ping_time`.
+
+    Only applies to :class:`SocketPing`, any other ping is done serially.
+    At most `max_sockets` connects are in flight at once.
+    """
+
+    DEFAULT_MAX_SOCKETS = 512
+    DEFAULT_TIMEOUT = 3
+
+    _IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN)
+
+    def __init__(self, max_sockets=DEFAULT_MAX_SOCKETS):
+        super(SelectorPingStrategy, self).__init__()
+
+        if selectors is None:
+            raise BallastException(
+                "SelectorPingStrategy requires Python 3.4+, please use "
+                "ThreadPoolPingStrategy or GeventPingStrategy instead"
+            )
+
+        assert isinstance(max_sockets, int) and max_sockets > 0
+
+        self.max_sockets = max_sockets
+
+    def ping(self, ping, servers):
+
+        assert isinstance(ping, Ping)
+        assert isinstance(servers, ServerList)
+
+        if not isinstance(ping, SocketPing):
+            return SerialPingStrategy().ping(ping, servers)
+
+        start_time = timer()
+
+        timeout = ping.max_ping_time \
+            if ping.max_ping_time is not None \
+            else self.DEFAULT_TIMEOUT
+
+        results = list(servers.get_servers())
+        waiting = deque(results)
+
+        # connects in the order they were started, since they
+        # all have the same timeout, this is also deadline order
+        connecting = deque()
+        selector = selectors.DefaultSelector()
+
+        try:
+            while waiting or connecting:
+
+                while waiting and len(connecting) < self.max_sockets:
+                    probe = _ConnectProbe(waiting.popleft(), timeout)
+                    if probe.connect():
+                        selector.register(probe.sock, selectors.EVENT_WRITE, probe)
+                        connecting.append(probe)
+
+                if not connecting:
+                    continue
+
+                wait_time = max(connecting[0].deadline - timer(), 0)
+                for key, mask in selector.select(wait_time):
+                    probe = key.data
+                    selector.unregister(probe.sock)
+                    probe.finish()
+
+                # drop finished connects and fail the
+                # ones that have run out of time
+                now = timer()
+                while connecting and (connecting[0].is_finished or connecting[0].deadline <= now):
+                    probe = connecting.popleft()
+                    if not probe.is_finished:
+                        selector.unregister(probe.sock)
+                        probe.fail()
+        finally:
+            for probe in connecting:
+                if not probe.is_finished:
+                    probe.fail()
+            selector.close()
+
+        end_time = timer() - start_time
+
+        self._logger.debug("Pinged %s servers in %s seconds", len(results), end_time)
+
+        return results
+
+
+class _ConnectProbe(object):
+
+    def __init__(self, server, timeout):
+        self.server = server
+        self.sock = None
+        self.is_finished = False
+        self.start_time = timer()
+        self.deadline = self.start_time + timeout
+
+    def connect(self):
+        """
+        Start a non-blocking connect to the server, returns
+        True if it's in progress and needs to be waited on.
+        """
+        try:
+            # note: resolving a host name (rather than
+            # an ip address) blocks while doing so
+            family, socktype, proto, _, address = socket.getaddrinfo(
+                self.server.address,
+                self.server.port,
+                0,
+                socket.SOCK_STREAM
+            )[0]
+
+            self.sock = socket.socket(family, socktype, proto)
+            self.sock.setblocking(False)
+            error = self.sock.connect_ex(address)
+        except (socket.error, IndexError):
+            self.fail()
+            return False
+
+        if error == 0:
+            self.finish()
+            return False
+
+        if error not in SelectorPingStrategy._IN_PROGRESS:
+            self.fail()
+            return False
+
+        return True
+
+    def finish(self):
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error != 0:
+            self.fail()
+            return
+
+        self.server._is_alive = True
+        self.server._ping_time = timer() - self.start_time
+        self._close()
+
+    def fail(self):
+        self.server._is_alive = False
+        self.server._ping_time = None
+        self._close()
+
+    def _close(self):
+        self.is_finished = True
+        if self.sock is not None:
+            self.sock.close()
 
 
 class GeventPingStrategy(PingStrategy):
@@ -0,0 +1,278 @@
+import logging
+import socket
+import threading
+import requests
+from timeit import default_timer as timer
+from requests.adapters import HTTPAdapter
+from requests.compat import cookielib
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+_local = threading.local()
+
+
+class Abortable(object):
+    """
+    Lets another thread stop the requests made (on the current thread)
+    inside its `with` block, by shutting down the connection they're on.
+    Requests stopped this way fail with a connection error.
+    """
+
+    def __init__(self):
+        self.is_aborted = False
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def __enter__(self):
+        _local.abortable = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.abortable = None
+        with self._lock:
+            self._conn = None
+
+    def abort(self):
+        with self._lock:
+            self.is_aborted = True
+            if self._conn is not None:
+                _shutdown(self._conn)
+
+    def _attach(self, conn):
+        with self._lock:
+            if self.is_aborted:
+                return False
+            self._conn = conn
+            return True
+
+    def _detach(self, conn):
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+
+
+def _shutdown(conn):
+    # unlike close, shutdown wakes up a
+    # thread blocked reading from the socket
+    sock = conn.sock
+    if sock is None:
+        return
+
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except (OSError, socket.error):
+        pass
+
+
+class _AbortableMixin(object):
+
+    def _get_conn(self, timeout=None):
+        conn = super(_AbortableMixin, self)._get_conn(timeout)
+
+        abortable = getattr(_local, 'abortable', None)
+        if abortable is not None and not abortable._attach(conn):
+            self._put_conn(conn)
+            raise socket.error("Request aborted")
+
+        return conn
+
+    def _put_conn(self, conn):
+        # back in the pool, it may be handed to another request
+        abortable = getattr(_local, 'abortable', None)
+        if abortable is not None:
+            abortable._detach(conn)
+
+        super(_AbortableMixin, self)._put_conn(conn)
+
+
+class _HTTPConnectionPool(_AbortableMixin, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_AbortableMixin, HTTPSConnectionPool):
+    pass
+
+
+class _AbortableAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(_AbortableAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool,
+            'https': _HTTPSConnectionPool
+        }
+
+
+class _PooledSession(object):
+
+    def __init__(self, session):
+        self.session = session
+        self.last_used = timer()
+
+
+class SessionPool(object):
+    """
+    Keeps one keep-alive :class:`requests.Session` (and therefore one
+    connection pool) per :class:`~ballast.discovery.Server`, so consecutive
+    requests to the same server re-use their TCP/TLS connections.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_IDLE_TIMEOUT = 60
+    EVICTION_INTERVAL = 5
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+
+        assert isinstance(pool_size, int) and pool_size > 0
+        assert idle_timeout is None or idle_timeout > 0
+
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._sessions = dict()
+        self._next_eviction = timer() + self.EVICTION_INTERVAL
+        self._logger = logging.getLogger(self.__module__)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, server):
+        return server in self._sessions
+
+    def session(self, server):
+
+        # fast path, no lock required
+        # for a server we've already seen
+        pooled = self._sessions.get(server)
+
+        if pooled is None:
+            with self._lock:
+                pooled = self._sessions.get(server)
+                if pooled is None:
+                    pooled = _PooledSession(self._create_session())
+                    self._sessions[server] = pooled
+                    self._logger.debug("Created connection pool for server: %s", server)
+
+        pooled.last_used = timer()
+
+        return pooled.session
+
+    def evict(self, servers):
+        """
+        Close the pools of any servers not contained in `servers`
+        as well as any pools that have been idle for longer than
+        `idle_timeout` seconds.
+        """
+        for server, session in self._remove_expired(servers):
+            self._logger.debug("Closing connection pool for server: %s", server)
+            session.close()
+
+    def warm_up(self, server, url, connections, timeout=None):
+        """
+        Open up to `connections` keep-alive connections (including their
+        TLS handshake, for an https `url`) to `server` ahead of its first
+        requests, returns the number of connections opened. Connections
+        that are already open count towards `connections`.
+        """
+        session = self.session(server)
+        pool = self._connection_pool(session, url)
+        count = min(connections, self.pool_size)
+
+        # take connections from the pool (idle ones first)
+        # and connect any that aren't, then put them all back
+        conns = [pool._get_conn() for _ in range(count)]
+        opened = 0
+
+        for i, conn in enumerate(conns):
+            if conn.sock is not None:
+                continue
+
+            try:
+                if timeout is not None:
+                    conn.timeout = timeout
+                conn.connect()
+                opened += 1
+            except Exception as e:
+                self._logger.debug("Could not warm up connection to server %s: %s", server, e)
+                conn.close()
+                conns[i] = None
+
+        for conn in conns:
+            pool._put_conn(conn)
+
+        self._logger.debug("Warmed up %s connection(s) to server: %s", opened, server)
+
+        return opened
+
+    def discard(self, servers):
+        """
+        Close the pools of `servers`, e.g. because they've
+        been removed from the load balancer.
+        """
+        for server, session in self._remove(servers):
+            self._logger.debug("Closing connection pool for server: %s", server)
+            session.close()
+
+    def evict_if_due(self, load_balancer):
+        if timer() >= self._next_eviction:
+            self.evict(load_balancer.servers)
+
+    def close(self):
+        for server, session in self._remove_all():
+            session.close()
+
+    def _remove_expired(self, servers):
+        now = timer()
+        self._next_eviction = now + self.EVICTION_INTERVAL
+
+        expired = []
+        with self._lock:
+            for server, pooled in list(self._sessions.items()):
+                is_member = server in servers
+                is_idle = self.idle_timeout is not None and now - pooled.last_used > self.idle_timeout
+                if not is_member or is_idle:
+                    expired.append((server, self._sessions.pop(server).session))
+
+        # sessions are closed by the caller outside
+        # the lock, closing sockets can take a little while
+        return expired
+
+    def _remove(self, servers):
+        with self._lock:
+            removed = [(server, self._sessions.pop(server).session) for server in servers if server in self._sessions]
+
+        return removed
+
+    def _remove_all(self):
+        with self._lock:
+            removed = [(server, pooled.session) for server, pooled in self._sessions.items()]
+            self._sessions.clear()
+
+        return removed
+
+    @staticmethod
+    def _connection_pool(session, url):
+
+        # the same pool requests will pick for the url
+        adapter = session.get_adapter(url)
+        if hasattr(adapter, 'get_connection_with_tls_context'):
+            request = requests.Request('GET', url).prepare()
+            return adapter.get_connection_with_tls_context(request, session.verify, cert=session.cert)
+
+        return adapter.get_connection(url)
+
+    def _create_session(self):
+        adapter = _AbortableAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size
+        )
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        # the session is shared by every caller, so it
+        # mustn't hand one caller's cookies to the next
+        session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+
+        return session
@@ -0,0 +1,156 @@
+import random
+import threading
+from timeit import default_timer as timer
+
+
+class RetryBudget(object):
+    """
+    A token bucket capping retries at a percentage of total traffic.
+
+    Every request deposits `ratio` tokens and every retry withdraws
+    one, so with the default ratio of 0.2 at most 1 in 5 requests can
+    be retried. The bucket is also refilled at `min_retries_per_second`
+    so services with very little traffic are still able to retry.
+    """
+
+    DEFAULT_RATIO = 0.2
+    DEFAULT_MIN_RETRIES_PER_SECOND = 10
+    DEFAULT_MAX_TOKENS = 100
+
+    def __init__(
+            self,
+            ratio=DEFAULT_RATIO,
+            min_retries_per_second=DEFAULT_MIN_RETRIES_PER_SECOND,
+            max_tokens=DEFAULT_MAX_TOKENS
+    ):
+
+        assert ratio >= 0
+        assert min_retries_per_second >= 0
+        assert max_tokens > 0
+
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._tokens = float(min(min_retries_per_second, max_tokens))
+        self._last_refill = timer()
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self):
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _refill(self):
+        now = timer()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.max_tokens, self._tokens + elapsed * self.min_retries_per_second)
+
+
+class Retry(object):
+    """
+    Retry policy shared by :class:`~ballast.Service` and
+    :class:`~ballast.aio.AsyncService`.
+
+    A request is attempted at most `max_attempts` times, retries are
+    only made while the (optional) :class:`RetryBudget` allows it and,
+    when `backoff` is set, are delayed by an exponential backoff with
+    full jitter capped at `max_backoff` seconds.
+    """
+
+    DEFAULT_MAX_ATTEMPTS = 3
+    DEFAULT_MAX_BACKOFF = 10
+
+    def __init__(
+            self,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            budget=None,
+            backoff=0,
+            max_backoff=DEFAULT_MAX_BACKOFF,
+            skip_tried_servers=True
+    ):
+
+        assert isinstance(max_attempts, int) and max_attempts > 0
+        assert budget is None or isinstance(budget, RetryBudget)
+        assert backoff >= 0
+        assert max_backoff >= 0
+
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.skip_tried_servers = skip_tried_servers
+
+    def begin(self, hash_key=None):
+        if self.budget is not None:
+            self.budget.deposit()
+
+        return RetryState(self, hash_key)
+
+
+class RetryState(object):
+    """
+    Tracks the attempts (and servers tried) for a single request.
+    """
+
+    def __init__(self, retry, hash_key=None):
+        self.retry = retry
+        self.hash_key = hash_key
+        self.attempts = 0
+        self.tried = set()
+
+    def choose_server(self, load_balancer, count_attempt=True):
+
+        if count_attempt:
+            self.attempts += 1
+
+        server = load_balancer.choose_server(self.hash_key)
+
+        # the rule may hand us a server we've already tried
+        # for this request, give it a few chances to find us
+        # one we haven't (but don't fail the request over it)
+        if self.retry.skip_tried_servers:
+            draws = 2 * len(self.tried) + 1
+            while server in self.tried and draws > 0:
+                server = load_balancer.choose_server(self.hash_key)
+                draws -= 1
+
+        self.tried.add(server)
+
+        return server
+
+    def can_retry(self):
+
+        if self.attempts >= self.retry.max_attempts:
+            return False
+
+        budget = self.retry.budget
+        if budget is not None and not budget.try_withdraw():
+            return False
+
+        return True
+
+    def backoff_time(self):
+
+        if self.retry.backoff <= 0:
+            return 0
+
+        ceiling = min(
+            self.retry.max_backoff,
+            self.retry.backoff * (2 ** (self.attempts - 1))
+        )
+
+        return random.uniform(0, ceiling)
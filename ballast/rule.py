@@ -1,6 +1,11 @@
 import abc
+import bisect
+import hashlib
+import itertools
+import math
+import random
 import threading
-from queue import Queue
+from timeit import default_timer as timer
 from ballast.discovery import Server
 from ballast.exception import BallastException, NoReachableServers
 
@@ -24,75 +29,535 @@ class Rule(object):
     def choose(self):
         return Server(None, None)
 
+    def choose_for_key(self, key):
+        """
+        Choose a server for a request with a routing `key`.
+        Rules without key affinity ignore the key by default.
+        """
+        return self.choose()
+
+    def record_response_time(self, server, response_time):
+        """
+        Called with the response time (in seconds) of each
+        request made to `server`. Does nothing by default.
+        """
+        pass
+
+    def servers_changed(self, added, removed, changed):
+        """
+        Called with the servers that were added to, removed from or
+        changed (weight or priority) in the load balancer's server
+        list. Does nothing by default.
+        """
+        pass
+
 
 class RoundRobinRule(Rule):
 
     def __init__(self):
         super(RoundRobinRule, self).__init__()
-        self._lock = threading.Lock()
-        self._queue = Queue()
+        self._counter = itertools.count()
 
     def choose(self):
 
-        with self._lock:
-
-            if self._load_balancer is None:
-                raise BallastException("Load balancer not set!")
+        if self._load_balancer is None:
+            raise BallastException("Load balancer not set!")
 
-            # push all available servers back onto
-            # the queue if the queue is empty
-            if self._queue.empty():
-                servers = self._load_balancer.reachable_servers
-                if len(servers) == 0:
-                    raise NoReachableServers()
-                sorted_by_priority = sorted(servers)
-                for server in sorted_by_priority:
-                    self._queue.put(server)
+        servers = self._load_balancer.reachable_snapshot
+        if len(servers) == 0:
+            raise NoReachableServers()
 
-            # now just pop one off until
-            # the queue is empty
-            return self._queue.get(block=False)
+        # next() on a count is atomic, no lock required
+        return servers[next(self._counter) % len(servers)]
 
 
 class PriorityWeightedRule(Rule):
+    """
+    Chooses from the best (lowest) priority group of reachable servers,
+    spreading requests within the group by weight using smooth weighted
+    round-robin. When every server of a priority group is down, the next
+    group is used.
+    """
+
+    # bounds the work of precomputing a schedule for a snapshot
+    # (total weight x servers), larger groups are spread with a
+    # binary search over their cumulative weights instead, still
+    # in exact proportion and interleaved
+    MAX_SCHEDULE_WORK = 100000
 
     def __init__(self):
         super(PriorityWeightedRule, self).__init__()
-        self._load_balancer_stats = None
+        self._counter = itertools.count()
+        self._schedule = (None, None)
 
-    @property
-    def load_balancer(self):
-        return self._load_balancer
+    def choose(self):
 
-    @load_balancer.setter
-    def load_balancer(self, value):
-        self._load_balancer = value
-        self._load_balancer_stats = value.stats
+        if self._load_balancer is None:
+            raise BallastException("Load balancer not set!")
+
+        servers = self._load_balancer.reachable_snapshot
+        if len(servers) == 0:
+            raise NoReachableServers()
+
+        # the schedule is computed once per snapshot and
+        # swapped in as a whole, so no lock is required
+        snapshot, schedule = self._schedule
+        if snapshot is not servers:
+            schedule = _WeightedSchedule(_best_priority(servers), self.MAX_SCHEDULE_WORK)
+            self._schedule = (servers, schedule)
+
+        return schedule.get(next(self._counter))
+
+
+class LeastLoadedP2CRule(Rule):
+    """
+    Power of two choices: samples two random reachable servers and
+    chooses the one with the fewest active requests relative to its
+    weight. Avoids the herding a global least-connections scan causes
+    when many clients see the same "least loaded" server.
+    """
 
     def choose(self):
 
-        servers = self._load_balancer.reachable_servers
+        if self._load_balancer is None:
+            raise BallastException("Load balancer not set!")
 
+        servers = self._load_balancer.reachable_snapshot
         server_count = len(servers)
 
-        if len(servers) == 0:
-            raise Exception("No reachable servers could be found")
+        if server_count == 0:
+            raise NoReachableServers()
 
         if server_count == 1:
-            return servers.pop()
+            return servers[0]
+
+        # two distinct random servers
+        i = random.randrange(server_count)
+        j = random.randrange(server_count - 1)
+        if j >= i:
+            j += 1
+
+        server1 = servers[i]
+        server2 = servers[j]
+        load1 = self._load(server1)
+        load2 = self._load(server2)
+
+        if load1 == load2:
+            return random.choice((server1, server2))
+
+        return server1 if load1 < load2 else server2
+
+    def _load(self, server):
+
+        # +1 so that, when idle, the
+        # heavier server is preferred
+        active_requests = self._load_balancer.stats.get_server_stats(server).active_requests
+        weight = max(server.weight or 0, 0)
+
+        if weight == 0:
+            return float('inf')
+
+        return float(active_requests + 1) / weight
+
+
+class PeakEwmaRule(Rule):
+    """
+    Latency aware rule, as used by Finagle and Linkerd. Each server is
+    scored by a peak-sensitive EWMA of its response time multiplied by
+    its active requests, and the better of two randomly sampled servers
+    is chosen.
+
+    The EWMA jumps straight up to any response time above it and decays
+    (towards newer samples, or towards zero while a server sits idle) with
+    the given `half_life`, in seconds, so a server whose latency degrades
+    is avoided quickly and retried once it has had time to recover.
+    """
+
+    DEFAULT_HALF_LIFE = 10
+
+    # the score of a server without any response times
+    # yet, once it has a request in flight, so that new
+    # servers aren't flooded before their first response
+    _PENALTY = 1e6
+
+    def __init__(self, half_life=DEFAULT_HALF_LIFE):
+        super(PeakEwmaRule, self).__init__()
+
+        assert half_life > 0
+
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        self._costs = dict()
+
+    def choose(self):
+
+        if self._load_balancer is None:
+            raise BallastException("Load balancer not set!")
+
+        servers = self._load_balancer.reachable_snapshot
+        server_count = len(servers)
+
+        if server_count == 0:
+            raise NoReachableServers()
+
+        if server_count == 1:
+            return servers[0]
+
+        # two distinct random servers
+        i = random.randrange(server_count)
+        j = random.randrange(server_count - 1)
+        if j >= i:
+            j += 1
+
+        server1 = servers[i]
+        server2 = servers[j]
+        score1 = self._score(server1)
+        score2 = self._score(server2)
+
+        if score1 == score2:
+            return random.choice((server1, server2))
+
+        return server1 if score1 < score2 else server2
+
+    def cost(self, server):
+        """
+        The current peak EWMA response time of `server`, in seconds.
+        """
+        return self._get_cost(server).get()
+
+    def record_response_time(self, server, response_time):
+        self._get_cost(server).observe(response_time)
+
+    def _score(self, server):
+
+        active_requests = self._load_balancer.stats.get_server_stats(server).active_requests
+        cost = self.cost(server)
+
+        if cost == 0 and active_requests > 0:
+            return self._PENALTY + active_requests
+
+        return cost * (active_requests + 1)
+
+    def _get_cost(self, server):
+
+        # fast path, the lock is only needed
+        # the first time we see a server
+        cost = self._costs.get(server)
+
+        if cost is None:
+            with self._lock:
+                cost = self._costs.get(server)
+                if cost is None:
+                    cost = _PeakEwma(self.half_life)
+                    self._costs[server] = cost
+
+        return cost
+
+    def servers_changed(self, added, removed, changed):
+
+        # forget servers that have been
+        # removed from the load balancer
+        with self._lock:
+            for server in removed:
+                self._costs.pop(server, None)
+
+
+class _PeakEwma(object):
+
+    def __init__(self, half_life):
+        self._decay = half_life / math.log(2)
+        self._lock = threading.Lock()
+        self._cost = 0.0
+        self._last_time = timer()
+
+    def get(self):
+        return self.observe(0.0)
+
+    def observe(self, value):
+
+        with self._lock:
+            now = timer()
+            elapsed = max(now - self._last_time, 0)
+            self._last_time = now
+
+            if value > self._cost:
+                self._cost = value
+            else:
+                w = math.exp(-elapsed / self._decay)
+                self._cost = self._cost * w + value * (1 - w)
+
+            return self._cost
+
+
+class ConsistentHashRule(Rule):
+    """
+    Routes requests with the same key to the same server, using a hash
+    ring of the reachable servers. Each server is placed on the ring
+    `replicas` times per unit of weight, so when a server goes down (or
+    comes back) only the keys it owns move. Weights are divided by their
+    greatest common divisor, and scaled down further if the ring would
+    exceed `MAX_POINTS` points.
+
+    Requests without a key are spread round-robin.
+    """
+
+    DEFAULT_REPLICAS = 40
+
+    # bounds the size of the ring, and
+    # the work of building it from scratch
+    MAX_POINTS = 10000
+
+    def __init__(self, replicas=DEFAULT_REPLICAS):
+        super(ConsistentHashRule, self).__init__()
+
+        assert isinstance(replicas, int) and replicas > 0
+
+        self.replicas = replicas
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._ring = _HashRing(None, (), ())
+        self._points = dict()
+        self._stale = set()
+        self._scale = None
+
+    def choose(self):
+
+        servers = self._reachable_servers()
+        return servers[next(self._counter) % len(servers)]
+
+    def choose_for_key(self, key):
+
+        servers = self._reachable_servers()
+
+        ring = self._ring
+        if ring.snapshot is not servers:
+            ring = self._update_ring(servers)
+
+        return ring.get(_hash(key))
+
+    def _reachable_servers(self):
+
+        if self._load_balancer is None:
+            raise BallastException("Load balancer not set!")
+
+        servers = self._load_balancer.reachable_snapshot
+        if len(servers) == 0:
+            raise NoReachableServers()
+
+        return servers
+
+    def _update_ring(self, servers):
+
+        # e.g. the rule was set after the load balancer's first update
+        if self._scale is None:
+            self._update_scale(self._load_balancer.servers)
+
+        with self._lock:
+            ring = self._ring
+            if ring.snapshot is servers:
+                return ring
+
+            # only the points of servers that have been added,
+            # removed or re-weighted since the last ring change
+            current = set(ring.owners)
+            members = set(servers)
+            stale = self._stale
+            self._stale = set()
+            removed = (current - members) | (stale & current)
+            added = (members - current) | (stale & members)
+
+            points = sorted(
+                (h, server)
+                for server in added
+                for h in self._get_points(server)
+            )
+
+            # merge the new points into the
+            # (already sorted) remaining points
+            hashes = []
+            owners = []
+            i = 0
+            for h, owner in zip(ring.hashes, ring.owners):
+                if owner in removed:
+                    continue
+                while i < len(points) and points[i][0] < h:
+                    hashes.append(points[i][0])
+                    owners.append(points[i][1])
+                    i += 1
+                hashes.append(h)
+                owners.append(owner)
+
+            for h, owner in points[i:]:
+                hashes.append(h)
+                owners.append(owner)
+
+            ring = _HashRing(servers, tuple(hashes), tuple(owners))
+            self._ring = ring
+
+            return ring
+
+    def _get_points(self, server):
+
+        # points are kept for every server known to the load balancer,
+        # a server flapping up and down doesn't need re-hashing
+        points = self._points.get(server)
+        if points is None:
+            units = max(int(round(max(int(server.weight or 0), 1) / self._scale)), 1)
+            count = self.replicas * units
+            points = [_hash('%s:%s-%s' % (server.address, server.port, i)) for i in range(count)]
+            self._points[server] = points
+
+        return points
+
+    def _update_scale(self, servers):
+        """
+        Work out how much weight makes up a unit (of `replicas` points)
+        for `servers`, returns whether it changed.
+        """
+        weights = [max(int(s.weight or 0), 1) for s in servers]
+
+        divisor = 0
+        for weight in weights:
+            divisor = _gcd(divisor, weight)
+
+        scale = float(max(divisor, 1))
+        max_units = self.MAX_POINTS // self.replicas
+        if sum(weights) / scale > max_units:
+            scale = sum(weights) / float(max(max_units, 1))
+
+        with self._lock:
+            if scale == self._scale:
+                return False
+
+            # every server gets a new set of points
+            self._scale = scale
+            self._points = dict()
+            self._ring = _HashRing(None, (), ())
+            self._stale = set()
+
+        return True
+
+    def servers_changed(self, added, removed, changed):
+
+        # a re-weighted server gets a new set of points
+        with self._lock:
+            for server in removed:
+                self._points.pop(server, None)
+            for server in changed:
+                self._points.pop(server, None)
+            self._stale.update(changed)
+
+        if self._load_balancer is None:
+            return
+
+        self._update_scale(self._load_balancer.servers)
+
+        # hash the new points here (off the request path),
+        # so the ring only has to merge them in
+        for server in list(added) + list(changed):
+            self._get_points(server)
+
+
+class _HashRing(object):
+
+    def __init__(self, snapshot, hashes, owners):
+        self.snapshot = snapshot
+        self.hashes = hashes
+        self.owners = owners
+
+    def get(self, h):
+
+        # the first point clockwise of the hash
+        i = bisect.bisect(self.hashes, h)
+        if i == len(self.hashes):
+            i = 0
+
+        return self.owners[i]
+
+
+def _hash(key):
+    if not isinstance(key, bytes):
+        key = str(key).encode('utf-8')
+    return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+
+def _best_priority(servers):
+    # snapshots are sorted by priority
+    priority = servers[0].priority
+    return [s for s in servers if s.priority == priority]
+
+
+# the golden ratio's conjugate, stepping by
+# it spreads picks evenly over the cycle
+_GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+class _WeightedSchedule(object):
+
+    def __init__(self, servers, max_work):
+
+        weights = [max(int(s.weight or 0), 0) for s in servers]
+
+        # a group of zero weights is
+        # split between servers equally
+        if sum(weights) == 0:
+            weights = [1] * len(servers)
+
+        divisor = 0
+        for weight in weights:
+            divisor = _gcd(divisor, weight)
+        weights = [w // divisor for w in weights]
+
+        self._servers = servers
+        self._total = sum(weights)
+        self._schedule = None
+        self._cumulative = None
+
+        if self._total * len(servers) <= max_work:
+            self._schedule = self._smooth(servers, weights, self._total)
+        else:
+            self._cumulative = []
+            cumulative = 0
+            for weight in weights:
+                cumulative += weight
+                self._cumulative.append(cumulative)
+
+            # stepping through the cumulative weights by a stride
+            # coprime with the total still visits every slot once per
+            # cycle, but interleaves the servers instead of giving
+            # each one a run of `weight` picks in a row
+            self._stride = max(int(round(self._total * _GOLDEN_RATIO)), 1)
+            while _gcd(self._stride, self._total) != 1:
+                self._stride += 1
+
+    def get(self, n):
+        if self._schedule is not None:
+            return self._schedule[n % self._total]
 
-        def s(o1, o2):
-            return -1
+        return self._servers[bisect.bisect_right(self._cumulative, n * self._stride % self._total)]
 
-        sorted_by_priority = sorted(servers, s)
+    @staticmethod
+    def _smooth(servers, weights, total):
 
-        # for server in sorted_by_priority:
-        # stats = self._load_balancer_stats.get_server_stats(server)
-        # assert isinstance(stats, ServerStats)
-        # TODO: check weight/priority
+        # nginx's smooth weighted round-robin: each pick, every
+        # server gains its weight and the server with the highest
+        # current weight is chosen and set back by the total
+        current = [0] * len(servers)
+        schedule = []
 
-        # sort the servers by priority
-        # from the top-priority servers, get the server with utilization lowest compared to weight
-        # if all utilizations are lower than respective weights, just pick the first server
+        for i in range(total):
+            best = 0
+            for j, weight in enumerate(weights):
+                current[j] += weight
+                if current[j] > current[best]:
+                    best = j
+            current[best] -= total
+            schedule.append(servers[best])
 
-        return sorted_by_priority[0]
+        return tuple(schedule)
@@ -0,0 +1,200 @@
+import heapq
+import itertools
+import random
+import threading
+from timeit import default_timer as timer
+
+
+class PingSchedule(object):
+    """
+    Pings each server on its own cadence, rather than pinging every
+    server on a fixed interval:
+
+    - healthy servers are pinged every `healthy_interval` seconds
+    - servers that fail a ping are re-pinged with exponential backoff,
+      starting at `failure_interval` and capped at `max_failure_interval`
+    - servers that have just come back up (or were marked down by a
+      request) are re-pinged every `recovery_interval` seconds for
+      `recovery_pings` pings before returning to the healthy cadence
+
+    Every interval is jittered by +/- `jitter` (a fraction), so that many
+    clients don't synchronize their pings. The server list itself is
+    re-resolved when the shortest TTL of its servers expires, bounded by
+    `min_resolve_interval` and `max_resolve_interval`.
+    """
+
+    DEFAULT_HEALTHY_INTERVAL = 60
+    DEFAULT_FAILURE_INTERVAL = 1
+    DEFAULT_MAX_FAILURE_INTERVAL = 60
+    DEFAULT_RECOVERY_INTERVAL = 1
+    DEFAULT_RECOVERY_PINGS = 2
+    DEFAULT_JITTER = 0.2
+    DEFAULT_MIN_RESOLVE_INTERVAL = 1
+    DEFAULT_MAX_RESOLVE_INTERVAL = 300
+
+    def __init__(
+            self,
+            healthy_interval=DEFAULT_HEALTHY_INTERVAL,
+            failure_interval=DEFAULT_FAILURE_INTERVAL,
+            max_failure_interval=DEFAULT_MAX_FAILURE_INTERVAL,
+            recovery_interval=DEFAULT_RECOVERY_INTERVAL,
+            recovery_pings=DEFAULT_RECOVERY_PINGS,
+            jitter=DEFAULT_JITTER,
+            min_resolve_interval=DEFAULT_MIN_RESOLVE_INTERVAL,
+            max_resolve_interval=DEFAULT_MAX_RESOLVE_INTERVAL
+    ):
+
+        assert healthy_interval > 0
+        assert 0 < failure_interval <= max_failure_interval
+        assert recovery_interval > 0
+        assert recovery_pings >= 0
+        assert 0 <= jitter < 1
+        assert 0 < min_resolve_interval <= max_resolve_interval
+
+        self.healthy_interval = healthy_interval
+        self.failure_interval = failure_interval
+        self.max_failure_interval = max_failure_interval
+        self.recovery_interval = recovery_interval
+        self.recovery_pings = recovery_pings
+        self.jitter = jitter
+        self.min_resolve_interval = min_resolve_interval
+        self.max_resolve_interval = max_resolve_interval
+
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._heap = []
+        self._entries = dict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, servers):
+        """
+        Schedule any new servers to be pinged right away
+        and forget the servers that are no longer listed.
+        """
+        now = timer()
+
+        with self._lock:
+            entries = dict()
+            for server in servers:
+                entry = self._entries.get(server)
+                if entry is None:
+                    entry = _ScheduleEntry(server)
+                    self._push(entry, now)
+                else:
+                    entry.server = server
+                entries[server] = entry
+
+            for server, entry in self._entries.items():
+                if server not in entries:
+                    entry.due = None
+
+            self._entries = entries
+
+    def pop_due(self):
+        """
+        The servers due a ping, each must be passed back to `record`.
+        """
+        now = timer()
+        due = []
+
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_time, _, entry = heapq.heappop(self._heap)
+
+                # skip entries that have been re-scheduled
+                # or whose server has been removed since
+                if entry.due != due_time:
+                    continue
+
+                entry.due = None
+                due.append(entry.server)
+
+        return due
+
+    def record(self, server, is_alive):
+        """
+        Schedule the next ping of a server based on its last ping.
+        """
+        with self._lock:
+            entry = self._entries.get(server)
+            if entry is None:
+                return
+
+            if is_alive:
+                if entry.failures > 0:
+                    entry.failures = 0
+                    entry.recovering = self.recovery_pings
+
+                if entry.recovering > 0:
+                    entry.recovering -= 1
+                    interval = self.recovery_interval
+                else:
+                    interval = self.healthy_interval
+            else:
+                entry.failures += 1
+                entry.recovering = 0
+                interval = min(
+                    self.failure_interval * (2 ** (entry.failures - 1)),
+                    self.max_failure_interval
+                )
+
+            self._push(entry, timer() + self._jittered(interval))
+
+    def mark_down(self, server):
+        """
+        Ping a server (that was marked down outside of a ping, e.g. by
+        a failed request) soon, to find out whether it's really down.
+        """
+        with self._lock:
+            entry = self._entries.get(server)
+            if entry is None:
+                return
+
+            entry.recovering = self.recovery_pings
+
+            # unless it's already due (or being pinged)
+            due_time = timer() + self._jittered(self.recovery_interval)
+            if entry.due is not None and entry.due > due_time:
+                self._push(entry, due_time)
+
+    def next_ping_time(self):
+        """
+        When the next server is due a ping, or None.
+        """
+        with self._lock:
+            while self._heap and self._heap[0][2].due != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                return None
+
+            return self._heap[0][0]
+
+    def resolve_interval(self, servers):
+        """
+        Seconds until the server list should be resolved again.
+        """
+        ttls = [s.ttl for s in servers if s.ttl is not None]
+        interval = min(ttls) if ttls else self.max_resolve_interval
+        interval = max(self.min_resolve_interval, min(interval, self.max_resolve_interval))
+
+        # jitter downwards only, never wait longer than the ttl
+        return interval * random.uniform(1 - self.jitter, 1)
+
+    def _push(self, entry, due_time):
+        entry.due = due_time
+        heapq.heappush(self._heap, (due_time, next(self._counter), entry))
+
+    def _jittered(self, interval):
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class _ScheduleEntry(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.due = None
+        self.failures = 0
+        self.recovering = 0
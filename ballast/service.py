@@ -1,10 +1,18 @@
+import heapq
 import logging
-import requests
+import threading
+import time
+from queue import Queue, Empty
+from timeit import default_timer as timer
+from multiprocessing.pool import ThreadPool
 from past.builtins import basestring, unicode
 from requests.exceptions import RequestException
 from ballast.util import UrlBuilder
 from ballast.core import LoadBalancer
-from ballast.exception import BallastConfigurationException
+from ballast.exception import BallastConfigurationException, NoReachableServers
+from ballast.pool import Abortable, SessionPool
+from ballast.events import Event
+from ballast.retry import Retry, RetryBudget
 from ballast.discovery import ServerList
 from ballast.discovery.static import StaticServerList
 
@@ -12,11 +20,23 @@ from ballast.discovery.static import StaticServerList
 class Service(object):
 
     DEFAULT_REQUEST_TIMEOUT = 10
+    WARM_UP_WORKERS = 2
 
     def __init__(self, *args, **kwargs):
         self._load_balancer = kwargs.get('load_balancer')
         self._use_https = kwargs.get('use_https', False)
         self._request_timeout = kwargs.get('request_timeout', self.DEFAULT_REQUEST_TIMEOUT)
+        self._pool = self._create_pool(
+            kwargs.get('pool_size'),
+            kwargs.get('pool_idle_timeout')
+        )
+        self._retry = kwargs.get('retry', Retry(budget=RetryBudget()))
+        self._hedge = kwargs.get('hedge')
+        self._hedge_lock = threading.Lock()
+        self._hedge_timer = None
+        self._warm_up_connections = kwargs.get('warm_up_connections')
+        self._warm_up_lock = threading.Lock()
+        self._warm_up_pool = None
         self._logger = logging.getLogger(self.__module__)
 
         # if our load balancer wasn't configured via kwargs
@@ -54,216 +74,441 @@ class Service(object):
                 a
             )
 
-    def request(self, method, url, **kwargs):
-
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
-        absolute_url = self._get_absolute_url(server, url, self._use_https)
+        # close the pools of servers as soon
+        # as they leave the load balancer
+        self._load_balancer.add_membership_listener(self._on_servers_changed)
+
+        # open connections to servers as they come up,
+        # and to those that are up already
+        if self._warm_up_connections:
+            self._load_balancer.events.subscribe(Event.SERVER_UP, self._on_server_up)
+            for server in self._load_balancer.reachable_snapshot:
+                self._warm_up(server)
+
+    def request(self, method, url, hash_key=None, **kwargs):
+        return self._execute(
+            method.upper(),
+            url,
+            lambda session, absolute_url: session.request(method, absolute_url, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-        self._logger.debug("Request: %s %s", method.upper(), absolute_url)
+    def options(self, url, hash_key=None, **kwargs):
+        return self._execute(
+            'OPTIONS',
+            url,
+            lambda session, absolute_url: session.options(absolute_url, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-        try:
-            response = requests.request(method, absolute_url, timeout=self._request_timeout, **kwargs)
+    def head(self, url, hash_key=None, **kwargs):
+        return self._execute(
+            'HEAD',
+            url,
+            lambda session, absolute_url: session.head(absolute_url, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-            # 5xx errors should mark the server down
-            # everything else is good to go
-            if response.status_code < 500:
-                return response
+    def get(self, url, params=None, hash_key=None, **kwargs):
+        return self._execute(
+            'GET',
+            url,
+            lambda session, absolute_url: session.get(absolute_url, params=params, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-        except RequestException as e:
-            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+    def post(self, url, data=None, json=None, hash_key=None, **kwargs):
+        return self._execute(
+            'POST',
+            url,
+            lambda session, absolute_url: session.post(absolute_url, data, json, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+    def put(self, url, data=None, hash_key=None, **kwargs):
+        return self._execute(
+            'PUT',
+            url,
+            lambda session, absolute_url: session.put(absolute_url, data, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-        return self.request(method, url, **kwargs)
+    def patch(self, url, data=None, hash_key=None, **kwargs):
+        return self._execute(
+            'PATCH',
+            url,
+            lambda session, absolute_url: session.patch(absolute_url, data, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-    def options(self, url, **kwargs):
+    def delete(self, url, hash_key=None, **kwargs):
+        return self._execute(
+            'DELETE',
+            url,
+            lambda session, absolute_url: session.delete(absolute_url, timeout=self._request_timeout, **kwargs),
+            hash_key
+        )
 
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
-        absolute_url = self._get_absolute_url(server, url, self._use_https)
+    def close(self):
+        self._load_balancer.remove_membership_listener(self._on_servers_changed)
+        self._load_balancer.events.unsubscribe(Event.SERVER_UP, self._on_server_up)
 
-        self._logger.debug("Request: OPTIONS %s", absolute_url)
+        with self._hedge_lock:
+            if self._hedge_timer is not None:
+                self._hedge_timer.close()
+                self._hedge_timer = None
 
-        try:
-            response = requests.options(absolute_url, timeout=self._request_timeout, **kwargs)
+        with self._warm_up_lock:
+            if self._warm_up_pool is not None:
+                self._warm_up_pool.close()
+                self._warm_up_pool.join()
+                self._warm_up_pool = None
 
-            # 5xx errors should mark the server down
-            # everything else is good to go
-            if response.status_code < 500:
-                return response
+        self._pool.close()
 
-        except RequestException as e:
-            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+    def _execute(self, method, url, send, hash_key=None):
 
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+        state = self._retry.begin(hash_key)
+        is_hedged = self._hedge is not None and self._hedge.is_hedged(method)
 
-        return self.options(url, **kwargs)
+        while True:
 
-    def head(self, url, **kwargs):
+            # choose a server from the pool,
+            # will throw if there are none left
+            if is_hedged:
+                server, response, error = self._send_hedged(state, method, url, send)
+            else:
+                server = state.choose_server(self._load_balancer)
+                response, error = self._send(server, method, url, send)
 
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
-        absolute_url = self._get_absolute_url(server, url, self._use_https)
-
-        self._logger.debug("Request: HEAD %s", absolute_url)
-
-        try:
-            response = requests.head(absolute_url, timeout=self._request_timeout, **kwargs)
-
-            # 5xx errors should mark the server down
+            # 5xx errors (which mark the server down, or count
+            # against it) are retried on another server,
             # everything else is good to go
-            if response.status_code < 500:
+            if self._is_success(response, error):
                 return response
 
-        except RequestException as e:
-            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
-
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+            if not state.can_retry():
+                self._logger.debug("Giving up on request after %s attempt(s): %s %s", state.attempts, method, url)
+                if error is not None:
+                    raise error
+                return response
 
-        return self.head(url, **kwargs)
+            backoff_time = state.backoff_time()
+            if backoff_time > 0:
+                time.sleep(backoff_time)
 
-    def get(self, url, params=None, **kwargs):
+    def _send(self, server, method, url, send, abortable=None):
 
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
         absolute_url = self._get_absolute_url(server, url, self._use_https)
+        stats = self._load_balancer.stats.get_server_stats(server)
 
-        self._logger.debug("Request: GET %s", absolute_url)
+        self._logger.debug("Request: %s %s", method, absolute_url)
 
-        try:
-            response = requests.get(absolute_url, params, timeout=self._request_timeout, **kwargs)
-
-            # 5xx errors should mark the server down
-            # everything else is good to go
-            if response.status_code < 500:
-                return response
+        stats.increment_active_requests()
+        start_time = timer()
 
+        try:
+            if abortable is None:
+                response = send(self._session(server), absolute_url)
+            else:
+                with abortable:
+                    response = send(self._session(server), absolute_url)
         except RequestException as e:
+            # lost a hedged race, not the server's fault
+            if abortable is not None and abortable.is_aborted:
+                self._logger.debug("Aborted request to server for url: '%s'", absolute_url)
+                return None, e
+
             self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+            stats.increment_failures()
+            self._load_balancer.record_result(server, False, timer() - start_time)
+            return None, e
+        finally:
+            stats.decrement_active_requests()
+
+        response_time = timer() - start_time
+        stats.add_response_time(response_time)
+        self._load_balancer.record_response_time(server, response_time)
+
+        is_success = self._is_success(response, None)
+        if is_success:
+            stats.record_success()
+        else:
+            stats.increment_failures()
 
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+        self._load_balancer.record_result(server, is_success, response_time)
 
-        return self.get(url, params, **kwargs)
+        if self._hedge is not None and self._hedge.is_hedged(method):
+            self._hedge.add_response_time(response_time)
 
-    def post(self, url, data=None, json=None, **kwargs):
+        return response, None
 
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
-        absolute_url = self._get_absolute_url(server, url, self._use_https)
+    def _send_hedged(self, state, method, url, send):
 
-        self._logger.debug("Request: POST %s", absolute_url)
+        delay = self._hedge.delay_time()
+        primary = state.choose_server(self._load_balancer)
 
-        try:
-            response = requests.post(absolute_url, data, json, timeout=self._request_timeout, **kwargs)
-
-            # 5xx errors should mark the server down
-            # everything else is good to go
-            if response.status_code < 500:
-                return response
-
-        except RequestException as e:
-            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+        # not enough data to hedge on yet
+        if delay is None:
+            response, error = self._send(primary, method, url, send)
+            return primary, response, error
 
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+        hedged_request = _HedgedRequest(self, state, method, url, send)
+        return hedged_request.send(primary, delay)
 
-        return self.post(url, data, json, **kwargs)
+    def _choose_hedge_server(self, state, primary):
+        try:
+            server = state.choose_server(self._load_balancer, count_attempt=False)
+        except NoReachableServers:
+            return None
 
-    def put(self, url, data=None, **kwargs):
+        # nowhere else to send it
+        if server == primary:
+            return None
 
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
-        absolute_url = self._get_absolute_url(server, url, self._use_https)
+        return server
 
-        self._logger.debug("Request: PUT %s", absolute_url)
+    def _get_hedge_timer(self):
+        with self._hedge_lock:
+            if self._hedge_timer is None:
+                self._hedge_timer = _HedgeTimer()
+            return self._hedge_timer
 
-        try:
-            response = requests.put(absolute_url, data, timeout=self._request_timeout, **kwargs)
+    @staticmethod
+    def _is_success(response, error):
+        return error is None and response.status_code < 500
 
-            # 5xx errors should mark the server down
-            # everything else is good to go
-            if response.status_code < 500:
-                return response
+    @staticmethod
+    def _create_pool(pool_size, idle_timeout):
+        return SessionPool(
+            pool_size if pool_size is not None else SessionPool.DEFAULT_POOL_SIZE,
+            idle_timeout if idle_timeout is not None else SessionPool.DEFAULT_IDLE_TIMEOUT
+        )
 
-        except RequestException as e:
-            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+    def _on_servers_changed(self, added, removed, changed):
+        if removed:
+            self._pool.discard(removed)
 
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+    def _on_server_up(self, event):
+        self._warm_up(event.server)
 
-        return self.put(url, data, **kwargs)
+    def _warm_up(self, server):
 
-    def patch(self, url, data=None, **kwargs):
+        # in the background, connecting can take a while
+        with self._warm_up_lock:
+            if self._warm_up_pool is None:
+                self._warm_up_pool = ThreadPool(processes=self.WARM_UP_WORKERS)
+            pool = self._warm_up_pool
 
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
-        absolute_url = self._get_absolute_url(server, url, self._use_https)
+        url = self._get_absolute_url(server, '/', self._use_https)
+        pool.apply_async(self._pool.warm_up, (server, url, self._warm_up_connections, self._request_timeout))
 
-        self._logger.debug("Request: PATCH %s", absolute_url)
+    def _session(self, server):
 
-        try:
-            response = requests.patch(absolute_url, data, timeout=self._request_timeout, **kwargs)
+        # close any pools for servers that have
+        # left the load balancer or gone idle
+        self._pool.evict_if_due(self._load_balancer)
 
-            # 5xx errors should mark the server down
-            # everything else is good to go
-            if response.status_code < 500:
-                return response
+        return self._pool.session(server)
 
-        except RequestException as e:
-            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+    @staticmethod
+    def _get_absolute_url(server, relative_url, use_https):
 
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+        url = UrlBuilder.from_parts(
+            hostname=server.address,
+            port=server.port
+        )
+        url.append_path(relative_url)
 
-        return self.patch(url, data, **kwargs)
+        if use_https:
+            url.https()
 
-    def delete(self, url, **kwargs):
+        return unicode(url)
 
-        # choose a server from the pool
-        server = self._load_balancer.choose_server()
-        absolute_url = self._get_absolute_url(server, url, self._use_https)
 
-        self._logger.debug("Request: DELETE %s", absolute_url)
+class _HedgedRequest(object):
+    """
+    A single hedged request.
+
+    The primary attempt runs on the caller's thread. If it hasn't
+    finished within the delay, a hedge is sent to another server on a
+    thread of its own. Whichever succeeds first wins, and the other is
+    stopped by shutting down its connection.
+    """
+
+    def __init__(self, service, state, method, url, send):
+        self._service = service
+        self._state = state
+        self._method = method
+        self._url = url
+        self._send = send
+        self._results = Queue()
+        self._lock = threading.Lock()
+        self._primary = None
+        self._primary_attempt = Abortable()
+        self._hedge_attempt = Abortable()
+        self._is_hedged = False
+        self._is_primary_done = False
+        self._is_finished = False
+
+    def send(self, primary, delay):
+        self._primary = primary
+        hedge_timer = self._service._get_hedge_timer()
+        entry = hedge_timer.schedule(delay, self._start_hedge)
 
         try:
-            response = requests.delete(absolute_url, timeout=self._request_timeout, **kwargs)
+            response, error = self._service._send(primary, self._method, self._url, self._send, self._primary_attempt)
+            result = (primary, response, error)
+
+            with self._lock:
+                self._is_primary_done = True
+                is_hedged = self._is_hedged
+
+            if not is_hedged or self._service._is_success(response, error):
+                return result
+
+            # the primary failed (or lost), wait for the hedge
+            return self._hedge_result(result)
+
+        finally:
+            with self._lock:
+                self._is_primary_done = True
+            hedge_timer.cancel(entry)
+            self._finish()
+
+    def _start_hedge(self):
+        with self._lock:
+            if self._is_primary_done:
+                return
+            self._is_hedged = True
+
+        # only hedges get a thread of their own, so
+        # there's no limit on concurrent requests
+        thread = threading.Thread(name='ballast-hedge', target=self._run_hedge)
+        thread.daemon = True
+        thread.start()
+
+    def _run_hedge(self):
+        try:
+            server = self._service._choose_hedge_server(self._state, self._primary)
+            if server is None:
+                result = None
+            else:
+                self._service._logger.debug("Hedging request to server: %s", server)
+                self._service._hedge.increment_hedges_sent()
+                response, error = self._service._send(server, self._method, self._url, self._send, self._hedge_attempt)
+                result = (server, response, error)
+        except BaseException as e:
+            # handed to the caller's thread and raised there
+            result = (None, None, e)
+
+        with self._lock:
+            if self._is_finished:
+                if result is not None and result[1] is not None:
+                    result[1].close()
+                return
+
+            self._results.put(result)
+
+            if result is not None and self._service._is_success(result[1], result[2]) and not self._is_primary_done:
+                self._primary_attempt.abort()
+
+    def _hedge_result(self, result):
+        hedge_result = self._results.get()
+
+        # nowhere to send the hedge
+        if hedge_result is None:
+            return result
+
+        server, response, error = hedge_result
+        if error is not None and not isinstance(error, RequestException):
+            raise error
+
+        if not self._service._is_success(response, error):
+            return result
+
+        self._service._hedge.increment_hedges_won()
+        if result[1] is not None:
+            result[1].close()
+
+        return hedge_result
+
+    def _finish(self):
+        with self._lock:
+            self._is_finished = True
+
+        # stop the hedge if it's still in flight,
+        # and close out anything it sent back
+        self._hedge_attempt.abort()
+
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except Empty:
+                return
+
+            if result is not None and result[1] is not None:
+                result[1].close()
+
+
+class _HedgeTimer(object):
+    """
+    Starts the hedges of in-flight requests once their delay is up,
+    on a single background thread shared by every request.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._entries = []
+        self._sequence = 0
+        self._is_closed = False
+        self._thread = threading.Thread(name='ballast-hedge-timer', target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def schedule(self, delay, callback):
+        with self._condition:
+            self._sequence += 1
+            entry = [timer() + delay, self._sequence, callback]
+            heapq.heappush(self._entries, entry)
+            if self._entries[0] is entry:
+                self._condition.notify()
+
+        return entry
 
-            # 5xx errors should mark the server down
-            # everything else is good to go
-            if response.status_code < 500:
-                return response
+    @staticmethod
+    def cancel(entry):
+        # dropped once its time comes up
+        entry[2] = None
 
-        except RequestException as e:
-            self._logger.error("Request to server failed for url: '%s': %s", absolute_url, e)
+    def close(self):
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify()
 
-        # mark this server down and try the
-        # request again with a new server
-        self._load_balancer.mark_server_down(server)
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._is_closed:
+                    if not self._entries:
+                        self._condition.wait()
+                        continue
 
-        return self.delete(url, **kwargs)
+                    wait_time = self._entries[0][0] - timer()
+                    if wait_time <= 0:
+                        break
 
-    @staticmethod
-    def _get_absolute_url(server, relative_url, use_https):
+                    self._condition.wait(wait_time)
 
-        url = UrlBuilder.from_parts(
-            hostname=server.address,
-            port=server.port
-        )
-        url.append_path(relative_url)
+                if self._is_closed:
+                    return
 
-        if use_https:
-            url.https()
+                callback = heapq.heappop(self._entries)[2]
 
-        return unicode(url)
+            if callback is None:
+                continue
+
+            try:
+                callback()
+            except Exception as e:
+                logging.getLogger(self.__module__).warning("Could not start hedged request: %s", e)
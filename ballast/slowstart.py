@@ -0,0 +1,44 @@
+class SlowStart(object):
+    """
+    Slow-start policy for servers that have just come up (or back up).
+
+    For `duration` seconds after a server comes up, its effective weight
+    ramps from `min_weight` (a fraction of its full weight) up to its full
+    weight. The ramp is linear with an `aggression` of 1; above 1 the
+    weight climbs quickly at first and levels off, below 1 it stays low
+    for longer and then climbs steeply.
+
+    The progress of each server's ramp is kept by its
+    :class:`~ballast.discovery.ServerStats`.
+    """
+
+    DEFAULT_DURATION = 30
+    DEFAULT_MIN_WEIGHT = 0.1
+    DEFAULT_AGGRESSION = 1.0
+
+    def __init__(
+            self,
+            duration=DEFAULT_DURATION,
+            min_weight=DEFAULT_MIN_WEIGHT,
+            aggression=DEFAULT_AGGRESSION
+    ):
+
+        assert duration > 0
+        assert 0 < min_weight <= 1
+        assert aggression > 0
+
+        self.duration = duration
+        self.min_weight = min_weight
+        self.aggression = aggression
+
+    def factor(self, elapsed):
+        """
+        The fraction of its full weight a server gets
+        `elapsed` seconds after it came up.
+        """
+        if elapsed >= self.duration:
+            return 1.0
+
+        ramp = (max(elapsed, 0) / float(self.duration)) ** (1.0 / self.aggression)
+
+        return max(self.min_weight, ramp)
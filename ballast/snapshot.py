@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from ballast.discovery import Server, _fingerprint
+
+
+class SnapshotFile(object):
+    """
+    Keeps the last known good reachable servers of a load balancer on
+    disk, so a restarted process can send requests to them straight away
+    instead of waiting for its first discovery and ping round.
+
+    The file is replaced atomically whenever the reachable servers
+    change. A snapshot older than `max_age` seconds is ignored.
+    """
+
+    _VERSION = 1
+
+    def __init__(self, path, max_age=None):
+
+        assert max_age is None or max_age > 0
+
+        self.path = path
+        self.max_age = max_age
+        self._saved = None
+        self._logger = logging.getLogger(self.__module__)
+
+    def load(self):
+        """
+        The servers in the snapshot, or an empty list if
+        there's no (usable) snapshot.
+        """
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (IOError, OSError):
+            return []
+        except ValueError as e:
+            self._logger.warning("Ignoring unreadable server snapshot %s: %s", self.path, e)
+            return []
+
+        try:
+            if snapshot.get('version') != self._VERSION:
+                return []
+
+            if self.max_age is not None and time.time() - snapshot.get('time', 0) > self.max_age:
+                self._logger.debug("Ignoring server snapshot older than %ss: %s", self.max_age, self.path)
+                return []
+
+            servers = [
+                Server(s['address'], s['port'], s['weight'], s['priority'], s['ttl'])
+                for s in snapshot.get('servers', [])
+            ]
+        except (KeyError, TypeError, AttributeError) as e:
+            self._logger.warning("Ignoring malformed server snapshot %s: %r", self.path, e)
+            return []
+
+        self._saved = _fingerprint(servers)
+        self._logger.debug("Loaded %s servers from snapshot: %s", len(servers), self.path)
+
+        return servers
+
+    def save(self, servers):
+        """
+        Replace the snapshot with `servers`, unless they're unchanged
+        (or there are none, the last good snapshot is kept).
+        """
+        fingerprint = _fingerprint(servers)
+        if not fingerprint or fingerprint == self._saved:
+            return
+
+        snapshot = {
+            'version': self._VERSION,
+            'time': time.time(),
+            'servers': [
+                {
+                    'address': s.address,
+                    'port': s.port,
+                    'weight': s.weight,
+                    'priority': s.priority,
+                    'ttl': s.ttl
+                }
+                for s in servers
+            ]
+        }
+
+        # write to a temporary file next to the snapshot and rename
+        # it over the snapshot, readers never see a partial file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.ballast-', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+
+            _replace(temp_path, self.path)
+        except Exception as e:
+            self._logger.warning("Could not save server snapshot %s: %s", self.path, e)
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            return
+
+        self._saved = fingerprint
+
+
+# os.replace is Python 3.3+, rename
+# replaces atomically on POSIX too
+_replace = getattr(os, 'replace', os.rename)
@@ -1,3 +1,6 @@
+import bisect
+import math
+from collections import deque
 from past.builtins import basestring, unicode
 try:
     from urllib.parse import urlparse, urlunparse, urljoin, parse_qs, urlencode
@@ -215,3 +218,54 @@ class UrlBuilder(object):
             host += ':{}'.format(self._port)
 
         return host
+
+
+class SlidingWindow(object):
+    """
+    Keeps the most recent `size` samples (e.g. response times)
+    and answers percentile queries over them.
+
+    Adding a sample is a single (thread-safe) deque append,
+    the cost of sorting is only paid when querying.
+    """
+
+    DEFAULT_SIZE = 1000
+
+    def __init__(self, size=DEFAULT_SIZE):
+
+        assert isinstance(size, int) and size > 0
+
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, value):
+        self._samples.append(value)
+
+    def values(self):
+        return list(self._samples)
+
+    def percentile(self, percentile):
+
+        assert 0 <= percentile <= 100
+
+        samples = sorted(self._samples)
+        if len(samples) == 0:
+            return None
+
+        # nearest-rank percentile
+        rank = int(math.ceil(percentile / 100.0 * len(samples)))
+        return samples[max(rank, 1) - 1]
+
+    def histogram(self, bounds):
+        """
+        Count the samples falling into each of the buckets defined
+        by the (ascending) upper `bounds`, plus one final bucket
+        for anything greater than the last bound.
+        """
+        counts = [0] * (len(bounds) + 1)
+        for value in self.values():
+            counts[bisect.bisect_left(bounds, value)] += 1
+
+        return counts
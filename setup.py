@@ -88,7 +88,7 @@ setup(name='ballast',
       maintainer_email='smith.justin.c@gmail.com',
       license='Apache License 2.0',
       url='https://github.com/thomasstreet/ballast',
-      packages=find_packages(exclude=['test', 'docs']),
+      packages=find_packages(exclude=['test', 'test.*', 'docs', 'docs.*']),
       package_data={
           'ballast': ['../version.py', '../LICENSE'],
       },
@@ -99,7 +99,9 @@ setup(name='ballast',
       extras_require={
           'dns': ['dnspython'],
           'gevent': ['gevent'],
-          'all': ['dnspython', 'gevent']
+          # asyncio support requires Python 3.8+
+          'aio': ['aiohttp; python_version >= "3.8"'],
+          'all': ['dnspython', 'gevent', 'aiohttp; python_version >= "3.8"']
       },
       cmdclass={
           'version': GenerateVersionCommand
@@ -131,6 +133,10 @@ setup(name='ballast',
           'Programming Language :: Python :: 3.4',
           'Programming Language :: Python :: 3.5',
           'Programming Language :: Python :: 3.6',
+          'Programming Language :: Python :: 3.8',
+          'Programming Language :: Python :: 3.9',
+          'Programming Language :: Python :: 3.10',
+          'Programming Language :: Python :: 3.11',
           'Programming Language :: Python :: Implementation :: CPython',
           'Programming Language :: Python :: Implementation :: PyPy'
       ],
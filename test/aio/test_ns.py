@@ -0,0 +1,131 @@
+import socket
+import threading
+import time
+import unittest
+import uuid
+from dns import message, rdatatype, rrset
+from ballast.discovery.ns import DnsARecordList, DnsServiceRecordList
+from ballast.aio.ns import resolve, resolve_all
+
+
+class _FakeDnsServer(object):
+    """
+    Answers A and SRV queries over UDP, each after `delay` seconds.
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.queries = []
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(('127.0.0.1', 0))
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self._socket.getsockname()[1]
+
+    def close(self):
+        self._socket.close()
+
+    def _serve(self):
+        while True:
+            try:
+                wire, addr = self._socket.recvfrom(4096)
+            except OSError:
+                return
+
+            request = message.from_wire(wire)
+            self.queries.append(request.question[0].name.to_text())
+
+            t = threading.Timer(self.delay, self._respond, (request, addr))
+            t.daemon = True
+            t.start()
+
+    def _respond(self, request, addr):
+        question = request.question[0]
+        qname = question.name.to_text()
+        response = message.make_response(request)
+
+        if question.rdtype == rdatatype.A:
+            response.answer.append(rrset.from_text(qname, 60, 'IN', 'A', '127.1.1.1', '127.1.1.2'))
+        elif question.rdtype == rdatatype.SRV:
+            response.answer.append(rrset.from_text(qname, 60, 'IN', 'SRV', '1 5 3000 host.test.'))
+            response.additional.append(rrset.from_text('host.test.', 60, 'IN', 'A', '127.1.1.3'))
+
+        try:
+            self._socket.sendto(response.to_wire(), addr)
+        except OSError:
+            pass
+
+
+def _qname(prefix):
+    # a name that's never been cached
+    return '%s-%s.service.test.' % (prefix, uuid.uuid4().hex)
+
+
+class ResolveTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self._dns = _FakeDnsServer(delay=0.3)
+        self.addCleanup(self._dns.close)
+
+    async def test_resolve(self):
+
+        servers = DnsARecordList(_qname('a'), 'localhost', self._dns.port, server_port=8080)
+        server_list = await resolve(servers)
+
+        self.assertEqual(
+            [('127.1.1.1', 8080, 60), ('127.1.1.2', 8080, 60)],
+            sorted((s.address, s.port, s.ttl) for s in server_list)
+        )
+
+        # the DNS host was looked up without blocking
+        self.assertEqual(['127.0.0.1'], servers._dns_resolver.nameservers)
+
+        # the blocking resolver is served from the cache
+        self.assertEqual(2, len(list(servers.get_servers())))
+        self.assertEqual(1, len(self._dns.queries))
+
+    async def test_resolve_srv(self):
+
+        servers = DnsServiceRecordList(_qname('srv'), '127.0.0.1', self._dns.port)
+        server_list = await resolve(servers)
+
+        self.assertEqual(
+            [('127.1.1.3', 3000, 5, 1, 60)],
+            [(s.address, s.port, s.weight, s.priority, s.ttl) for s in server_list]
+        )
+
+    async def test_resolve_all(self):
+
+        server_lists = [DnsARecordList(_qname('a%s' % i), '127.0.0.1', self._dns.port) for i in range(5)]
+
+        # all queried at once
+        start_time = time.time()
+        results = await resolve_all(server_lists)
+
+        self.assertLess(time.time() - start_time, 1.0)
+        self.assertEqual([2] * 5, [len(servers) for servers in results])
+        self.assertEqual(5, len(self._dns.queries))
+
+    async def test_no_answer(self):
+
+        # nothing listening
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+        s.close()
+
+        servers = DnsARecordList(_qname('a'), '127.0.0.1', port)
+        servers._resolver.timeout = 0.2
+
+        self.assertEqual([], await resolve(servers))
+
+    async def test_unknown_dns_host(self):
+
+        servers = DnsARecordList(_qname('a'), 'no-such-host.invalid', self._dns.port)
+
+        self.assertEqual([], await resolve(servers))
+        self.assertEqual([], self._dns.queries)
@@ -0,0 +1,168 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+from ballast import Server
+from ballast.ping import Ping, DummyPing
+from ballast.aio.ping import AsyncPing, AsyncSocketPing, AsyncUrlPing, AsyncioPingStrategy
+from ballast.discovery.static import StaticServerList
+from ballast.exception import BallastException
+
+
+class _MockAsyncPing(AsyncPing):
+
+    def __init__(self, delay=0):
+        super(_MockAsyncPing, self).__init__()
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    async def is_alive_async(self, server):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return True
+
+
+class _MockPing(Ping):
+
+    def is_alive(self, server):
+        time.sleep(0.1)
+        return True
+
+
+def _closed_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class AsyncPingTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+
+        async def respond(reader, writer):
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await writer.drain()
+            writer.close()
+
+        self._server = await asyncio.start_server(respond, '127.0.0.1', 0)
+        self._port = self._server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def test_socket_ping(self):
+
+        ping = AsyncSocketPing()
+        ping.max_ping_time = 2
+
+        self.assertTrue(await ping.is_alive_async(Server('127.0.0.1', self._port)))
+        self.assertFalse(await ping.is_alive_async(Server('127.0.0.1', _closed_port())))
+
+    async def test_url_ping(self):
+
+        ping = AsyncUrlPing()
+        ping.max_ping_time = 2
+
+        self.assertTrue(await ping.is_alive_async(Server('127.0.0.1', self._port)))
+        self.assertFalse(await ping.is_alive_async(Server('127.0.0.1', _closed_port())))
+
+    async def test_ping_async(self):
+
+        servers = StaticServerList([])
+        for i in range(20):
+            servers.add_server('127.0.0.%s' % i)
+
+        ping = _MockAsyncPing(delay=0.1)
+        strategy = AsyncioPingStrategy(max_concurrency=5)
+
+        # runs on the current loop
+        results = await strategy.ping_async(ping, servers)
+
+        self.assertEqual(20, len(results))
+        self.assertEqual(5, ping.max_active)
+        for server in results:
+            self.assertTrue(server.is_alive)
+            self.assertIsNotNone(server.ping_time)
+
+    async def test_ping_blocks_loop(self):
+
+        strategy = AsyncioPingStrategy(loop=asyncio.get_running_loop())
+        self.assertRaises(BallastException, strategy.ping, DummyPing(), StaticServerList(['127.0.0.1']))
+
+
+class AsyncioPingStrategyTest(unittest.TestCase):
+
+    def setUp(self):
+        self._strategy = AsyncioPingStrategy()
+
+    def tearDown(self):
+        self._strategy.close()
+
+    def test_background_loop(self):
+
+        servers = StaticServerList([])
+        for i in range(100):
+            servers.add_server('127.0.0.%s' % i)
+
+        ping = _MockAsyncPing(delay=0.2)
+
+        # all pinged concurrently on the background loop
+        start_time = time.time()
+        results = self._strategy.ping(ping, servers)
+
+        self.assertLess(time.time() - start_time, 2)
+        self.assertEqual(100, len(results))
+        self.assertEqual(100, ping.max_active)
+        for server in results:
+            self.assertTrue(server.is_alive)
+
+        # the loop is re-used by the next round
+        loop = self._strategy._loop
+        self._strategy.ping(ping, servers)
+        self.assertIs(loop, self._strategy._loop)
+
+    def test_blocking_ping(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+
+        # blocking pings run in the executor
+        results = self._strategy.ping(_MockPing(), servers)
+
+        self.assertEqual(2, len(results))
+        for server in results:
+            self.assertTrue(server.is_alive)
+
+    def test_existing_loop(self):
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+
+        try:
+            strategy = AsyncioPingStrategy(loop=loop)
+            results = strategy.ping(_MockAsyncPing(), StaticServerList(['127.0.0.1']))
+            strategy.close()
+
+            self.assertEqual(1, len(results))
+
+            # the loop isn't ours to stop
+            self.assertTrue(loop.is_running())
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    def test_blocking_is_alive(self):
+
+        ping = _MockAsyncPing()
+        self.assertTrue(ping.is_alive(Server('127.0.0.1', 80)))
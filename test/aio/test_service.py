@@ -0,0 +1,267 @@
+import asyncio
+import json
+import time
+import unittest
+from ballast import LoadBalancer, ping
+from ballast.aio import AsyncService
+from ballast.discovery import Server
+from ballast.discovery.static import StaticServerList
+from ballast.exception import NoReachableServers
+from ballast.retry import Retry
+from ballast.hedge import Hedge
+
+
+class _StubHttpServer(object):
+    """
+    Minimal HTTP/1.1 keep-alive server that echoes
+    the request back as a JSON response body.
+    """
+
+    def __init__(self, status=200, delay=0):
+        self.status = status
+        self.delay = delay
+        self.delays = []
+        self.connections = 0
+        self.requests = []
+        self.cookies = []
+        self.port = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, value = line.decode('latin-1').split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                self.requests.append((method, path))
+                self.cookies.append(headers.get('cookie'))
+
+                delay = self.delays.pop(0) if self.delays else self.delay
+                if delay:
+                    await asyncio.sleep(delay)
+
+                payload = json.dumps({
+                    'method': method,
+                    'path': path,
+                    'body': body.decode('utf-8')
+                }).encode('utf-8')
+
+                cookie = b'Set-Cookie: session=secret; Path=/\r\n' if path == '/login' else b''
+                writer.write(
+                    b'HTTP/1.1 %d STUB\r\n'
+                    b'Content-Type: application/json\r\n'
+                    b'%s'
+                    b'Content-Length: %d\r\n'
+                    b'\r\n' % (self.status, cookie, len(payload))
+                )
+                if method != 'HEAD':
+                    writer.write(payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class AsyncServiceTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._stubs = [_StubHttpServer(), _StubHttpServer()]
+        for stub in self._stubs:
+            await stub.start()
+
+        servers = StaticServerList([Server('127.0.0.1', stub.port) for stub in self._stubs])
+        self._load_balancer = LoadBalancer(servers, ping=ping.DummyPing(), ping_on_start=False)
+        self._load_balancer.ping()
+
+        self._service = AsyncService(self._load_balancer, request_timeout=2)
+
+    async def asyncTearDown(self):
+        await self._service.close()
+        for stub in self._stubs:
+            await stub.stop()
+
+    async def test_get_ok(self):
+
+        response = await self._service.get('/relative/path', params={'a': 1})
+
+        self.assertEqual(200, response.status)
+        result = await response.json()
+        self.assertEqual('GET', result['method'])
+        self.assertEqual('/relative/path?a=1', result['path'])
+
+    async def test_post_ok(self):
+
+        response = await self._service.post('/relative/path', json={'key': 'value'})
+
+        self.assertEqual(200, response.status)
+        result = await response.json()
+        self.assertEqual('POST', result['method'])
+        self.assertEqual({'key': 'value'}, json.loads(result['body']))
+
+    async def test_all_verbs_ok(self):
+
+        calls = [
+            ('OPTIONS', self._service.options),
+            ('HEAD', self._service.head),
+            ('GET', self._service.get),
+            ('POST', self._service.post),
+            ('PUT', self._service.put),
+            ('PATCH', self._service.patch),
+            ('DELETE', self._service.delete),
+        ]
+
+        for method, call in calls:
+            response = await call('/relative/path')
+            self.assertEqual(200, response.status)
+
+        methods = [m for stub in self._stubs for m, _ in stub.requests]
+        self.assertEqual(sorted(m for m, _ in calls), sorted(methods))
+
+    async def test_connections_reused(self):
+
+        for i in range(20):
+            response = await self._service.get('/relative/path')
+            self.assertEqual(200, response.status)
+
+        # one keep-alive connection per server
+        for stub in self._stubs:
+            self.assertEqual(10, len(stub.requests))
+            self.assertEqual(1, stub.connections)
+
+        self.assertEqual(2, len(self._service._pool))
+
+    async def test_concurrent_requests(self):
+
+        for stub in self._stubs:
+            stub.delay = 0.05
+
+        # all requests are in flight at the same time, give the
+        # (debug mode) test event loop some room to work through them
+        self._service._request_timeout = 30
+
+        responses = await asyncio.gather(*[
+            self._service.get('/relative/path/%s' % i)
+            for i in range(500)
+        ])
+
+        self.assertEqual(500, len(responses))
+        for response in responses:
+            self.assertEqual(200, response.status)
+
+    async def test_server_error_retries(self):
+
+        self._stubs[0].status = 500
+
+        for i in range(4):
+            response = await self._service.get('/relative/path')
+            self.assertEqual(200, response.status)
+
+        # the failing server should have been marked down
+        self.assertEqual(1, len(self._stubs[0].requests))
+        self.assertEqual(1, len(self._load_balancer.reachable_servers))
+
+    async def test_all_servers_error(self):
+
+        for stub in self._stubs:
+            stub.status = 500
+
+        with self.assertRaises(NoReachableServers):
+            await self._service.get('/relative/path')
+
+        # each server should have been tried once
+        for stub in self._stubs:
+            self.assertEqual(1, len(stub.requests))
+
+    async def test_max_attempts(self):
+
+        for stub in self._stubs:
+            stub.status = 500
+
+        service = AsyncService(self._load_balancer, request_timeout=2, retry=Retry(max_attempts=1))
+        try:
+            response = await service.get('/relative/path')
+        finally:
+            await service.close()
+
+        # gives up after a single attempt
+        self.assertEqual(500, response.status)
+        self.assertEqual(1, sum(len(stub.requests) for stub in self._stubs))
+
+    async def test_cookies_not_shared(self):
+
+        # by name, cookies from bare IP addresses are ignored anyway
+        servers = StaticServerList([Server('localhost', self._stubs[0].port)])
+        load_balancer = LoadBalancer(servers, ping=ping.DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+        service = AsyncService(load_balancer, request_timeout=2)
+
+        # one caller's cookies never reach another's requests
+        for path in ('/login', '/public', '/public', '/public'):
+            response = await service.get(path)
+            response.release()
+
+        await service.close()
+
+        self.assertEqual([None] * 4, self._stubs[0].cookies)
+
+    async def test_hedged_request(self):
+
+        # whichever server gets the first request is slow to respond
+        delays = [0.6]
+        for stub in self._stubs:
+            stub.delays = delays
+
+        hedge = Hedge(delay=0.15)
+        service = AsyncService(self._load_balancer, request_timeout=2, hedge=hedge)
+        try:
+            start_time = time.time()
+            response = await service.get('/relative/path')
+            self.assertEqual(200, response.status)
+            self.assertLess(time.time() - start_time, 0.6)
+
+            # the hedge (to the other server) should have won
+            self.assertEqual(1, hedge.hedges_sent)
+            self.assertEqual(1, hedge.hedges_won)
+            for stub in self._stubs:
+                self.assertEqual(1, len(stub.requests))
+
+            # fast responses aren't hedged
+            response = await service.get('/relative/path')
+            self.assertEqual(200, response.status)
+            self.assertEqual(1, hedge.hedges_sent)
+        finally:
+            await service.close()
+
+    async def test_unreachable_server(self):
+
+        await self._stubs[0].stop()
+
+        for i in range(4):
+            response = await self._service.get('/relative/path')
+            self.assertEqual(200, response.status)
+
+        self.assertEqual(1, len(self._load_balancer.reachable_servers))
@@ -0,0 +1,7 @@
+import sys
+
+
+# the asyncio tests (and ballast.aio) need Python 3.8+
+collect_ignore = []
+if sys.version_info < (3, 8):
+    collect_ignore.append('aio')
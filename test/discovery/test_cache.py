@@ -0,0 +1,104 @@
+import unittest
+import mock
+from ballast.discovery import Server, ServerList
+from ballast.discovery.cache import CachingServerList
+
+
+class _SourceServerList(ServerList):
+
+    def __init__(self, addresses, ttl=10):
+        self.addresses = addresses
+        self.ttl = ttl
+        self.fail = False
+        self.count = 0
+
+    def get_servers(self):
+        self.count += 1
+        if self.fail:
+            raise IOError("unreachable")
+        return [Server(a, 80, ttl=self.ttl) for a in self.addresses]
+
+
+class CachingServerListTest(unittest.TestCase):
+
+    def setUp(self):
+        self._now = 0
+        patcher = mock.patch('ballast.discovery.cache.timer', side_effect=lambda: self._now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self._source = _SourceServerList(['127.0.0.1', '127.0.0.2'])
+        self._servers = CachingServerList(self._source, refresh_ratio=0.8, max_stale=30)
+
+    def _get_servers(self):
+        servers = self._servers.get_servers()
+
+        # wait for any background refresh
+        refreshing = self._servers._refreshing
+        if refreshing is not None:
+            refreshing.join()
+
+        return set(s.address for s in servers)
+
+    def test_cached(self):
+
+        self.assertEqual({'127.0.0.1', '127.0.0.2'}, self._get_servers())
+        self.assertEqual(1, self._source.count)
+
+        # served from the cache until most of the ttl has passed
+        self._now = 7
+        self.assertEqual({'127.0.0.1', '127.0.0.2'}, self._get_servers())
+        self.assertEqual(1, self._source.count)
+
+    def test_refresh_ahead(self):
+
+        self._get_servers()
+        changed = mock.Mock()
+        self._servers.on_change = changed
+
+        # refreshed in the background, the cached
+        # servers are returned in the meantime
+        self._source.addresses = ['127.0.0.3']
+        self._now = 8
+        self.assertEqual({'127.0.0.1', '127.0.0.2'}, self._get_servers())
+        self.assertEqual(2, self._source.count)
+        self.assertTrue(changed.called)
+
+        self.assertEqual({'127.0.0.3'}, self._get_servers())
+
+    def test_stale(self):
+
+        self._get_servers()
+
+        self._source.fail = True
+        self._now = 30
+        self.assertEqual({'127.0.0.1', '127.0.0.2'}, self._get_servers())
+        self.assertEqual(2, self._source.count)
+
+        # retried soon after a failure
+        self._now = 31
+        self.assertEqual({'127.0.0.1', '127.0.0.2'}, self._get_servers())
+        self.assertEqual(3, self._source.count)
+
+        # but only served for so long
+        self._now = 40
+        self.assertEqual(set(), self._get_servers())
+
+        # and back once the source is
+        self._source.fail = False
+        self._now = 42
+        self._get_servers()
+        self.assertEqual({'127.0.0.1', '127.0.0.2'}, self._get_servers())
+
+    def test_source_changed(self):
+
+        self._get_servers()
+        changed = mock.Mock()
+        self._servers.on_change = changed
+
+        # a source that knows when it changed
+        self._source.addresses = ['127.0.0.3']
+        self._source.on_change()
+
+        self.assertTrue(changed.called)
+        self.assertEqual({'127.0.0.3'}, self._get_servers())
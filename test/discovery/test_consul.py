@@ -1,12 +1,23 @@
+import json
+import threading
+import time
 import unittest
 import mock
 from past.builtins import str
 from requests import models
-from ballast.discovery.consul import ConsulRestRecordList
+from ballast import LoadBalancer
+from ballast.discovery.consul import ConsulRestRecordList, ConsulHealthRecordList
+from ballast.ping import DummyPing
 try:
     from urllib.parse import urlparse, parse_qs
 except ImportError:
     from urlparse import urlparse, parse_qs
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
 
 
 # past.builtins apparently not all that compatible...
@@ -35,6 +46,43 @@ _MOCK_RESPONSE = str_compat("""
 """, 'utf-8')
 
 
+_MOCK_HEALTH_RESPONSE = str_compat("""
+[
+  {
+    "Node": {"Node": "ins-alb", "Address": "127.1.1.1", "Meta": {}},
+    "Service": {
+      "Address": "",
+      "Port": 3000,
+      "Tags": ["staging"],
+      "Weights": {"Passing": 10, "Warning": 1},
+      "Meta": {}
+    },
+    "Checks": [{"Status": "passing"}]
+  },
+  {
+    "Node": {"Node": "ins-alc", "Address": "127.1.1.2", "Meta": {"priority": "3"}},
+    "Service": {
+      "Address": "10.0.0.2",
+      "Port": 3001,
+      "Tags": ["canary"],
+      "Weights": {"Passing": 10, "Warning": 1},
+      "Meta": {"weight": "5"}
+    },
+    "Checks": [{"Status": "passing"}]
+  },
+  {
+    "Node": {"Node": "ins-ald", "Address": "127.1.1.3"},
+    "Service": {
+      "Port": 3002,
+      "Tags": ["canary", "staging"],
+      "Weights": {"Passing": 10, "Warning": 2}
+    },
+    "Checks": [{"Status": "passing"}, {"Status": "warning"}]
+  }
+]
+""", 'utf-8')
+
+
 class _MockResponse(models.Response):
 
     def __init__(self, content):
@@ -98,3 +146,196 @@ class ConsulRestRecordListTest(unittest.TestCase):
         self.assertEqual(actual_url.hostname, 'my.consul.url')
         self.assertEqual(actual_url.path, '/v1/catalog/service/my-service')
         self.assertEqual(actual_url.query, '')
+
+
+class ConsulHealthRecordListTest(unittest.TestCase):
+
+    @mock.patch('ballast.discovery.consul.requests.get', return_value=_MockResponse(_MOCK_HEALTH_RESPONSE))
+    def test_resolve(self, mock_get_request):
+
+        servers = ConsulHealthRecordList(
+            'http://my.consul.url',
+            'my-service',
+            tag='staging',
+            tag_priorities={'canary': 2}
+        )
+
+        server_list = list(servers.get_servers())
+        self.assertEqual(
+            [
+                ('127.1.1.1', 3000, 10, 1),
+                ('10.0.0.2', 3001, 5, 3),
+                ('127.1.1.3', 3002, 2, 2)
+            ],
+            [(s.address, s.port, s.weight, s.priority) for s in server_list]
+        )
+
+        # only passing instances
+        actual_url = urlparse(mock_get_request.call_args[0][0])
+        actual_query = parse_qs(actual_url.query)
+
+        self.assertEqual(actual_url.path, '/v1/health/service/my-service')
+        self.assertEqual(['true'], actual_query['passing'])
+        self.assertEqual(['staging'], actual_query['tag'])
+
+    @mock.patch('ballast.discovery.consul.requests.get', return_value=_MockResponse(_MOCK_HEALTH_RESPONSE))
+    def test_resolve_all(self, mock_get_request):
+
+        servers = ConsulHealthRecordList('http://my.consul.url', 'my-service', passing=False)
+
+        self.assertEqual(3, len(list(servers.get_servers())))
+        self.assertEqual('', urlparse(mock_get_request.call_args[0][0]).query)
+
+    @mock.patch('ballast.discovery.consul.requests.get')
+    def test_invalid_meta(self, mock_get_request):
+
+        response = json.loads(_MOCK_HEALTH_RESPONSE)
+        response[1]['Service']['Meta'] = {'weight': 'heavy'}
+        response[1]['Node']['Meta'] = {'priority': 'high'}
+        mock_get_request.return_value = _MockResponse(str_compat(json.dumps(response), 'utf-8'))
+
+        servers = ConsulHealthRecordList('http://my.consul.url', 'my-service', tag_priorities={'canary': 2})
+
+        # the bad values fall back to the weights and tags,
+        # and the other instances are unaffected
+        self.assertEqual(
+            [
+                ('127.1.1.1', 3000, 10, 1),
+                ('10.0.0.2', 3001, 10, 2),
+                ('127.1.1.3', 3002, 2, 2)
+            ],
+            [(s.address, s.port, s.weight, s.priority) for s in servers.get_servers()]
+        )
+
+
+class _FakeConsul(ThreadingMixIn, HTTPServer):
+    """
+    Just enough of Consul's catalog API to serve blocking queries.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _FakeConsulHandler)
+        self.condition = threading.Condition()
+        self.index = 1
+        self.entries = []
+        self.requests = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % self.server_address[1]
+
+    def register(self, address, port):
+        with self.condition:
+            self.entries.append({'Address': address, 'ServicePort': port})
+            self.index += 1
+            self.condition.notify_all()
+
+
+class _FakeConsulHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        consul = self.server
+        query = parse_qs(urlparse(self.path).query)
+        index = int(query.get('index', ['0'])[0])
+        wait = float(query.get('wait', ['0s'])[0][:-1])
+
+        with consul.condition:
+            consul.requests.append(self.path)
+
+            # block until the index moves past the one asked for
+            deadline = time.time() + wait
+            while index >= consul.index and time.time() < deadline:
+                consul.condition.wait(deadline - time.time())
+
+            body = json.dumps(consul.entries).encode('utf-8')
+            current_index = consul.index
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '%s' % len(body))
+        self.send_header('X-Consul-Index', '%s' % current_index)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConsulWatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self._consul = _FakeConsul()
+        self._consul.register('127.1.1.1', 3000)
+
+        thread = threading.Thread(target=self._consul.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.addCleanup(self._consul.server_close)
+        self.addCleanup(self._consul.shutdown)
+
+    def _wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_watch(self):
+
+        servers = ConsulRestRecordList(self._consul.url, 'my-service', dc='my-dc', watch=True, wait=1)
+        self.addCleanup(servers.close)
+
+        changed = threading.Event()
+        servers.on_change = changed.set
+
+        server_list = servers.get_servers()
+        self.assertEqual(['127.1.1.1'], [s.address for s in server_list])
+        self.assertTrue(changed.wait(5))
+
+        # told about a change as soon as it happens
+        changed.clear()
+        self._consul.register('127.1.1.2', 3000)
+        self.assertTrue(changed.wait(5))
+        self.assertEqual({'127.1.1.1', '127.1.1.2'}, set(s.address for s in servers.get_servers()))
+
+        # blocking queries, with the last index seen
+        queries = [parse_qs(urlparse(r).query) for r in self._consul.requests]
+        self.assertEqual(['0', '2'], [q['index'][0] for q in queries[:2]])
+        self.assertEqual(['1s'], queries[1]['wait'])
+        self.assertEqual(['my-dc'], queries[1]['dc'])
+
+        # a wait that times out without a change isn't one
+        changed.clear()
+        self.assertFalse(changed.wait(1.5))
+
+    def test_load_balancer(self):
+
+        servers = ConsulRestRecordList(self._consul.url, 'my-service', watch=True, wait=1)
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False)
+        self.addCleanup(load_balancer.close)
+        load_balancer.ping()
+
+        self.assertEqual(['127.1.1.1'], [s.address for s in load_balancer.reachable_snapshot])
+
+        # pushed to the load balancer without waiting for a ping
+        self._consul.register('127.1.1.2', 3000)
+        self._wait_for(lambda: len(load_balancer.reachable_snapshot) == 2)
+
+    @mock.patch.object(ConsulRestRecordList, 'INITIAL_TIMEOUT', 0.2)
+    def test_unreachable(self):
+
+        # nothing listening
+        self._consul.shutdown()
+        self._consul.server_close()
+
+        servers = ConsulRestRecordList(self._consul.url, 'my-service', watch=True, wait=1)
+        self.addCleanup(servers.close)
+
+        # only the first call waits for consul
+        self.assertEqual([], servers.get_servers())
+
+        start_time = time.time()
+        self.assertEqual([], servers.get_servers())
+        self.assertLess(time.time() - start_time, 0.1)
@@ -1,3 +1,4 @@
+import socket
 import unittest
 import mock
 from dns import rdatatype, resolver, message, name, rrset
@@ -62,6 +63,9 @@ class DnsServiceRecordListTest(unittest.TestCase):
         dns_port = 1234
         servers = DnsServiceRecordList(qname, dns_host, dns_port)
 
+        # the DNS host isn't looked up until it's needed
+        self.assertFalse(mock_gethostbyname.called)
+
         # verify our resolver configuration
         resolver = servers._dns_resolver
         self.assertIsNotNone(resolver.cache)
@@ -106,6 +110,15 @@ class DnsServiceRecordListTest(unittest.TestCase):
         self.assertEqual(actual_qname, qname)
         self.assertEqual(rdtype, rdatatype.SRV)
 
+    @mock.patch('ballast.discovery.ns.resolver.Resolver', return_value=_MockSrvResolver())
+    @mock.patch('ballast.discovery.ns.socket.gethostbyname', side_effect=socket.gaierror())
+    def test_unknown_dns_host(self, mock_gethostbyname, mock_resolver):
+
+        servers = DnsServiceRecordList('my.local-service.', 'my.dns.host')
+
+        self.assertEqual([], list(servers.get_servers()))
+        self.assertIsNone(mock_resolver.return_value.executed_query)
+
 
 class DnsARecordListTest(unittest.TestCase):
 
@@ -118,6 +131,9 @@ class DnsARecordListTest(unittest.TestCase):
         dns_port = 1234
         servers = DnsARecordList(qname, dns_host, dns_port, 3000)
 
+        # the DNS host isn't looked up until it's needed
+        self.assertFalse(mock_gethostbyname.called)
+
         # verify our resolver configuration
         resolver = servers._dns_resolver
         self.assertIsNotNone(resolver.cache)
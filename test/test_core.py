@@ -0,0 +1,445 @@
+import threading
+import time
+import unittest
+import mock
+from ballast import LoadBalancer
+from ballast.core import LoadBalancerStats
+from ballast.discovery import Server, ServerStats
+from ballast.discovery.static import StaticServerList
+from ballast.ping import Ping, DummyPing, ThreadPoolPingStrategy
+from ballast.schedule import PingSchedule
+from ballast.breaker import CircuitBreaker
+
+
+class _CountingPing(Ping):
+
+    def __init__(self):
+        super(_CountingPing, self).__init__()
+        self.down = set()
+        self.counts = dict()
+
+    def is_alive(self, server):
+        self.counts[server.address] = self.counts.get(server.address, 0) + 1
+        return server.address not in self.down
+
+
+class _CountingServerList(StaticServerList):
+
+    def __init__(self, servers):
+        super(_CountingServerList, self).__init__(servers)
+        self.count = 0
+
+    def get_servers(self):
+        self.count += 1
+        return [Server(s.address, s.port, ttl=s.ttl) for s in super(_CountingServerList, self).get_servers()]
+
+
+class _MutableServerList(StaticServerList):
+
+    def get_servers(self):
+        # fresh objects every time, like a real discovery source
+        return [Server(s.address, s.port, s.weight, s.priority) for s in self._servers]
+
+
+class ServerStatsTest(unittest.TestCase):
+
+    def test_defaults(self):
+
+        stats = ServerStats()
+        self.assertEqual(0, stats.active_requests)
+        self.assertEqual(0, stats.total_requests)
+        self.assertEqual(0, stats.failure_count)
+        self.assertEqual(0, stats.average_response_time)
+        self.assertEqual(0, stats.utilization)
+        self.assertIsNone(stats.response_time_percentile(99))
+
+    def test_active_requests(self):
+
+        stats = ServerStats()
+        stats.increment_active_requests()
+        stats.increment_active_requests()
+        stats.decrement_active_requests()
+
+        self.assertEqual(1, stats.active_requests)
+        self.assertEqual(2, stats.total_requests)
+
+    def test_failures(self):
+
+        stats = ServerStats()
+        stats.increment_failures()
+        stats.increment_failures()
+
+        self.assertEqual(2, stats.failure_count)
+
+    def test_average_response_time(self):
+
+        stats = ServerStats(ewma_alpha=0.5)
+
+        # the first sample seeds the average
+        stats.add_response_time(1.0)
+        self.assertEqual(1.0, stats.average_response_time)
+
+        stats.add_response_time(3.0)
+        self.assertEqual(2.0, stats.average_response_time)
+
+        stats.add_response_time(2.0)
+        self.assertEqual(2.0, stats.average_response_time)
+
+    def test_response_time_window(self):
+
+        stats = ServerStats(window_size=10)
+        for i in range(100):
+            stats.add_response_time(i)
+
+        # only the most recent samples are kept
+        self.assertEqual(90, stats.response_time_percentile(0))
+        self.assertEqual(94, stats.response_time_percentile(50))
+        self.assertEqual(99, stats.response_time_percentile(100))
+        self.assertEqual([1, 5, 4], stats.response_time_histogram([90, 95]))
+
+    def test_concurrent_updates(self):
+
+        stats = ServerStats()
+
+        def make_requests():
+            for i in range(1000):
+                stats.increment_active_requests()
+                stats.add_response_time(0.01)
+                stats.decrement_active_requests()
+
+        threads = [threading.Thread(target=make_requests) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(0, stats.active_requests)
+        self.assertEqual(8000, stats.total_requests)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._now = 0
+        for target in ('ballast.discovery.timer', 'ballast.core.timer'):
+            patcher = mock.patch(target, side_effect=lambda: self._now)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self._stats = ServerStats(circuit_breaker=CircuitBreaker(failure_threshold=3, cool_down=10, half_open_requests=2))
+
+    def _fail(self, count=1):
+        for i in range(count):
+            self._stats.increment_active_requests()
+            self._stats.decrement_active_requests()
+            self._stats.increment_failures()
+
+    def test_never_tripped_without_breaker(self):
+        stats = ServerStats()
+        for i in range(100):
+            stats.increment_failures()
+
+        self.assertFalse(stats.is_tripped(0))
+        self.assertEqual(CircuitBreaker.CLOSED, stats.circuit_state)
+
+    def test_opens_after_consecutive_failures(self):
+
+        self._fail(2)
+        self._stats.record_success()
+        self._fail(2)
+        self.assertFalse(self._stats.is_tripped(self._now))
+        self.assertEqual(CircuitBreaker.CLOSED, self._stats.circuit_state)
+
+        self._fail()
+        self.assertTrue(self._stats.is_tripped(self._now))
+        self.assertEqual(CircuitBreaker.OPEN, self._stats.circuit_state)
+
+        # until the cool-down has passed
+        self.assertTrue(self._stats.is_tripped(9))
+        self.assertFalse(self._stats.is_tripped(10))
+
+    def test_half_open_probes(self):
+
+        self._fail(3)
+        self._now = 10
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self._stats.circuit_state)
+
+        # only a limited number of probes are let through
+        self._stats.increment_active_requests()
+        self.assertFalse(self._stats.is_tripped(self._now))
+        self._stats.increment_active_requests()
+        self.assertTrue(self._stats.is_tripped(self._now))
+
+        # a successful probe closes the circuit
+        self._stats.record_success()
+        self.assertFalse(self._stats.is_tripped(self._now))
+        self.assertEqual(CircuitBreaker.CLOSED, self._stats.circuit_state)
+
+    def test_failed_probe(self):
+
+        self._fail(3)
+        self._now = 10
+
+        # a failed probe re-opens the circuit
+        self._fail()
+        self.assertEqual(CircuitBreaker.OPEN, self._stats.circuit_state)
+        self.assertTrue(self._stats.is_tripped(19))
+        self.assertFalse(self._stats.is_tripped(20))
+
+    def test_lost_probes(self):
+
+        self._fail(3)
+        self._now = 10
+        self._stats.increment_active_requests()
+        self._stats.increment_active_requests()
+
+        # probes that never come back are given up on
+        self.assertTrue(self._stats.is_tripped(19))
+        self.assertFalse(self._stats.is_tripped(20))
+
+    def test_load_balancer(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(
+            servers,
+            ping=DummyPing(),
+            ping_on_start=False,
+            circuit_breaker=CircuitBreaker(failure_threshold=2, cool_down=10)
+        )
+        load_balancer.ping()
+
+        server = load_balancer.reachable_snapshot[0]
+        stats = load_balancer.stats.get_server_stats(server)
+        stats.increment_failures()
+        stats.increment_failures()
+
+        # tripped servers are left out of the snapshot
+        self.assertEqual(1, len(load_balancer.reachable_snapshot))
+        self.assertNotIn(server, load_balancer.reachable_servers)
+        self.assertNotEqual(server, load_balancer.choose_server())
+
+        # and back once half-open
+        self._now = 10
+        load_balancer._publish_snapshot()
+        self.assertIn(server, load_balancer.reachable_servers)
+
+
+class LoadBalancerStatsTest(unittest.TestCase):
+
+    def test_get_server_stats(self):
+
+        lb_stats = LoadBalancerStats()
+        server = Server('127.0.0.1', 80)
+
+        stats = lb_stats.get_server_stats(server)
+        self.assertIsInstance(stats, ServerStats)
+
+        # same stats for an equivalent server
+        self.assertIs(stats, lb_stats.get_server_stats(server))
+        self.assertIs(stats, lb_stats.get_server_stats(Server('127.0.0.1', 80)))
+        self.assertIsNot(stats, lb_stats.get_server_stats(Server('127.0.0.2', 80)))
+
+    def test_utilization(self):
+
+        lb_stats = LoadBalancerStats()
+        stats1 = lb_stats.get_server_stats(Server('127.0.0.1', 80))
+        stats2 = lb_stats.get_server_stats(Server('127.0.0.2', 80))
+
+        stats1.increment_active_requests()
+        stats1.increment_active_requests()
+        stats1.increment_active_requests()
+        stats2.increment_active_requests()
+
+        self.assertEqual(4, lb_stats.active_requests)
+        self.assertEqual(75, stats1.utilization)
+        self.assertEqual(25, stats2.utilization)
+
+    def test_retain(self):
+
+        lb_stats = LoadBalancerStats()
+        server1 = Server('127.0.0.1', 80)
+        server2 = Server('127.0.0.2', 80)
+
+        stats1 = lb_stats.get_server_stats(server1)
+        stats2 = lb_stats.get_server_stats(server2)
+
+        lb_stats.retain({server1})
+
+        self.assertIs(stats1, lb_stats.get_server_stats(server1))
+        self.assertIsNot(stats2, lb_stats.get_server_stats(server2))
+
+    def test_load_balancer_stats(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        # queryable from rules via the load balancer
+        for server in load_balancer.servers:
+            stats = load_balancer.stats.get_server_stats(server)
+            self.assertEqual(0, stats.active_requests)
+
+
+class LoadBalancerTest(unittest.TestCase):
+
+    def test_reachable_snapshot(self):
+
+        servers = StaticServerList(['127.0.0.3', '127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False)
+        self.assertEqual(tuple(), load_balancer.reachable_snapshot)
+
+        load_balancer.ping()
+        snapshot = load_balancer.reachable_snapshot
+
+        # sorted and immutable
+        self.assertIsInstance(snapshot, tuple)
+        self.assertEqual(['127.0.0.1', '127.0.0.2', '127.0.0.3'], [s.address for s in snapshot])
+
+        # a new snapshot is published when health changes,
+        # readers holding the old one are unaffected
+        load_balancer.mark_server_down(snapshot[0])
+        self.assertEqual(3, len(snapshot))
+        self.assertEqual(['127.0.0.2', '127.0.0.3'], [s.address for s in load_balancer.reachable_snapshot])
+        self.assertEqual(set(load_balancer.reachable_snapshot), load_balancer.reachable_servers)
+
+        load_balancer.ping(snapshot[0])
+        self.assertEqual(snapshot, load_balancer.reachable_snapshot)
+
+    def test_incremental_server_list(self):
+
+        servers = _MutableServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False)
+        load_balancer._rule = mock.Mock(wraps=load_balancer._rule)
+        listener = mock.Mock()
+        load_balancer.add_membership_listener(listener)
+
+        load_balancer.ping()
+        server1, server2 = sorted(load_balancer.servers, key=lambda s: s.address)
+        snapshot = load_balancer.reachable_snapshot
+        listener.assert_called_once_with(mock.ANY, [], [])
+        self.assertEqual({server1, server2}, set(listener.call_args[0][0]))
+
+        # nothing changed, same objects and the same snapshot
+        listener.reset_mock()
+        load_balancer.ping()
+        self.assertFalse(listener.called)
+        self.assertIs(snapshot, load_balancer.reachable_snapshot)
+        self.assertTrue(all(a is b for a, b in zip((server1, server2), snapshot)))
+
+        # only the delta is passed on
+        servers._servers.discard(Server('127.0.0.2', 80))
+        servers.add_server('127.0.0.3')
+        load_balancer.stats.get_server_stats(server1).increment_failures()
+        load_balancer.ping()
+
+        added, removed, changed = listener.call_args[0]
+        self.assertEqual(['127.0.0.3'], [s.address for s in added])
+        self.assertEqual([server2], removed)
+        self.assertEqual([], changed)
+        load_balancer._rule.servers_changed.assert_called_with(added, removed, changed)
+
+        # existing servers keep their state
+        self.assertTrue(any(s is server1 for s in load_balancer.servers))
+        self.assertEqual(1, load_balancer.stats.get_server_stats(server1).failure_count)
+
+        # re-weighting updates the existing server in place
+        servers._servers.discard(Server('127.0.0.1', 80))
+        servers.add_server('127.0.0.1', weight=5)
+        load_balancer.ping()
+
+        self.assertEqual(([], [], [server1]), listener.call_args[0])
+        self.assertEqual(5, server1.weight)
+        self.assertIsNot(snapshot, load_balancer.reachable_snapshot)
+
+        load_balancer.remove_membership_listener(listener)
+        listener.reset_mock()
+        servers.add_server('127.0.0.4')
+        load_balancer.ping()
+        self.assertFalse(listener.called)
+
+    def test_close(self):
+
+        strategy = ThreadPoolPingStrategy()
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(servers, ping_strategy=strategy, ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        self.assertIsNotNone(strategy._pool)
+
+        load_balancer.close()
+
+        self.assertIsNone(strategy._pool)
+        self.assertFalse(load_balancer._ping_timer_running)
+
+
+class LoadBalancerScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self._ping = _CountingPing()
+        self._servers = _CountingServerList([
+            Server('127.0.0.1', 80, ttl=0.5),
+            Server('127.0.0.2', 80, ttl=0.5)
+        ])
+        self._load_balancer = LoadBalancer(
+            self._servers,
+            ping=self._ping,
+            ping_on_start=False,
+            ping_schedule=PingSchedule(
+                healthy_interval=10,
+                failure_interval=0.05,
+                max_failure_interval=0.05,
+                recovery_interval=0.05,
+                min_resolve_interval=0.1
+            )
+        )
+
+    def tearDown(self):
+        self._load_balancer.close()
+
+    def test_scheduled_pings(self):
+
+        self._ping.down.add('127.0.0.2')
+        self._load_balancer._start_ping_timer()
+        time.sleep(0.5)
+
+        # the healthy server was pinged once, the
+        # failed one is re-pinged at its own cadence
+        self.assertEqual(['127.0.0.1'], [s.address for s in self._load_balancer.reachable_snapshot])
+        self.assertEqual(1, self._ping.counts['127.0.0.1'])
+        self.assertGreater(self._ping.counts['127.0.0.2'], 3)
+
+        # and comes back once it's up
+        self._ping.down.clear()
+        time.sleep(0.2)
+        self.assertEqual(2, len(self._load_balancer.reachable_snapshot))
+
+    def test_resolve_by_ttl(self):
+
+        self._load_balancer._start_ping_timer()
+        time.sleep(0.3)
+
+        servers = self._load_balancer.servers
+        self.assertEqual(1, self._servers.count)
+        self.assertEqual(2, len(self._load_balancer.reachable_snapshot))
+
+        time.sleep(0.5)
+
+        # re-resolved, but the same (pinged) servers are kept
+        self.assertGreater(self._servers.count, 1)
+        self.assertEqual(1, self._ping.counts['127.0.0.1'])
+        for server in self._load_balancer.servers:
+            self.assertTrue(any(server is s for s in servers))
+
+    def test_mark_server_down(self):
+
+        self._load_balancer._start_ping_timer()
+        time.sleep(0.2)
+
+        server = self._load_balancer.reachable_snapshot[0]
+        self._load_balancer.mark_server_down(server)
+        self.assertEqual(1, len(self._load_balancer.reachable_snapshot))
+
+        # re-pinged soon rather than in 10 seconds
+        time.sleep(0.3)
+        self.assertEqual(2, len(self._load_balancer.reachable_snapshot))
+        self.assertGreater(self._ping.counts[server.address], 1)
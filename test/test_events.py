@@ -0,0 +1,119 @@
+import threading
+import unittest
+from ballast import LoadBalancer
+from ballast.discovery import Server
+from ballast.discovery.static import StaticServerList
+from ballast.events import Event, EventBus
+from ballast.ping import DummyPing
+
+
+class EventBusTest(unittest.TestCase):
+
+    def setUp(self):
+        self._bus = EventBus()
+        self.addCleanup(self._bus.close)
+
+    def test_subscribe(self):
+
+        added = []
+        everything = []
+        self._bus.subscribe(Event.SERVER_ADDED, added.append)
+        self._bus.subscribe(None, everything.append)
+
+        server = Server('127.0.0.1', 80)
+        self._bus.publish(Event(Event.SERVER_ADDED, server))
+        self._bus.publish(Event(Event.SERVER_DOWN, server))
+        self._bus.flush()
+
+        self.assertEqual([Event.SERVER_ADDED], [e.type for e in added])
+        self.assertEqual([Event.SERVER_ADDED, Event.SERVER_DOWN], [e.type for e in everything])
+        self.assertIs(server, added[0].server)
+
+    def test_unsubscribe(self):
+
+        events = []
+        self._bus.subscribe(Event.SERVER_UP, events.append)
+        self._bus.unsubscribe(Event.SERVER_UP, events.append)
+
+        self._bus.publish(Event(Event.SERVER_UP))
+        self._bus.flush()
+
+        self.assertEqual([], events)
+
+    def test_dispatched_off_thread(self):
+
+        threads = []
+        self._bus.subscribe(Event.SERVER_UP, lambda e: threads.append(threading.current_thread()))
+
+        self._bus.publish(Event(Event.SERVER_UP))
+        self._bus.flush()
+
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads[0])
+
+    def test_failing_subscriber(self):
+
+        def fail(event):
+            raise ValueError()
+
+        events = []
+        self._bus.subscribe(Event.SERVER_UP, fail)
+        self._bus.subscribe(Event.SERVER_UP, events.append)
+
+        self._bus.publish(Event(Event.SERVER_UP))
+        self._bus.publish(Event(Event.SERVER_UP))
+        self._bus.flush()
+
+        # the other subscribers still get every event
+        self.assertEqual(2, len(events))
+
+
+class LoadBalancerEventsTest(unittest.TestCase):
+
+    def test_events(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False)
+        self.addCleanup(load_balancer.close)
+
+        events = []
+        load_balancer.events.subscribe(None, events.append)
+
+        load_balancer.ping()
+        load_balancer.events.flush()
+
+        types = [e.type for e in events]
+        self.assertEqual(2, types.count(Event.SERVER_ADDED))
+        self.assertEqual(2, types.count(Event.SERVER_UP))
+        self.assertEqual(1, types.count(Event.SNAPSHOT_PUBLISHED))
+        self.assertEqual(load_balancer.reachable_snapshot, events[types.index(Event.SNAPSHOT_PUBLISHED)].snapshot)
+
+        # nothing changed, nothing published
+        del events[:]
+        load_balancer.ping()
+        load_balancer.events.flush()
+        self.assertEqual([], events)
+
+        server = load_balancer.reachable_snapshot[0]
+        load_balancer.mark_server_down(server)
+        load_balancer.events.flush()
+
+        self.assertEqual([Event.SERVER_DOWN, Event.SNAPSHOT_PUBLISHED], [e.type for e in events])
+        self.assertIs(server, events[0].server)
+        self.assertNotIn(server, events[1].snapshot)
+
+        # and back up on the next ping
+        del events[:]
+        load_balancer.ping()
+        load_balancer.events.flush()
+
+        self.assertEqual([Event.SERVER_UP, Event.SNAPSHOT_PUBLISHED], [e.type for e in events])
+        self.assertIs(server, events[0].server)
+
+        # removed servers aren't reported down
+        del events[:]
+        servers._servers.discard(server)
+        load_balancer.ping()
+        load_balancer.events.flush()
+
+        self.assertEqual([Event.SNAPSHOT_PUBLISHED, Event.SERVER_REMOVED], [e.type for e in events])
@@ -0,0 +1,68 @@
+import unittest
+import mock
+from ballast.hedge import Hedge
+
+
+class HedgeTest(unittest.TestCase):
+
+    def test_fixed_delay(self):
+
+        hedge = Hedge(delay=0.05)
+        self.assertEqual(0.05, hedge.delay_time())
+
+    def test_requires_delay_or_percentile(self):
+        self.assertRaises(AssertionError, Hedge)
+        self.assertRaises(AssertionError, Hedge, delay=0.05, percentile=95)
+
+    def test_hedged_methods(self):
+
+        hedge = Hedge(delay=0.05)
+
+        # only idempotent methods by default
+        self.assertTrue(hedge.is_hedged('GET'))
+        self.assertTrue(hedge.is_hedged('head'))
+        self.assertFalse(hedge.is_hedged('POST'))
+        self.assertFalse(hedge.is_hedged('DELETE'))
+
+    def test_percentile_delay(self):
+
+        hedge = Hedge(percentile=90, min_samples=10)
+
+        # not enough samples, don't hedge
+        self.assertIsNone(hedge.delay_time())
+
+        for i in range(1, 101):
+            hedge.add_response_time(i / 1000.0)
+
+        # cached until the next refresh
+        self.assertIsNone(hedge.delay_time())
+
+        hedge._next_refresh = 0
+        self.assertAlmostEqual(0.09, hedge.delay_time())
+
+    @mock.patch('ballast.hedge.timer', return_value=0)
+    def test_percentile_delay_bounds(self, mock_timer):
+
+        hedge = Hedge(percentile=50, min_samples=1, min_delay=0.02, max_delay=0.04)
+
+        # max delay used until there are enough samples
+        self.assertEqual(0.04, hedge.delay_time())
+
+        hedge.add_response_time(0.001)
+        mock_timer.return_value = 10
+        self.assertEqual(0.02, hedge.delay_time())
+
+        for i in range(10):
+            hedge.add_response_time(1)
+        mock_timer.return_value = 20
+        self.assertEqual(0.04, hedge.delay_time())
+
+    def test_counters(self):
+
+        hedge = Hedge(delay=0.05)
+        hedge.increment_hedges_sent()
+        hedge.increment_hedges_sent()
+        hedge.increment_hedges_won()
+
+        self.assertEqual(2, hedge.hedges_sent)
+        self.assertEqual(1, hedge.hedges_won)
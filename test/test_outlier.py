@@ -0,0 +1,178 @@
+import time
+import unittest
+import mock
+from ballast import LoadBalancer
+from ballast.discovery.static import StaticServerList
+from ballast.outlier import OutlierDetector
+from ballast.ping import DummyPing
+
+
+class OutlierDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self._now = 0
+        patcher = mock.patch('ballast.outlier.timer', side_effect=lambda: self._now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_load_balancer(self, server_count, **kwargs):
+        servers = StaticServerList(['127.0.0.%s' % (i + 1) for i in range(server_count)])
+        load_balancer = LoadBalancer(
+            servers,
+            ping=DummyPing(),
+            ping_on_start=False,
+            outlier_detector=OutlierDetector(**kwargs)
+        )
+        load_balancer.ping()
+
+        return load_balancer
+
+    def _server(self, load_balancer, address):
+        return [s for s in load_balancer.servers if s.address == address][0]
+
+    def test_consecutive_failures(self):
+
+        load_balancer = self._create_load_balancer(4, consecutive_failures=3)
+        detector = load_balancer.outlier_detector
+        server = self._server(load_balancer, '127.0.0.1')
+
+        # a success resets the count
+        load_balancer.record_result(server, False)
+        load_balancer.record_result(server, False)
+        load_balancer.record_result(server, True)
+        load_balancer.record_result(server, False)
+        load_balancer.record_result(server, False)
+        self.assertFalse(detector.is_ejected(server))
+
+        load_balancer.record_result(server, False)
+        self.assertTrue(detector.is_ejected(server))
+
+        # ejected, but not marked down
+        self.assertTrue(server.is_alive)
+        self.assertNotIn(server, load_balancer.reachable_servers)
+        self.assertEqual(3, len(load_balancer.reachable_snapshot))
+
+    def test_ejection_time(self):
+
+        load_balancer = self._create_load_balancer(
+            4,
+            consecutive_failures=1,
+            base_ejection_time=10,
+            max_ejection_time=25,
+            interval=1000
+        )
+        detector = load_balancer.outlier_detector
+        server = self._server(load_balancer, '127.0.0.1')
+
+        # each ejection lasts twice as long, up to the max
+        for ejection_time in (10, 20, 25):
+            start_time = self._now
+            load_balancer.record_result(server, False)
+            self.assertTrue(detector.is_ejected(server))
+
+            self._now = start_time + ejection_time - 1
+            self.assertTrue(detector.is_ejected(server))
+
+            self._now = start_time + ejection_time
+            self.assertFalse(detector.is_ejected(server))
+
+        self.assertEqual(3, detector.ejection_count(server))
+
+        # and back in the pool
+        load_balancer._publish_snapshot()
+        self.assertIn(server, load_balancer.reachable_servers)
+
+    def test_max_ejection_percent(self):
+
+        load_balancer = self._create_load_balancer(4, consecutive_failures=1, max_ejection_percent=50)
+        detector = load_balancer.outlier_detector
+
+        for server in load_balancer.servers:
+            load_balancer.record_result(server, False)
+
+        self.assertEqual(2, len(detector.ejected_servers))
+        self.assertEqual(2, len(load_balancer.reachable_snapshot))
+
+    def test_success_rate_outlier(self):
+
+        load_balancer = self._create_load_balancer(6, consecutive_failures=None, interval=10, min_requests=10)
+        detector = load_balancer.outlier_detector
+        outlier = self._server(load_balancer, '127.0.0.1')
+
+        for i in range(20):
+            for server in load_balancer.servers:
+                # fails every other request
+                is_success = server != outlier or i % 2 == 0
+                load_balancer.record_result(server, is_success, 0.01)
+
+        # not evaluated until the interval has passed
+        self.assertEqual(set(), detector.ejected_servers)
+
+        self._now = 10
+        load_balancer.record_result(outlier, True, 0.01)
+
+        self.assertEqual({outlier}, detector.ejected_servers)
+
+    def test_latency_outlier(self):
+
+        load_balancer = self._create_load_balancer(6, consecutive_failures=None, interval=10, min_requests=10)
+        detector = load_balancer.outlier_detector
+        outlier = self._server(load_balancer, '127.0.0.1')
+
+        for i in range(20):
+            for server in load_balancer.servers:
+                load_balancer.record_result(server, True, 1.0 if server == outlier else 0.01)
+
+        self._now = 10
+        load_balancer.record_result(outlier, True, 1.0)
+
+        self.assertEqual({outlier}, detector.ejected_servers)
+
+    def test_too_few_servers(self):
+
+        load_balancer = self._create_load_balancer(6, consecutive_failures=None, interval=10, min_requests=10)
+        detector = load_balancer.outlier_detector
+        outlier = self._server(load_balancer, '127.0.0.1')
+
+        # only 2 servers have enough requests
+        for i in range(20):
+            load_balancer.record_result(outlier, False, 1.0)
+            load_balancer.record_result(self._server(load_balancer, '127.0.0.2'), True, 0.01)
+
+        self._now = 10
+        load_balancer.record_result(outlier, True, 1.0)
+
+        self.assertEqual(set(), detector.ejected_servers)
+
+    def test_without_detector(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        # a failure marks the server down
+        server = self._server(load_balancer, '127.0.0.1')
+        load_balancer.record_result(server, False)
+        self.assertFalse(server.is_alive)
+
+
+class OutlierEjectionTimerTest(unittest.TestCase):
+
+    def test_returns_to_pool(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(
+            servers,
+            ping=DummyPing(),
+            ping_on_start=False,
+            outlier_detector=OutlierDetector(consecutive_failures=1, base_ejection_time=0.1)
+        )
+        load_balancer.ping()
+
+        server = load_balancer.reachable_snapshot[0]
+        load_balancer.record_result(server, False)
+        self.assertNotIn(server, load_balancer.reachable_servers)
+
+        # without waiting for a ping
+        time.sleep(0.3)
+        self.assertIn(server, load_balancer.reachable_servers)
@@ -12,7 +12,8 @@ from ballast.ping import (
     SerialPingStrategy,
     ThreadPoolPingStrategy,
     MultiprocessingPoolPingStrategy,
-    GeventPingStrategy
+    GeventPingStrategy,
+    SelectorPingStrategy
 )
 
 
@@ -141,6 +142,68 @@ class ThreadPoolPingStrategyTest(unittest.TestCase):
         for server in results:
             self.assertTrue(server.is_alive)
 
+    def test_pool_reused(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+        ping = _MockPing()
+        strategy = ThreadPoolPingStrategy(max_workers=2)
+
+        strategy.ping(ping, servers)
+        pool = strategy._pool
+
+        # one bounded pool for every ping round
+        self.assertEqual(2, pool._processes)
+        for i in range(5):
+            self.assertEqual(3, len(strategy.ping(ping, servers)))
+            self.assertIs(pool, strategy._pool)
+
+        strategy.close()
+        self.assertIsNone(strategy._pool)
+
+        # a closed strategy can still be used
+        self.assertEqual(3, len(strategy.ping(ping, servers)))
+        self.assertIsNot(pool, strategy._pool)
+        strategy.close()
+
+    def test_pool_sized_for_servers(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        ping = _MockPing()
+        strategy = ThreadPoolPingStrategy(max_workers=8)
+        self.addCleanup(strategy.close)
+
+        # no more workers than servers
+        strategy.ping(ping, servers)
+        pool = strategy._pool
+        self.assertEqual(2, pool._processes)
+
+        # kept while the fleet shrinks
+        strategy.ping(ping, StaticServerList(['127.0.0.1']))
+        self.assertIs(pool, strategy._pool)
+
+        # grown when it gets bigger, up to max_workers
+        for i in range(3, 21):
+            servers.add_server('127.0.0.%s' % i)
+        self.assertEqual(20, len(strategy.ping(ping, servers)))
+        self.assertEqual(8, strategy._pool._processes)
+
+    def test_bounded_workers(self):
+
+        servers = StaticServerList([])
+        for i in range(4):
+            servers.add_server('127.0.0.%s' % i)
+
+        ping = _MockPing(delay=0.2)
+        strategy = ThreadPoolPingStrategy(max_workers=2)
+
+        start_time = time.time()
+        results = strategy.ping(ping, servers)
+        strategy.close()
+
+        # 4 pings, 2 at a time
+        self.assertEqual(4, len(results))
+        self.assertGreaterEqual(time.time() - start_time, 0.4)
+
 
 class MultiprocessingPoolPingStrategyTest(unittest.TestCase):
 
@@ -154,6 +217,7 @@ class MultiprocessingPoolPingStrategyTest(unittest.TestCase):
         strategy = MultiprocessingPoolPingStrategy()
 
         results = strategy.ping(ping, servers)
+        strategy.close()
 
         # verify the results
         self.assertEqual(10, len(results))
@@ -180,3 +244,89 @@ class GeventPingStrategyTest(unittest.TestCase):
 
         for server in results:
             self.assertTrue(server.is_alive)
+
+
+class SelectorPingStrategyTest(unittest.TestCase):
+
+    def setUp(self):
+
+        # a few servers that are listening,
+        # and a port that nothing listens on
+        self._listeners = []
+        for i in range(3):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.bind(('127.0.0.1', 0))
+            s.listen(16)
+            self._listeners.append(s)
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(('127.0.0.1', 0))
+        self._closed_port = s.getsockname()[1]
+        s.close()
+
+    def tearDown(self):
+        for s in self._listeners:
+            s.close()
+
+    def _servers(self):
+        servers = StaticServerList([])
+        for s in self._listeners:
+            servers.add_server('127.0.0.1', s.getsockname()[1])
+        servers.add_server('127.0.0.1', self._closed_port)
+        return servers
+
+    def test_selector_ping(self):
+
+        ping = SocketPing()
+        ping.max_ping_time = 1
+        strategy = SelectorPingStrategy()
+
+        results = strategy.ping(ping, self._servers())
+
+        self.assertEqual(4, len(results))
+        for server in results:
+            if server.port == self._closed_port:
+                self.assertFalse(server.is_alive)
+                self.assertIsNone(server.ping_time)
+            else:
+                self.assertTrue(server.is_alive)
+                self.assertTrue(0 <= server.ping_time < 1)
+
+    def test_max_sockets(self):
+
+        ping = SocketPing()
+        ping.max_ping_time = 1
+        strategy = SelectorPingStrategy(max_sockets=1)
+
+        results = strategy.ping(ping, self._servers())
+
+        self.assertEqual(3, len([s for s in results if s.is_alive]))
+
+    @mock.patch('ballast.ping.timer')
+    def test_timeout(self, mock_timer):
+
+        # time flies, nothing can connect in time
+        mock_timer.side_effect = [i * 10 for i in range(1000)]
+
+        ping = SocketPing()
+        ping.max_ping_time = 1
+        strategy = SelectorPingStrategy()
+
+        with mock.patch('ballast.ping.selectors.DefaultSelector.select', return_value=[]):
+            results = strategy.ping(ping, self._servers())
+
+        self.assertEqual(4, len(results))
+        for server in results:
+            self.assertFalse(server.is_alive)
+
+    def test_other_pings(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        strategy = SelectorPingStrategy()
+
+        # other pings can't be multiplexed, but still work
+        results = strategy.ping(DummyPing(), servers)
+
+        self.assertEqual(2, len(results))
+        for server in results:
+            self.assertTrue(server.is_alive)
@@ -0,0 +1,135 @@
+import socket
+import unittest
+import mock
+from ballast.discovery import Server
+from ballast.pool import SessionPool
+
+
+class SessionPoolTest(unittest.TestCase):
+
+    def test_session_reused_per_server(self):
+
+        pool = SessionPool()
+        server1 = Server('127.0.0.1', 80)
+        server2 = Server('127.0.0.2', 80)
+
+        # the same server should always get the same
+        # session (and therefore the same connections)
+        session1 = pool.session(server1)
+        self.assertIs(session1, pool.session(server1))
+        self.assertIs(session1, pool.session(Server('127.0.0.1', 80)))
+
+        # a different server gets its own session
+        self.assertIsNot(session1, pool.session(server2))
+        self.assertEqual(2, len(pool))
+
+    def test_pool_size(self):
+
+        pool = SessionPool(pool_size=25)
+        session = pool.session(Server('127.0.0.1', 80))
+
+        adapter = session.get_adapter('http://127.0.0.1')
+        self.assertEqual(25, adapter._pool_maxsize)
+        self.assertIs(adapter, session.get_adapter('https://127.0.0.1'))
+
+    def test_evict_removed_servers(self):
+
+        pool = SessionPool()
+        server1 = Server('127.0.0.1', 80)
+        server2 = Server('127.0.0.2', 80)
+
+        session1 = pool.session(server1)
+        session2 = pool.session(server2)
+
+        with mock.patch.object(session1, 'close') as close1, mock.patch.object(session2, 'close') as close2:
+
+            # server 2 has left the load balancer
+            pool.evict({server1})
+
+            self.assertFalse(close1.called)
+            self.assertTrue(close2.called)
+
+        self.assertIn(server1, pool)
+        self.assertNotIn(server2, pool)
+
+    def test_discard(self):
+
+        pool = SessionPool()
+        server1 = Server('127.0.0.1', 80)
+        server2 = Server('127.0.0.2', 80)
+
+        pool.session(server1)
+        session2 = pool.session(server2)
+
+        with mock.patch.object(session2, 'close') as close2:
+            pool.discard([server2, Server('127.0.0.3', 80)])
+            self.assertTrue(close2.called)
+
+        self.assertIn(server1, pool)
+        self.assertNotIn(server2, pool)
+
+    def test_evict_idle_servers(self):
+
+        pool = SessionPool(idle_timeout=30)
+        server = Server('127.0.0.1', 80)
+
+        session = pool.session(server)
+
+        with mock.patch.object(session, 'close') as close:
+
+            # not idle yet
+            pool.evict({server})
+            self.assertFalse(close.called)
+
+            # pretend the session was last used a while ago
+            pool._sessions[server].last_used -= 60
+            pool.evict({server})
+            self.assertTrue(close.called)
+
+        self.assertNotIn(server, pool)
+
+    def test_warm_up(self):
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(10)
+        self.addCleanup(listener.close)
+
+        port = listener.getsockname()[1]
+        url = 'http://127.0.0.1:%s/' % port
+        server = Server('127.0.0.1', port)
+
+        pool = SessionPool(pool_size=5)
+        self.assertEqual(3, pool.warm_up(server, url, 3, timeout=1))
+
+        # idle in the pool used for the server's requests
+        connections = pool._connection_pool(pool.session(server), url)
+        self.assertEqual(3, len([c for c in connections.pool.queue if c is not None and c.sock is not None]))
+
+        # topped up, and never more than the pool size
+        self.assertEqual(2, pool.warm_up(server, url, 10, timeout=1))
+
+        pool.close()
+
+    def test_warm_up_failure(self):
+
+        # nothing listening
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+        s.close()
+
+        pool = SessionPool()
+        self.assertEqual(0, pool.warm_up(Server('127.0.0.1', port), 'http://127.0.0.1:%s/' % port, 2, timeout=1))
+        pool.close()
+
+    def test_close(self):
+
+        pool = SessionPool()
+        session = pool.session(Server('127.0.0.1', 80))
+
+        with mock.patch.object(session, 'close') as close:
+            pool.close()
+            self.assertTrue(close.called)
+
+        self.assertEqual(0, len(pool))
@@ -0,0 +1,128 @@
+import unittest
+import mock
+from ballast import LoadBalancer
+from ballast.discovery.static import StaticServerList
+from ballast.ping import DummyPing
+from ballast.retry import Retry, RetryBudget
+
+
+class RetryBudgetTest(unittest.TestCase):
+
+    def test_min_retries(self):
+
+        budget = RetryBudget(ratio=0, min_retries_per_second=5)
+
+        # starts out with a second's worth of retries
+        for i in range(5):
+            self.assertTrue(budget.try_withdraw())
+
+        self.assertFalse(budget.try_withdraw())
+
+    @mock.patch('ballast.retry.timer', return_value=0)
+    def test_retry_ratio(self, mock_timer):
+
+        budget = RetryBudget(ratio=0.25, min_retries_per_second=0)
+        self.assertFalse(budget.try_withdraw())
+
+        # 4 requests buys 1 retry
+        for i in range(4):
+            budget.deposit()
+
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+    @mock.patch('ballast.retry.timer', return_value=0)
+    def test_refill_over_time(self, mock_timer):
+
+        budget = RetryBudget(ratio=0, min_retries_per_second=2, max_tokens=4)
+
+        self.assertTrue(budget.try_withdraw())
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+        # half a second later, we've earned another retry
+        mock_timer.return_value = 0.5
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+        # never more than the max
+        mock_timer.return_value = 100
+        self.assertEqual(4, budget.tokens)
+
+    def test_max_tokens(self):
+
+        budget = RetryBudget(ratio=1, min_retries_per_second=0, max_tokens=3)
+        for i in range(10):
+            budget.deposit()
+
+        self.assertEqual(3, budget.tokens)
+
+
+class RetryTest(unittest.TestCase):
+
+    def test_max_attempts(self):
+
+        state = Retry(max_attempts=2).begin()
+        state.attempts = 1
+        self.assertTrue(state.can_retry())
+
+        state.attempts = 2
+        self.assertFalse(state.can_retry())
+
+    def test_budget_exhausted(self):
+
+        budget = RetryBudget(ratio=0, min_retries_per_second=0)
+        state = Retry(max_attempts=10, budget=budget).begin()
+        state.attempts = 1
+
+        self.assertFalse(state.can_retry())
+
+    def test_no_backoff(self):
+
+        state = Retry().begin()
+        state.attempts = 3
+
+        self.assertEqual(0, state.backoff_time())
+
+    def test_exponential_backoff(self):
+
+        state = Retry(backoff=0.1, max_backoff=1).begin()
+
+        with mock.patch('ballast.retry.random.uniform', side_effect=lambda a, b: b):
+            state.attempts = 1
+            self.assertAlmostEqual(0.1, state.backoff_time())
+
+            state.attempts = 2
+            self.assertAlmostEqual(0.2, state.backoff_time())
+
+            state.attempts = 3
+            self.assertAlmostEqual(0.4, state.backoff_time())
+
+            # capped at the max
+            state.attempts = 10
+            self.assertAlmostEqual(1, state.backoff_time())
+
+        # jitter should never exceed the ceiling
+        state.attempts = 2
+        for i in range(100):
+            backoff_time = state.backoff_time()
+            self.assertTrue(0 <= backoff_time <= 0.2)
+
+    def test_skip_tried_servers(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        state = Retry().begin()
+
+        # the rule keeps handing back the same server
+        first = state.choose_server(load_balancer)
+        chosen = [first, first, load_balancer.choose_server()]
+
+        with mock.patch.object(load_balancer, 'choose_server', side_effect=chosen):
+            second = state.choose_server(load_balancer)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual({first, second}, state.tried)
+        self.assertEqual(2, state.attempts)
@@ -1,9 +1,12 @@
+import threading
 import unittest
+import mock
 from ballast import LoadBalancer
+from ballast.discovery import Server
 from ballast.discovery.static import StaticServerList
-from ballast.rule import RoundRobinRule
+from ballast.rule import RoundRobinRule, PriorityWeightedRule, LeastLoadedP2CRule, PeakEwmaRule, ConsistentHashRule, _hash
 from ballast.ping import Ping, DummyPing
-from ballast.exception import BallastException
+from ballast.exception import BallastException, NoReachableServers
 
 
 class _MockPing(Ping):
@@ -16,6 +19,19 @@ class _MockPing(Ping):
         return self._is_alive
 
 
+class _BlockingPing(Ping):
+
+    def __init__(self):
+        super(_BlockingPing, self).__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def is_alive(self, server):
+        self.started.set()
+        self.release.wait(5)
+        return True
+
+
 class RoundRobinRuleTest(unittest.TestCase):
 
     def test_choose_without_setting_balancer(self):
@@ -72,3 +88,442 @@ class RoundRobinRuleTest(unittest.TestCase):
         rule.load_balancer = load_balancer
 
         self.assertRaises(BallastException, rule.choose)
+
+    def test_choose_during_ping(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+        ping = _BlockingPing()
+        load_balancer = LoadBalancer(servers, ping=ping, ping_on_start=False)
+
+        rule = RoundRobinRule()
+        rule.load_balancer = load_balancer
+
+        # the first round publishes
+        # the reachable servers
+        ping.release.set()
+        load_balancer.ping()
+        ping.release.clear()
+
+        # start a slow ping round
+        t = threading.Thread(target=load_balancer.ping)
+        t.daemon = True
+        t.start()
+        self.assertTrue(ping.started.wait(5))
+
+        try:
+            # choosing a server doesn't wait on the ping
+            chosen = set(rule.choose() for i in range(3))
+            self.assertEqual(load_balancer.servers, chosen)
+        finally:
+            ping.release.set()
+            t.join(5)
+
+
+class PriorityWeightedRuleTest(unittest.TestCase):
+
+    def _create_rule(self, servers):
+        load_balancer = LoadBalancer(StaticServerList(servers), ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = PriorityWeightedRule()
+        rule.load_balancer = load_balancer
+
+        return rule
+
+    def test_choose_without_setting_balancer(self):
+        rule = PriorityWeightedRule()
+        self.assertRaises(BallastException, rule.choose)
+
+    def test_weighted_choice(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=60, priority=1),
+            Server('127.0.0.2', 80, weight=20, priority=1),
+            Server('127.0.0.3', 80, weight=20, priority=1),
+            Server('127.0.0.4', 80, weight=1, priority=2)
+        ])
+
+        stats = dict()
+        for i in range(1000):
+            server = rule.choose()
+            stats[server.address] = stats.get(server.address, 0) + 1
+
+        # only the top priority servers,
+        # exactly in ratio of their weight
+        self.assertEqual({'127.0.0.1': 600, '127.0.0.2': 200, '127.0.0.3': 200}, stats)
+
+    def test_smooth_interleaving(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=5),
+            Server('127.0.0.2', 80, weight=1),
+            Server('127.0.0.3', 80, weight=1)
+        ])
+
+        # the heavy server isn't chosen 5 times in a row
+        chosen = [rule.choose().address[-1] for i in range(7)]
+        self.assertEqual(5, chosen.count('1'))
+        self.assertNotIn('11111', ''.join(chosen * 2))
+
+    def test_priority_fallback(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=1, priority=1),
+            Server('127.0.0.2', 80, weight=3, priority=2),
+            Server('127.0.0.3', 80, weight=1, priority=2),
+            Server('127.0.0.4', 80, weight=1, priority=3)
+        ])
+
+        server = rule.choose()
+        self.assertEqual('127.0.0.1', server.address)
+
+        # the next tier takes over
+        # once a tier is down
+        rule.load_balancer.mark_server_down(server)
+        chosen = [rule.choose().address for i in range(4)]
+        self.assertEqual(3, chosen.count('127.0.0.2'))
+        self.assertEqual(1, chosen.count('127.0.0.3'))
+
+    def test_zero_weights(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=0),
+            Server('127.0.0.2', 80, weight=0)
+        ])
+
+        chosen = set(rule.choose().address for i in range(2))
+        self.assertEqual({'127.0.0.1', '127.0.0.2'}, chosen)
+
+    def test_large_weights(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=100000),
+            Server('127.0.0.2', 80, weight=300001)
+        ])
+
+        stats = dict()
+        for i in range(400001):
+            server = rule.choose()
+            stats[server.address] = stats.get(server.address, 0) + 1
+
+        self.assertEqual({'127.0.0.1': 100000, '127.0.0.2': 300001}, stats)
+
+    def test_large_weights_interleaved(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=60001),
+            Server('127.0.0.2', 80, weight=60000)
+        ])
+
+        # no server gets a block of requests all to itself
+        chosen = ''.join(rule.choose().address[-1] for i in range(1000))
+        self.assertNotIn('111', chosen)
+        self.assertNotIn('222', chosen)
+
+    def test_no_servers_reachable(self):
+
+        load_balancer = LoadBalancer(StaticServerList(['127.0.0.1']), ping=_MockPing(False), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = PriorityWeightedRule()
+        rule.load_balancer = load_balancer
+
+        self.assertRaises(NoReachableServers, rule.choose)
+
+
+class LeastLoadedP2CRuleTest(unittest.TestCase):
+
+    def _create_rule(self, servers):
+        load_balancer = LoadBalancer(StaticServerList(servers), ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = LeastLoadedP2CRule()
+        rule.load_balancer = load_balancer
+
+        return rule
+
+    def test_choose_without_setting_balancer(self):
+        rule = LeastLoadedP2CRule()
+        self.assertRaises(BallastException, rule.choose)
+
+    def test_single_server(self):
+        rule = self._create_rule(['127.0.0.1'])
+        self.assertEqual('127.0.0.1', rule.choose().address)
+
+    def test_least_loaded(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2'])
+        stats = rule.load_balancer.stats
+
+        busy = [s for s in rule.load_balancer.servers if s.address == '127.0.0.1'][0]
+        stats.get_server_stats(busy).increment_active_requests()
+
+        # with two servers, both are always sampled
+        for i in range(100):
+            self.assertEqual('127.0.0.2', rule.choose().address)
+
+    def test_weighted_load(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=10),
+            Server('127.0.0.2', 80, weight=1)
+        ])
+        stats = rule.load_balancer.stats
+
+        heavy = [s for s in rule.load_balancer.servers if s.address == '127.0.0.1'][0]
+        for i in range(5):
+            stats.get_server_stats(heavy).increment_active_requests()
+
+        # 6/10 is less than 1/1
+        for i in range(100):
+            self.assertEqual('127.0.0.1', rule.choose().address)
+
+    def test_spreads_load(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2', '127.0.0.3', '127.0.0.4'])
+        stats = rule.load_balancer.stats
+
+        # requests that never complete are
+        # spread evenly across all servers
+        for i in range(400):
+            stats.get_server_stats(rule.choose()).increment_active_requests()
+
+        for server in rule.load_balancer.servers:
+            self.assertLessEqual(abs(100 - stats.get_server_stats(server).active_requests), 5)
+
+    def test_no_servers_reachable(self):
+
+        load_balancer = LoadBalancer(StaticServerList(['127.0.0.1']), ping=_MockPing(False), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = LeastLoadedP2CRule()
+        rule.load_balancer = load_balancer
+
+        self.assertRaises(NoReachableServers, rule.choose)
+
+
+class PeakEwmaRuleTest(unittest.TestCase):
+
+    def setUp(self):
+        self._now = 0
+        patcher = mock.patch('ballast.rule.timer', side_effect=lambda: self._now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_rule(self, servers, half_life=10):
+        load_balancer = LoadBalancer(StaticServerList(servers), ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = PeakEwmaRule(half_life)
+        rule.load_balancer = load_balancer
+
+        return rule
+
+    def test_choose_without_setting_balancer(self):
+        rule = PeakEwmaRule()
+        self.assertRaises(BallastException, rule.choose)
+
+    def test_peak_ewma(self):
+
+        rule = self._create_rule(['127.0.0.1'])
+        server = Server('127.0.0.1', 80)
+
+        self.assertEqual(0, rule.cost(server))
+
+        # peaks are taken as-is
+        rule.record_response_time(server, 1.0)
+        self.assertEqual(1.0, rule.cost(server))
+
+        # and decay towards lower response
+        # times with the configured half life
+        self._now = 10
+        rule.record_response_time(server, 0.5)
+        self.assertAlmostEqual(0.75, rule.cost(server))
+
+        # an idle server decays towards zero
+        self._now = 30
+        self.assertAlmostEqual(0.1875, rule.cost(server))
+
+    def test_prefers_faster_server(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2'])
+        rule.record_response_time(Server('127.0.0.1', 80), 0.5)
+        rule.record_response_time(Server('127.0.0.2', 80), 0.1)
+
+        for i in range(100):
+            self.assertEqual('127.0.0.2', rule.choose().address)
+
+    def test_active_requests(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2'])
+        rule.record_response_time(Server('127.0.0.1', 80), 0.5)
+        rule.record_response_time(Server('127.0.0.2', 80), 0.1)
+
+        # 0.1 x 6 is more than 0.5 x 1
+        stats = rule.load_balancer.stats.get_server_stats(Server('127.0.0.2', 80))
+        for i in range(5):
+            stats.increment_active_requests()
+
+        for i in range(100):
+            self.assertEqual('127.0.0.1', rule.choose().address)
+
+    def test_unsampled_server(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2'])
+        rule.record_response_time(Server('127.0.0.1', 80), 0.5)
+
+        # a new server is tried first, but isn't flooded
+        # with requests before its first response time
+        self.assertEqual('127.0.0.2', rule.choose().address)
+
+        stats = rule.load_balancer.stats.get_server_stats(Server('127.0.0.2', 80))
+        stats.increment_active_requests()
+        self.assertEqual('127.0.0.1', rule.choose().address)
+
+    def test_no_servers_reachable(self):
+
+        load_balancer = LoadBalancer(StaticServerList(['127.0.0.1']), ping=_MockPing(False), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = PeakEwmaRule()
+        rule.load_balancer = load_balancer
+
+        self.assertRaises(NoReachableServers, rule.choose)
+
+
+class ConsistentHashRuleTest(unittest.TestCase):
+
+    def _create_rule(self, servers):
+        load_balancer = LoadBalancer(StaticServerList(servers), ping=DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = ConsistentHashRule()
+        rule.load_balancer = load_balancer
+
+        return rule
+
+    def test_choose_without_setting_balancer(self):
+        rule = ConsistentHashRule()
+        self.assertRaises(BallastException, rule.choose_for_key, 'key')
+
+    def test_same_key_same_server(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+
+        for i in range(100):
+            key = 'key-%s' % i
+            self.assertEqual(rule.choose_for_key(key), rule.choose_for_key(key))
+
+        # and equally from another instance
+        other = self._create_rule(['127.0.0.3', '127.0.0.2', '127.0.0.1'])
+        for i in range(100):
+            key = 'key-%s' % i
+            self.assertEqual(rule.choose_for_key(key), other.choose_for_key(key))
+
+    def test_keys_spread(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+
+        stats = dict()
+        for i in range(3000):
+            server = rule.choose_for_key(i)
+            stats[server] = stats.get(server, 0) + 1
+
+        self.assertEqual(3, len(stats))
+        for server in stats:
+            self.assertTrue(500 < stats[server] < 1500)
+
+    def test_weighted_keys(self):
+
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=3),
+            Server('127.0.0.2', 80, weight=1)
+        ])
+
+        stats = dict()
+        for i in range(4000):
+            server = rule.choose_for_key(i)
+            stats[server.address] = stats.get(server.address, 0) + 1
+
+        self.assertGreater(stats['127.0.0.1'], 2 * stats['127.0.0.2'])
+
+    def test_large_weights(self):
+
+        servers = ['127.0.0.%s' % i for i in range(1, 21)]
+        rule = self._create_rule([Server(a, 80, weight=1000) for a in servers])
+        light_rule = self._create_rule([Server(a, 80, weight=1) for a in servers])
+
+        # the same ring as with the weights divided by their gcd
+        for i in range(100):
+            self.assertEqual(rule.choose_for_key(i), light_rule.choose_for_key(i))
+        self.assertEqual(800, len(rule._ring.hashes))
+
+        # and never more than so many points, in proportion
+        rule = self._create_rule([
+            Server('127.0.0.1', 80, weight=65535),
+            Server('127.0.0.2', 80, weight=65534),
+            Server('127.0.0.3', 80, weight=32767)
+        ])
+        rule.choose_for_key('key')
+        owners = rule._ring.owners
+
+        self.assertLessEqual(len(owners), ConsistentHashRule.MAX_POINTS)
+        self.assertAlmostEqual(2, owners.count(Server('127.0.0.1', 80)) / float(owners.count(Server('127.0.0.3', 80))), 1)
+
+    def test_points_hashed_on_update(self):
+
+        load_balancer = LoadBalancer(
+            StaticServerList(['127.0.0.1', '127.0.0.2']),
+            rule=ConsistentHashRule(),
+            ping=DummyPing(),
+            ping_on_start=False
+        )
+        load_balancer.ping()
+        rule = load_balancer._rule
+
+        # hashed when the servers were discovered, not by the first request
+        self.assertEqual(2, len(rule._points))
+        with mock.patch('ballast.rule._hash', wraps=_hash) as mock_hash:
+            rule.choose_for_key('key')
+            self.assertEqual(1, mock_hash.call_count)
+
+    def test_minimal_movement(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2', '127.0.0.3', '127.0.0.4'])
+        before = dict((i, rule.choose_for_key(i)) for i in range(1000))
+
+        down = rule.choose_for_key(0)
+        rule.load_balancer.mark_server_down(down)
+        after = dict((i, rule.choose_for_key(i)) for i in range(1000))
+
+        # only the keys of the server that went down move
+        for i in range(1000):
+            if before[i] == down:
+                self.assertNotEqual(down, after[i])
+            else:
+                self.assertEqual(before[i], after[i])
+
+        # and they move back once it's up again
+        rule.load_balancer.ping(down)
+        self.assertEqual(before, dict((i, rule.choose_for_key(i)) for i in range(1000)))
+
+    def test_choose_without_key(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+        chosen = set(rule.choose() for i in range(3))
+        self.assertEqual(rule.load_balancer.servers, chosen)
+
+    def test_load_balancer_hash_key(self):
+
+        rule = self._create_rule(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+        self.assertEqual(rule.choose_for_key('key'), rule.load_balancer.choose_server(hash_key='key'))
+
+    def test_no_servers_reachable(self):
+
+        load_balancer = LoadBalancer(StaticServerList(['127.0.0.1']), ping=_MockPing(False), ping_on_start=False)
+        load_balancer.ping()
+
+        rule = ConsistentHashRule()
+        rule.load_balancer = load_balancer
+
+        self.assertRaises(NoReachableServers, rule.choose_for_key, 'key')
@@ -0,0 +1,112 @@
+import unittest
+import mock
+from ballast.discovery import Server
+from ballast.schedule import PingSchedule
+
+
+class PingScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self._now = 0
+        patcher = mock.patch('ballast.schedule.timer', side_effect=lambda: self._now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self._schedule = PingSchedule(
+            healthy_interval=60,
+            failure_interval=1,
+            max_failure_interval=8,
+            recovery_interval=2,
+            recovery_pings=2,
+            jitter=0
+        )
+        self._server = Server('127.0.0.1', 80)
+        self._schedule.update([self._server])
+
+    def _ping(self, is_alive):
+        """
+        Ping the server when it's due, returning the time it was pinged at.
+        """
+        self._now = self._schedule.next_ping_time()
+        self.assertEqual([self._server], self._schedule.pop_due())
+        self._schedule.record(self._server, is_alive)
+        return self._now
+
+    def test_new_servers_due(self):
+        self.assertEqual(0, self._schedule.next_ping_time())
+        self.assertEqual([self._server], self._schedule.pop_due())
+
+        # nothing is due until it's recorded
+        self.assertIsNone(self._schedule.next_ping_time())
+        self.assertEqual([], self._schedule.pop_due())
+
+    def test_healthy_interval(self):
+        self.assertEqual(0, self._ping(True))
+        self.assertEqual(60, self._ping(True))
+        self.assertEqual(120, self._ping(True))
+
+    def test_failure_backoff(self):
+        self.assertEqual(0, self._ping(False))
+        self.assertEqual(1, self._ping(False))
+        self.assertEqual(3, self._ping(False))
+        self.assertEqual(7, self._ping(False))
+        self.assertEqual(15, self._ping(False))
+
+        # capped
+        self.assertEqual(23, self._ping(True))
+
+        # recovering
+        self.assertEqual(25, self._ping(True))
+        self.assertEqual(27, self._ping(True))
+
+        # healthy again
+        self.assertEqual(87, self._ping(True))
+
+    def test_mark_down(self):
+        self._ping(True)
+
+        self._now = 10
+        self._schedule.mark_down(self._server)
+
+        # checked on soon, then recovers
+        self.assertEqual(12, self._ping(True))
+        self.assertEqual(14, self._ping(True))
+        self.assertEqual(16, self._ping(True))
+        self.assertEqual(76, self._ping(True))
+
+    def test_update(self):
+        self._ping(True)
+
+        other = Server('127.0.0.2', 80)
+        self._schedule.update([self._server, other])
+
+        # the new server is due right away,
+        # the existing one keeps its schedule
+        self.assertEqual([other], self._schedule.pop_due())
+        self.assertEqual(2, len(self._schedule))
+
+        # removed servers aren't pinged
+        self._schedule.update([other])
+        self._now = 100
+        self.assertEqual([], self._schedule.pop_due())
+        self.assertEqual(1, len(self._schedule))
+
+    def test_jitter(self):
+        schedule = PingSchedule(healthy_interval=10, jitter=0.5)
+        schedule.update([self._server])
+        schedule.pop_due()
+
+        with mock.patch('ballast.schedule.random.uniform', return_value=1.5) as mock_uniform:
+            schedule.record(self._server, True)
+
+        mock_uniform.assert_called_once_with(0.5, 1.5)
+        self.assertEqual(15, schedule.next_ping_time())
+
+    def test_resolve_interval(self):
+        servers = [Server('127.0.0.1', 80, ttl=30), Server('127.0.0.2', 80, ttl=10)]
+        self.assertEqual(10, self._schedule.resolve_interval(servers))
+
+        # bounded
+        self.assertEqual(1, self._schedule.resolve_interval([Server('127.0.0.1', 80, ttl=0)]))
+        self.assertEqual(300, self._schedule.resolve_interval([Server('127.0.0.1', 80, ttl=3600)]))
+        self.assertEqual(300, self._schedule.resolve_interval([]))
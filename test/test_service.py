@@ -1,8 +1,15 @@
+import threading
+import time
 import unittest
 import mock
 from requests import models, exceptions
 from ballast import ping, Service, LoadBalancer
 from ballast.util import UrlBuilder
+from ballast.retry import Retry, RetryBudget
+from ballast.hedge import Hedge
+from ballast.outlier import OutlierDetector
+from ballast.breaker import CircuitBreaker
+from ballast.rule import PeakEwmaRule, ConsistentHashRule
 from ballast.discovery import Server
 from ballast.discovery.static import StaticServerList
 from ballast.exception import (
@@ -10,6 +17,12 @@ from ballast.exception import (
     NoReachableServers,
     BallastConfigurationException
 )
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
 
 
 _EXPECTED_SERVERS = ['127.0.0.1', '127.0.0.2']
@@ -83,7 +96,7 @@ class ServiceTest(unittest.TestCase):
             Service('bad-arg!', load_balancer=self._load_balancer)
         self.assertRaises(BallastConfigurationException, init_service)
 
-    @mock.patch('ballast.service.requests.request', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.request', return_value=_MockResponse(200))
     def test_request_ok(self, mock_request):
 
         # make our request
@@ -101,35 +114,35 @@ class ServiceTest(unittest.TestCase):
         self.assertIsNone(url._port)
         self.assertEqual(url._path, '/relative/path')
 
-    @mock.patch('ballast.service.requests.head', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.head', return_value=_MockResponse(200))
     def test_head_ok(self, mock_request):
         self.assert_request_ok(mock_request, self._service.head)
 
-    @mock.patch('ballast.service.requests.options', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.options', return_value=_MockResponse(200))
     def test_options_ok(self, mock_request):
         self.assert_request_ok(mock_request, self._service.options)
 
-    @mock.patch('ballast.service.requests.get', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(200))
     def test_get_ok(self, mock_request):
         self.assert_request_ok(mock_request, self._service.get)
 
-    @mock.patch('ballast.service.requests.post', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.post', return_value=_MockResponse(200))
     def test_post_ok(self, mock_request):
         self.assert_request_ok(mock_request, self._service.post)
 
-    @mock.patch('ballast.service.requests.put', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.put', return_value=_MockResponse(200))
     def test_put_ok(self, mock_request):
         self.assert_request_ok(mock_request, self._service.put)
 
-    @mock.patch('ballast.service.requests.patch', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.patch', return_value=_MockResponse(200))
     def test_patch_ok(self, mock_request):
         self.assert_request_ok(mock_request, self._service.patch)
 
-    @mock.patch('ballast.service.requests.delete', return_value=_MockResponse(200))
+    @mock.patch('ballast.pool.requests.Session.delete', return_value=_MockResponse(200))
     def test_delete_ok(self, mock_request):
         self.assert_request_ok(mock_request, self._service.delete)
 
-    @mock.patch('ballast.service.requests.request', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.request', return_value=_MockResponse(500))
     def test_all_request_servers_error(self, mock_request):
 
         mock_request.side_effect = exceptions.RequestException('mock exception')
@@ -157,42 +170,42 @@ class ServiceTest(unittest.TestCase):
         for hostname in hostnames:
             self.assertIn(hostname, _EXPECTED_SERVERS)
 
-    @mock.patch('ballast.service.requests.options', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.options', return_value=_MockResponse(500))
     def test_all_options_servers_error(self, mock_request):
         mock_request.side_effect = exceptions.RequestException('mock exception')
         self.assert_all_servers_fail(mock_request, self._service.options)
 
-    @mock.patch('ballast.service.requests.head', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.head', return_value=_MockResponse(500))
     def test_all_head_servers_error(self, mock_request):
         mock_request.side_effect = exceptions.RequestException('mock exception')
         self.assert_all_servers_fail(mock_request, self._service.head)
 
-    @mock.patch('ballast.service.requests.get', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(500))
     def test_all_get_servers_error(self, mock_request):
         mock_request.side_effect = exceptions.RequestException('mock exception')
         self.assert_all_servers_fail(mock_request, self._service.get)
 
-    @mock.patch('ballast.service.requests.post', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.post', return_value=_MockResponse(500))
     def test_all_post_servers_error(self, mock_request):
         mock_request.side_effect = exceptions.RequestException('mock exception')
         self.assert_all_servers_fail(mock_request, self._service.post)
 
-    @mock.patch('ballast.service.requests.put', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.put', return_value=_MockResponse(500))
     def test_all_put_servers_error(self, mock_request):
         mock_request.side_effect = exceptions.RequestException('mock exception')
         self.assert_all_servers_fail(mock_request, self._service.put)
 
-    @mock.patch('ballast.service.requests.patch', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.patch', return_value=_MockResponse(500))
     def test_all_patch_servers_error(self, mock_request):
         mock_request.side_effect = exceptions.RequestException('mock exception')
         self.assert_all_servers_fail(mock_request, self._service.patch)
 
-    @mock.patch('ballast.service.requests.delete', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.delete', return_value=_MockResponse(500))
     def test_all_delete_servers_error(self, mock_request):
         mock_request.side_effect = exceptions.RequestException('mock exception')
         self.assert_all_servers_fail(mock_request, self._service.delete)
 
-    @mock.patch('ballast.service.requests.request', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.request', return_value=_MockResponse(500))
     def test_all_request_servers_500(self, mock_request):
 
         # will try each server, and mark each down on a 500 response
@@ -218,34 +231,401 @@ class ServiceTest(unittest.TestCase):
         for hostname in hostnames:
             self.assertIn(hostname, _EXPECTED_SERVERS)
 
-    @mock.patch('ballast.service.requests.options', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.options', return_value=_MockResponse(500))
     def test_all_options_servers_500(self, mock_request):
         self.assert_all_servers_fail(mock_request, self._service.options)
 
-    @mock.patch('ballast.service.requests.head', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.head', return_value=_MockResponse(500))
     def test_all_head_servers_500(self, mock_request):
         self.assert_all_servers_fail(mock_request, self._service.head)
 
-    @mock.patch('ballast.service.requests.get', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(500))
     def test_all_get_servers_500(self, mock_request):
         self.assert_all_servers_fail(mock_request, self._service.get)
 
-    @mock.patch('ballast.service.requests.post', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.post', return_value=_MockResponse(500))
     def test_all_post_servers_500(self, mock_request):
         self.assert_all_servers_fail(mock_request, self._service.post)
 
-    @mock.patch('ballast.service.requests.put', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.put', return_value=_MockResponse(500))
     def test_all_put_servers_500(self, mock_request):
         self.assert_all_servers_fail(mock_request, self._service.put)
 
-    @mock.patch('ballast.service.requests.patch', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.patch', return_value=_MockResponse(500))
     def test_all_patch_servers_500(self, mock_request):
         self.assert_all_servers_fail(mock_request, self._service.patch)
 
-    @mock.patch('ballast.service.requests.delete', return_value=_MockResponse(500))
+    @mock.patch('ballast.pool.requests.Session.delete', return_value=_MockResponse(500))
     def test_all_delete_servers_500(self, mock_request):
         self.assert_all_servers_fail(mock_request, self._service.delete)
 
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(200))
+    def test_connection_pool_per_server(self, mock_request):
+
+        service = Service(self._load_balancer, pool_size=5, pool_idle_timeout=30)
+        self.assertEqual(5, service._pool.pool_size)
+        self.assertEqual(30, service._pool.idle_timeout)
+
+        # make enough requests to hit every server a few times
+        for i in range(6):
+            service.get('/relative/path')
+
+        # one pool per server, re-used across requests
+        self.assertEqual(len(_EXPECTED_SERVERS), len(service._pool))
+
+        service.close()
+        self.assertEqual(0, len(service._pool))
+
+    @mock.patch('ballast.pool.SessionPool.warm_up')
+    def test_warm_up(self, mock_warm_up):
+
+        servers = StaticServerList(_EXPECTED_SERVERS)
+        load_balancer = LoadBalancer(servers, ping=ping.DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+
+        # servers already up are warmed up straight away
+        service = Service(load_balancer, warm_up_connections=3, request_timeout=0.1)
+        service._warm_up_pool.close()
+        service._warm_up_pool.join()
+        service._warm_up_pool = None
+
+        self.assertEqual(2, mock_warm_up.call_count)
+        mock_warm_up.assert_any_call(mock.ANY, 'http://127.0.0.1/', 3, 0.1)
+
+        # and new servers once they're up
+        mock_warm_up.reset_mock()
+        servers.add_server('127.0.0.3')
+        load_balancer.ping()
+        load_balancer.events.flush()
+        service.close()
+
+        mock_warm_up.assert_called_once_with(mock.ANY, 'http://127.0.0.3/', 3, 0.1)
+        load_balancer.close()
+
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(200))
+    def test_connection_pool_closed_for_removed_server(self, mock_request):
+
+        service = Service(self._load_balancer)
+        for i in range(6):
+            service.get('/relative/path')
+
+        server = list(self._load_balancer.servers)[0]
+        self.assertIn(server, service._pool)
+
+        # told about the removal right away,
+        # rather than on the next eviction
+        self._load_balancer._update_servers(self._load_balancer.servers - {server})
+        self.assertNotIn(server, service._pool)
+        self.assertEqual(len(_EXPECTED_SERVERS) - 1, len(service._pool))
+
+        service.close()
+
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(500))
+    def test_max_attempts(self, mock_request):
+
+        service = self._create_service(
+            ['127.0.0.1', '127.0.0.2', '127.0.0.3'],
+            retry=Retry(max_attempts=2)
+        )
+
+        # gives up (returning the last
+        # response) after 2 attempts
+        result = service.get('/relative/path')
+        self.assertEqual(500, result.status_code)
+        self.assertEqual(2, mock_request.call_count)
+
+        # a different server on each attempt
+        hostnames = set(UrlBuilder.from_url(c[0][0])._hostname for c in mock_request.call_args_list)
+        self.assertEqual(2, len(hostnames))
+
+    @mock.patch('ballast.pool.requests.Session.get')
+    def test_max_attempts_error(self, mock_request):
+
+        mock_request.side_effect = exceptions.ConnectionError('mock exception')
+        service = self._create_service(
+            ['127.0.0.1', '127.0.0.2', '127.0.0.3'],
+            retry=Retry(max_attempts=2)
+        )
+
+        # the last error is raised once we give up
+        self.assertRaises(exceptions.ConnectionError, service.get, '/relative/path')
+        self.assertEqual(2, mock_request.call_count)
+
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(500))
+    def test_retry_budget_exhausted(self, mock_request):
+
+        budget = RetryBudget(ratio=0, min_retries_per_second=0)
+        service = self._create_service(
+            ['127.0.0.1', '127.0.0.2', '127.0.0.3'],
+            retry=Retry(max_attempts=3, budget=budget)
+        )
+
+        # no budget, so no retries
+        result = service.get('/relative/path')
+        self.assertEqual(500, result.status_code)
+        self.assertEqual(1, mock_request.call_count)
+
+    @mock.patch('ballast.service.time.sleep')
+    @mock.patch('ballast.pool.requests.Session.get', return_value=_MockResponse(500))
+    def test_retry_backoff(self, mock_request, mock_sleep):
+
+        service = self._create_service(
+            ['127.0.0.1', '127.0.0.2', '127.0.0.3'],
+            retry=Retry(max_attempts=3, backoff=0.1, max_backoff=0.15)
+        )
+
+        service.get('/relative/path')
+        self.assertEqual(3, mock_request.call_count)
+
+        # slept between attempts, but not after the last one
+        self.assertEqual(2, mock_sleep.call_count)
+        for call_arg in mock_sleep.call_args_list:
+            self.assertTrue(0 <= call_arg[0][0] <= 0.15)
+
+    def test_server_stats(self):
+
+        def fail_first_server(url, **kwargs):
+            return _MockResponse(500 if '127.0.0.1' in url else 200)
+
+        with mock.patch('ballast.pool.requests.Session.get', side_effect=fail_first_server):
+            for i in range(3):
+                self._service.get('/relative/path')
+
+        stats = self._load_balancer.stats
+        failed = stats.get_server_stats(Server('127.0.0.1', 80))
+        succeeded = stats.get_server_stats(Server('127.0.0.2', 80))
+
+        # the failing server is marked down after its first request
+        self.assertEqual(1, failed.total_requests)
+        self.assertEqual(1, failed.failure_count)
+        self.assertEqual(3, succeeded.total_requests)
+        self.assertEqual(0, succeeded.failure_count)
+
+        for server_stats in (failed, succeeded):
+            self.assertEqual(0, server_stats.active_requests)
+            self.assertGreater(server_stats.average_response_time, 0)
+            self.assertIsNotNone(server_stats.response_time_percentile(50))
+
+    @mock.patch('ballast.pool.requests.Session.get')
+    def test_server_stats_active_requests(self, mock_request):
+
+        stats = self._load_balancer.stats
+
+        def check_active(url, **kwargs):
+            host = UrlBuilder.from_url(url)._hostname
+            self.assertEqual(1, stats.get_server_stats(Server(host, 80)).active_requests)
+            raise exceptions.ConnectionError('mock exception')
+
+        mock_request.side_effect = check_active
+
+        self.assertRaises(NoReachableServers, self._service.get, '/relative/path')
+
+        for server in self._servers:
+            server_stats = stats.get_server_stats(server)
+            self.assertEqual(0, server_stats.active_requests)
+            self.assertEqual(1, server_stats.failure_count)
+
+    def test_latency_aware_rule(self):
+
+        servers = StaticServerList(_EXPECTED_SERVERS)
+        load_balancer = LoadBalancer(servers, rule=PeakEwmaRule(), ping=ping.DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+        service = Service(load_balancer, request_timeout=0.1)
+
+        # a clock that only moves while a server is
+        # responding, and never decays the rule's costs
+        clock = [0]
+
+        def slow_first_server(url, **kwargs):
+            clock[0] += 0.02 if '127.0.0.1' in url else 0.001
+            return _MockResponse(200)
+
+        with mock.patch('ballast.service.timer', side_effect=lambda: clock[0]), \
+                mock.patch('ballast.rule.timer', return_value=0), \
+                mock.patch('ballast.pool.requests.Session.get', side_effect=slow_first_server):
+            for i in range(20):
+                service.get('/relative/path')
+
+            # the rule is fed response times by the service
+            # and avoids the slow server once it has seen it
+            stats = load_balancer.stats
+            self.assertLessEqual(stats.get_server_stats(Server('127.0.0.1', 80)).total_requests, 2)
+            self.assertAlmostEqual(0.02, load_balancer._rule.cost(Server('127.0.0.1', 80)))
+            self.assertAlmostEqual(0.001, load_balancer._rule.cost(Server('127.0.0.2', 80)))
+
+    def test_hash_key(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+        load_balancer = LoadBalancer(servers, rule=ConsistentHashRule(), ping=ping.DummyPing(), ping_on_start=False)
+        load_balancer.ping()
+        service = Service(load_balancer, request_timeout=0.1)
+
+        urls = []
+
+        def record_url(url, **kwargs):
+            urls.append(url)
+            return _MockResponse(200)
+
+        with mock.patch('ballast.pool.requests.Session.get', side_effect=record_url):
+            for i in range(10):
+                service.get('/relative/path', hash_key='user-1')
+
+        # every request for the same key reaches the same server
+        self.assertEqual(10, len(urls))
+        self.assertEqual(1, len(set(urls)))
+
+    def test_outlier_detection(self):
+
+        servers = StaticServerList(_EXPECTED_SERVERS)
+        detector = OutlierDetector(consecutive_failures=2)
+        load_balancer = LoadBalancer(servers, ping=ping.DummyPing(), ping_on_start=False, outlier_detector=detector)
+        load_balancer.ping()
+        service = Service(load_balancer, request_timeout=0.1)
+
+        def fail_first_server(url, **kwargs):
+            return _MockResponse(500 if '127.0.0.1' in url else 200)
+
+        with mock.patch('ballast.pool.requests.Session.get', side_effect=fail_first_server):
+            for i in range(10):
+                self.assertEqual(200, service.get('/relative/path').status_code)
+
+        # a single failure is retried elsewhere, but the
+        # server is only ejected after consecutive failures
+        failed = [s for s in load_balancer.servers if s.address == '127.0.0.1'][0]
+        self.assertEqual(2, load_balancer.stats.get_server_stats(failed).failure_count)
+        self.assertTrue(detector.is_ejected(failed))
+        self.assertTrue(failed.is_alive)
+
+    def test_circuit_breaker(self):
+
+        servers = StaticServerList(_EXPECTED_SERVERS)
+        breaker = CircuitBreaker(failure_threshold=3, cool_down=60)
+        load_balancer = LoadBalancer(servers, ping=ping.DummyPing(), ping_on_start=False, circuit_breaker=breaker)
+        load_balancer.ping()
+        service = Service(load_balancer, request_timeout=0.1, retry=Retry(max_attempts=1))
+
+        failed = [s for s in load_balancer.servers if s.address == '127.0.0.1'][0]
+        stats = load_balancer.stats.get_server_stats(failed)
+
+        def fail_first_server(url, **kwargs):
+            return _MockResponse(500 if '127.0.0.1' in url else 200)
+
+        with mock.patch('ballast.pool.requests.Session.get', side_effect=fail_first_server):
+
+            # a single failure doesn't take the server out
+            while stats.failure_count < 1:
+                service.get('/relative/path')
+
+            self.assertEqual(CircuitBreaker.CLOSED, stats.circuit_state)
+            self.assertTrue(failed.is_alive)
+            self.assertIn(failed, load_balancer.reachable_snapshot)
+
+            # but the breaker's threshold does
+            while stats.failure_count < 3:
+                service.get('/relative/path')
+
+        self.assertEqual(CircuitBreaker.OPEN, stats.circuit_state)
+        self.assertTrue(failed.is_alive)
+        self.assertNotIn(failed, load_balancer.reachable_snapshot)
+
+    def test_cookies_not_shared(self):
+
+        backend = _Backend()
+        self.addCleanup(backend.close)
+
+        service, load_balancer = _create_backend_service(backend)
+        self.addCleanup(service.close)
+
+        # one caller's cookies never reach another's requests
+        for path in ('/login', '/public', '/public', '/public'):
+            service.get(path)
+
+        self.assertEqual([None] * 4, backend.cookies)
+
+    def test_hedged_request(self):
+
+        backend = _Backend()
+        self.addCleanup(backend.close)
+
+        # the first request stalls (e.g. a GC pause)
+        backend.delays = [2]
+
+        hedge = Hedge(delay=0.15)
+        service, load_balancer = _create_backend_service(backend, hedge=hedge)
+        self.addCleanup(service.close)
+
+        start_time = time.time()
+        response = service.get('/relative/path')
+        self.assertLess(time.time() - start_time, 1)
+
+        # the hedge (to the other server) should have won
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, hedge.hedges_sent)
+        self.assertEqual(1, hedge.hedges_won)
+        self.assertEqual(2, len(set(backend.ports)))
+
+        # the stalled request was stopped, and
+        # isn't held against its server
+        for server in load_balancer.servers:
+            self.assertEqual(0, load_balancer.stats.get_server_stats(server).failure_count)
+            self.assertTrue(server.is_alive)
+
+        # fast responses aren't hedged
+        service.get('/relative/path')
+        self.assertEqual(3, len(backend.ports))
+        self.assertEqual(1, hedge.hedges_sent)
+
+    def test_hedged_requests_not_limited(self):
+
+        backend = _Backend()
+        self.addCleanup(backend.close)
+        backend.delay = 0.3
+
+        # the primaries run on their callers' threads
+        service, load_balancer = _create_backend_service(backend, hedge=Hedge(delay=5))
+        self.addCleanup(service.close)
+
+        threads = [threading.Thread(target=service.get, args=('/relative/path',)) for _ in range(40)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(40, len(backend.ports))
+        self.assertGreater(backend.max_concurrency, 20)
+
+    def test_hedged_request_unexpected_error(self):
+
+        service = self._create_service(hedge=Hedge(delay=0.05))
+        self.addCleanup(service.close)
+
+        # raised on the calling thread, like an unhedged request
+        self.assertRaises(TypeError, service.get, '/relative/path', bogus_kwarg=1)
+
+        calls = []
+
+        def fail(url, **kwargs):
+            calls.append(url)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                raise exceptions.ConnectionError('mock exception')
+            raise ValueError('unexpected')
+
+        # the hedge's error is raised too, rather than lost
+        with mock.patch('ballast.pool.requests.Session.get', side_effect=fail):
+            self.assertRaises(ValueError, service.get, '/relative/path')
+
+    @mock.patch('ballast.pool.requests.Session.post', return_value=_MockResponse(200))
+    def test_post_not_hedged(self, mock_request):
+
+        hedge = Hedge(delay=0)
+        service = self._create_service(hedge=hedge)
+
+        service.post('/relative/path')
+
+        self.assertEqual(1, mock_request.call_count)
+        self.assertEqual(0, hedge.hedges_sent)
+
     def assert_request_ok(self, mock_request, request_call):
 
         # make our request
@@ -289,10 +669,92 @@ class ServiceTest(unittest.TestCase):
             self.assertIn(hostname, _EXPECTED_SERVERS)
 
     @staticmethod
-    def _create_service():
+    def _create_service(addresses=_EXPECTED_SERVERS, **kwargs):
 
-        servers = StaticServerList(_EXPECTED_SERVERS)
+        servers = StaticServerList(addresses)
         load_balancer = LoadBalancer(servers, ping=ping.DummyPing(), ping_on_start=False)
         load_balancer.ping()
 
-        return Service(load_balancer, use_https=True, request_timeout=0.1)
+        return Service(load_balancer, use_https=True, request_timeout=0.1, **kwargs)
+
+
+class _Backend(object):
+    """
+    Two local HTTP servers, delaying each response by the
+    next of `delays` (if any), or else by `delay` seconds.
+    """
+
+    def __init__(self):
+        self.delay = 0
+        self.delays = []
+        self.ports = []
+        self.cookies = []
+        self.max_concurrency = 0
+        self._concurrency = 0
+        self._lock = threading.Lock()
+        self._servers = [_BackendServer(self) for _ in range(2)]
+
+        for server in self._servers:
+            t = threading.Thread(target=server.serve_forever)
+            t.daemon = True
+            t.start()
+
+    @property
+    def addresses(self):
+        return [Server('127.0.0.1', s.server_address[1]) for s in self._servers]
+
+    def close(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def handle(self, port):
+        with self._lock:
+            self.ports.append(port)
+            delay = self.delays.pop(0) if self.delays else self.delay
+            self._concurrency += 1
+            self.max_concurrency = max(self.max_concurrency, self._concurrency)
+
+        time.sleep(delay)
+
+        with self._lock:
+            self._concurrency -= 1
+
+
+class _BackendServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, backend):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _BackendHandler)
+        self.backend = backend
+
+
+class _BackendHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.backend.handle(self.server.server_address[1])
+        self.server.backend.cookies.append(self.headers.get('Cookie'))
+
+        try:
+            self.send_response(200)
+            if self.path == '/login':
+                self.send_header('Set-Cookie', 'session=secret; Path=/')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        except (IOError, OSError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def _create_backend_service(backend, **kwargs):
+
+    load_balancer = LoadBalancer(StaticServerList(backend.addresses), ping=ping.DummyPing(), ping_on_start=False)
+    load_balancer.ping()
+
+    return Service(load_balancer, request_timeout=5, **kwargs), load_balancer
@@ -0,0 +1,128 @@
+import unittest
+import mock
+from ballast import LoadBalancer
+from ballast.discovery import ServerStats
+from ballast.discovery.static import StaticServerList
+from ballast.ping import DummyPing
+from ballast.slowstart import SlowStart
+
+
+class SlowStartTest(unittest.TestCase):
+
+    def test_linear(self):
+
+        slow_start = SlowStart(duration=10, min_weight=0.1)
+
+        self.assertEqual(0.1, slow_start.factor(0))
+        self.assertEqual(0.5, slow_start.factor(5))
+        self.assertEqual(0.9, slow_start.factor(9))
+        self.assertEqual(1.0, slow_start.factor(10))
+        self.assertEqual(1.0, slow_start.factor(100))
+
+    def test_aggression(self):
+
+        # climbs quickly, then levels off
+        slow_start = SlowStart(duration=16, min_weight=0.1, aggression=2)
+        self.assertEqual(0.5, slow_start.factor(4))
+
+        # stays low for longer
+        slow_start = SlowStart(duration=16, min_weight=0.1, aggression=0.5)
+        self.assertEqual(0.25, slow_start.factor(8))
+
+    def test_server_stats(self):
+
+        stats = ServerStats(slow_start=SlowStart(duration=10))
+        self.assertEqual(1.0, stats.get_slow_start_factor(0))
+
+        stats.start_slow_start(100)
+        self.assertEqual(0.5, stats.get_slow_start_factor(105))
+        self.assertEqual(1.0, stats.get_slow_start_factor(110))
+
+        # no policy, no ramp
+        stats = ServerStats()
+        stats.start_slow_start(100)
+        self.assertEqual(1.0, stats.get_slow_start_factor(100))
+
+
+class LoadBalancerSlowStartTest(unittest.TestCase):
+
+    def setUp(self):
+        self._now = 0
+        for target in ('ballast.core.timer', 'ballast.discovery.timer'):
+            patcher = mock.patch(target, side_effect=lambda: self._now)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self._servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        self._load_balancer = LoadBalancer(
+            self._servers,
+            ping=DummyPing(),
+            ping_on_start=False,
+            slow_start=SlowStart(duration=10, min_weight=0.1)
+        )
+        self._load_balancer.ping()
+
+    def _server(self, address):
+        return [s for s in self._load_balancer.servers if s.address == address][0]
+
+    def _choose(self, count):
+        chosen = dict()
+        for _ in range(count):
+            server = self._load_balancer.choose_server()
+            chosen[server.address] = chosen.get(server.address, 0) + 1
+        return chosen
+
+    def test_not_on_start_up(self):
+
+        # every server came up at once
+        for server in self._load_balancer.servers:
+            self.assertEqual(1, self._load_balancer.effective_weight(server))
+
+    @mock.patch('ballast.core.random.random')
+    def test_recovered_server(self, mock_random):
+
+        server = self._server('127.0.0.1')
+        self._load_balancer.mark_server_down(server)
+
+        self._now = 100
+        self._load_balancer.ping()
+
+        stats = self._load_balancer.stats.get_server_stats(server)
+        self.assertEqual(0.1, stats.slow_start_factor)
+        self.assertEqual(0.1, self._load_balancer.effective_weight(server))
+
+        # passed over until the (mocked) coin toss lands below its weight
+        mock_random.return_value = 0.5
+        self.assertEqual({'127.0.0.2': 100}, self._choose(100))
+
+        self._now = 106
+        self.assertEqual({'127.0.0.1': 50, '127.0.0.2': 50}, self._choose(100))
+
+        # full weight once the ramp is over
+        mock_random.return_value = 0.99
+        self._now = 110
+        self.assertEqual({'127.0.0.1': 50, '127.0.0.2': 50}, self._choose(100))
+        self.assertEqual(set(), self._load_balancer._slow_starting)
+
+    def test_added_server(self):
+
+        self._servers.add_server('127.0.0.3')
+        self._now = 100
+        self._load_balancer.ping()
+
+        server = self._server('127.0.0.3')
+        self.assertEqual(0.1, self._load_balancer.effective_weight(server))
+
+        # roughly a tenth of its share
+        chosen = self._choose(3000)
+        self.assertLess(chosen.get('127.0.0.3', 0), 300)
+
+    def test_hash_key(self):
+
+        # keyed requests stick to their server
+        server = self._server('127.0.0.1')
+        self._load_balancer.mark_server_down(server)
+        self._load_balancer.ping()
+
+        with mock.patch.object(self._load_balancer._rule, 'choose_for_key', return_value=server):
+            self.assertIs(server, self._load_balancer.choose_server('key'))
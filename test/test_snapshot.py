@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import mock
+from ballast import LoadBalancer
+from ballast.discovery import Server
+from ballast.discovery.static import StaticServerList
+from ballast.ping import DummyPing
+from ballast.snapshot import SnapshotFile
+
+
+class SnapshotFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._directory)
+        self._path = os.path.join(self._directory, 'servers.json')
+
+    def test_save_and_load(self):
+
+        snapshot = SnapshotFile(self._path)
+        self.assertEqual([], snapshot.load())
+
+        snapshot.save([Server('127.0.0.1', 80, weight=2, priority=3, ttl=60), Server('127.0.0.2', 8080)])
+
+        servers = sorted(SnapshotFile(self._path).load(), key=lambda s: s.address)
+        self.assertEqual(
+            [('127.0.0.1', 80, 2, 3, 60), ('127.0.0.2', 8080, 1, 1, 300)],
+            [(s.address, s.port, s.weight, s.priority, s.ttl) for s in servers]
+        )
+
+        # only the snapshot is left behind
+        self.assertEqual(['servers.json'], os.listdir(self._directory))
+
+    def test_unchanged_or_empty(self):
+
+        snapshot = SnapshotFile(self._path)
+        servers = [Server('127.0.0.1', 80)]
+
+        snapshot.save(servers)
+        with mock.patch('ballast.snapshot.tempfile.mkstemp') as mock_mkstemp:
+            snapshot.save(servers)
+            snapshot.save([])
+            self.assertFalse(mock_mkstemp.called)
+
+        self.assertEqual(1, len(snapshot.load()))
+
+    def test_max_age(self):
+
+        SnapshotFile(self._path).save([Server('127.0.0.1', 80)])
+
+        self.assertEqual(1, len(SnapshotFile(self._path, max_age=60).load()))
+        with mock.patch('ballast.snapshot.time.time', return_value=time.time() + 61):
+            self.assertEqual([], SnapshotFile(self._path, max_age=60).load())
+
+    def test_corrupt(self):
+
+        with open(self._path, 'w') as f:
+            f.write('{"version": 1, "serv')
+
+        self.assertEqual([], SnapshotFile(self._path).load())
+
+    def test_malformed(self):
+
+        # valid json, but not a snapshot
+        for snapshot in (
+                [],
+                {'version': 1, 'servers': [{'address': '127.0.0.1'}]},
+                {'version': 1, 'servers': 1},
+                {'version': 1, 'time': 'yesterday'}
+        ):
+            with open(self._path, 'w') as f:
+                json.dump(snapshot, f)
+
+            self.assertEqual([], SnapshotFile(self._path, max_age=60).load())
+
+    def test_failed_save(self):
+
+        snapshot = SnapshotFile(self._path)
+        snapshot.save([Server('127.0.0.1', 80)])
+
+        # the previous snapshot is untouched
+        with mock.patch('ballast.snapshot.json.dump', side_effect=ValueError()):
+            snapshot.save([Server('127.0.0.2', 80)])
+
+        self.assertEqual(['127.0.0.1'], [s.address for s in snapshot.load()])
+        self.assertEqual(['servers.json'], os.listdir(self._directory))
+
+    def test_unwritable(self):
+
+        # logged, not raised
+        snapshot = SnapshotFile(os.path.join(self._directory, 'missing', 'servers.json'))
+        snapshot.save([Server('127.0.0.1', 80)])
+
+        self.assertEqual([], snapshot.load())
+        self.assertEqual([], os.listdir(self._directory))
+
+
+class LoadBalancerSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._directory)
+        self._path = os.path.join(self._directory, 'servers.json')
+
+    def test_cold_start(self):
+
+        servers = StaticServerList(['127.0.0.1', '127.0.0.2'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False, snapshot_file=SnapshotFile(self._path))
+        load_balancer.ping()
+
+        with open(self._path) as f:
+            self.assertEqual(2, len(json.load(f)['servers']))
+
+        # a new process can choose servers before any ping
+        servers = StaticServerList(['127.0.0.2', '127.0.0.3'])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False, snapshot_file=SnapshotFile(self._path))
+
+        self.assertEqual(['127.0.0.1', '127.0.0.2'], [s.address for s in load_balancer.reachable_snapshot])
+        self.assertIn(load_balancer.choose_server().address, ('127.0.0.1', '127.0.0.2'))
+
+        # replaced by the first real round
+        load_balancer.ping()
+        self.assertEqual(['127.0.0.2', '127.0.0.3'], [s.address for s in load_balancer.reachable_snapshot])
+
+        with open(self._path) as f:
+            self.assertEqual({'127.0.0.2', '127.0.0.3'}, set(s['address'] for s in json.load(f)['servers']))
+
+    def test_discovery_down(self):
+
+        SnapshotFile(self._path).save([Server('127.0.0.1', 80), Server('127.0.0.2', 80)])
+
+        # e.g. DNS or Consul unreachable at start up
+        servers = StaticServerList([])
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False, snapshot_file=SnapshotFile(self._path))
+        load_balancer.ping()
+
+        self.assertEqual(['127.0.0.1', '127.0.0.2'], [s.address for s in load_balancer.reachable_snapshot])
+
+        # until discovery comes back
+        servers.add_server('127.0.0.3')
+        load_balancer.ping()
+        self.assertEqual(['127.0.0.3'], [s.address for s in load_balancer.reachable_snapshot])
+
+        # after which an empty result is taken at its word
+        servers._servers.clear()
+        load_balancer.ping()
+        self.assertEqual(set(), load_balancer.servers)
+
+    def test_unwritable(self):
+
+        servers = StaticServerList(['127.0.0.1'])
+        snapshot_file = SnapshotFile(os.path.join(self._directory, 'missing', 'servers.json'))
+        load_balancer = LoadBalancer(servers, ping=DummyPing(), ping_on_start=False, snapshot_file=snapshot_file)
+
+        # the ping round still completes
+        load_balancer.ping()
+        self.assertEqual(['127.0.0.1'], [s.address for s in load_balancer.reachable_snapshot])